@@ -1,8 +1,17 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "doorable.django.base")
 
 celery = Celery("doorable")
 celery.config_from_object("django.conf:settings", namespace="CELERY")
 celery.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_database_pools(**kwargs):
+    # open database connections now rather than in the first tasks
+    from utils.db import pool
+
+    pool.warm()
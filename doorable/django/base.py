@@ -41,16 +41,31 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "utils.middleware.HealthCheckMiddleware",
+    "utils.middleware.RequestLogMiddleware",
+    "utils.middleware.TracingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "utils.middleware.PathScopedMiddleware",
+]
+
+# Only the admin and the Swagger/ReDoc pages need sessions, CSRF, messages and
+# framing protection. Requests under LEAN_MIDDLEWARE_PATHS authenticate with
+# JWT only and skip this stack entirely.
+SESSION_STACK_MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+LEAN_MIDDLEWARE_PATHS = env.list("LEAN_MIDDLEWARE_PATHS", default=["/api/"])
+
+# the admin checks only look at MIDDLEWARE and cannot see the scoped stack
+SILENCED_SYSTEM_CHECKS = ["admin.E408", "admin.E409", "admin.E410"]
+
 ROOT_URLCONF = "doorable.urls"
 
 TEMPLATES = [
@@ -122,11 +137,22 @@ REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "iam.authentication.JWTAuthentication",
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "utils.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "utils.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "EXCEPTION_HANDLER": "utils.exception_handler.custom_exception_handler",
+    # proxies in front of the app; X-Forwarded-For is ignored without any
+    "NUM_PROXIES": env.int("NUM_PROXIES", default=0),
 }
 
 DATABASES = {
@@ -140,39 +166,84 @@ DATABASES = {
     "extra": env.db_url("SQLITE_URL", default="sqlite:////tmp/my-tmp-sqlite.db"),
 }
 
+DATABASE_ROUTERS = ["iam.sharding.ShardRouter"]
+
+AUTHENTICATION_BACKENDS = ["iam.backends.ModelBackend"]
+
 SWAGGER_SETTINGS = {
     "SECURITY_DEFINITIONS": {
         "Bearer": {"type": "apiKey", "name": "Authorization", "in": "header"}
     }
 }
 
+LOG_LEVEL = env("DJANGO_LOG_LEVEL", default="DEBUG" if DEBUG else "INFO")
+# "queue" hands records to a background writer thread, which also copies
+# them to the console; "sync" writes both inline
+LOG_MODE = env("DJANGO_LOG_MODE", default="queue")
+
+LOG_FILE_HANDLERS = {
+    "sync": {
+        "class": "logging.FileHandler",
+        "filename": "general.log",
+        "formatter": "verbose",
+    },
+    "queue": {
+        "class": "utils.logging.BufferedFileHandler",
+        "filename": "general.log",
+        "formatter": "json",
+        "filters": ["request_context"],
+        "capacity": env.int("DJANGO_LOG_QUEUE_CAPACITY", default=10000),
+        "batch_size": env.int("DJANGO_LOG_BATCH_SIZE", default=256),
+        "flush_interval": env.float("DJANGO_LOG_FLUSH_INTERVAL", default=0.5),
+        "console": "ext://sys.stderr",
+    },
+}
+
+LOG_HANDLERS = {"sync": ["console", "file"], "queue": ["file"]}
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "request_context": {"()": "utils.logging.RequestContextFilter"},
+    },
     "handlers": {
         "console": {"class": "logging.StreamHandler"},
-        "file": {
-            "class": "logging.FileHandler",
-            "filename": "general.log",
-            "formatter": "verbose",
-        },
+        "file": LOG_FILE_HANDLERS[LOG_MODE],
     },
     "loggers": {
         "": {
-            "handlers": ["console", "file"],
-            "level": env("DJANGO_LOG_LEVEL", default=DEBUG),
+            "handlers": LOG_HANDLERS[LOG_MODE],
+            "level": LOG_LEVEL,
         }
     },
     "formatters": {
         "verbose": {
             "format": "[{asctime}] ({levelname}) - {name} - {message}",
             "style": "{",
-        }
+        },
+        "json": {"()": "utils.logging.JsonFormatter"},
     },
 }
 
-
+from doorable.settings.cache import *
 from doorable.settings.cors import *
 from doorable.settings.celery import *
 from doorable.settings.email_sending import *
 from doorable.settings.jwt import *
+from doorable.settings.health import *
+from doorable.settings.iam import *
+from doorable.settings.permissions import *
+from doorable.settings.tracing import *
+from doorable.settings.sharding import *
+from doorable.settings.verifier import *
+from doorable.settings.audit import *
+from doorable.settings.db_pool import *
+
+DATABASES.update(IAM_SHARD_DATABASES)
+
+# the pooled backend is opt-in until it runs against MySQL in CI
+if DB_POOL_ENABLED:
+    for database in DATABASES.values():
+        if database["ENGINE"] == "django.db.backends.mysql":
+            database["ENGINE"] = "utils.db.mysql"
@@ -1,3 +1,5 @@
+from django.core.exceptions import ImproperlyConfigured
+
 from doorable.env import env
 
 from .base import *
@@ -6,6 +8,15 @@ DEBUG = env.bool("DJANGO_DEBUG", default=False)
 
 SECRET_KEY = env("SECRET_KEY")
 
+# token families, the SMTP circuit, email coalescing and the shard and
+# negative caches must be shared by every worker process
+CACHES = {"default": env.cache_url("CACHE_URL")}
+if CACHES["default"]["BACKEND"] in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+):
+    raise ImproperlyConfigured("CACHE_URL must point to a cache shared by all workers")
+
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS", default=[])
 
 CORS_ALLOW_ALL_ORIGINS = False
@@ -0,0 +1,8 @@
+from .base import *
+
+# tasks run in the test process, so the suite needs no broker
+CELERY_TASK_ALWAYS_EAGER = True
+
+# audit events are written inside the test's transaction, where tests can
+# assert on them, instead of by a thread outliving the test database
+IAM_AUDIT_SINK = "sync"
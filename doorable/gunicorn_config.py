@@ -0,0 +1,115 @@
+"""
+Gunicorn configuration, read with `gunicorn -c python:doorable.gunicorn_config`.
+
+Every value can be overridden from the environment (or .env), see the
+GUNICORN_* variables below.
+"""
+
+import gc
+import os
+
+from doorable.env import env
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "uvicorn": "uvicorn.workers.UvicornWorker",
+}
+
+
+def cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers(kind: str) -> int:
+    cpus = cpu_count()
+    if kind == "sync":
+        return cpus * 2 + 1
+    # threaded and async workers already overlap I/O inside each process
+    return cpus + 1
+
+
+worker_kind = env.str("GUNICORN_WORKER_CLASS", default="sync")
+worker_class = WORKER_CLASSES[worker_kind]
+
+if worker_kind == "uvicorn":
+    # not in the Pipfile, only deployments serving ASGI install it
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        raise RuntimeError(
+            "GUNICORN_WORKER_CLASS=uvicorn needs uvicorn, `pip install uvicorn`"
+        ) from None
+workers = env.int("GUNICORN_WORKERS", default=default_workers(worker_kind))
+threads = env.int("GUNICORN_THREADS", default=4 if worker_kind == "gthread" else 1)
+
+if worker_kind == "uvicorn":
+    wsgi_app = "doorable.asgi:application"
+else:
+    wsgi_app = "doorable.wsgi:application"
+
+bind = env.list("GUNICORN_BIND", default=["0.0.0.0:8000"])
+backlog = env.int("GUNICORN_BACKLOG", default=2048)
+timeout = env.int("GUNICORN_TIMEOUT", default=30)
+graceful_timeout = env.int("GUNICORN_GRACEFUL_TIMEOUT", default=30)
+keepalive = env.int("GUNICORN_KEEPALIVE", default=5)
+
+# load Django once in the master so workers share its pages copy-on-write
+preload_app = env.bool("GUNICORN_PRELOAD", default=True)
+
+# recycle workers, staggered so they do not all restart at once
+max_requests = env.int("GUNICORN_MAX_REQUESTS", default=10000)
+max_requests_jitter = env.int(
+    "GUNICORN_MAX_REQUESTS_JITTER", default=max(max_requests // 10, 0)
+)
+
+accesslog = env.str("GUNICORN_ACCESS_LOG", default=None)
+errorlog = env.str("GUNICORN_ERROR_LOG", default="-")
+loglevel = env.str("GUNICORN_LOG_LEVEL", default="info")
+
+
+def pre_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+
+    # sockets opened while preloading must not be shared by the children
+    from django.db import connections
+
+    from utils.db import pool
+
+    connections.close_all()
+    # closing hands them to the pool, which must not keep them either
+    pool.close_all()
+
+    # keep the collector from touching (and so copying) the preloaded objects
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+
+    from django.db import connections
+
+    # never close an inherited socket here, it is still the master's
+    for conn in connections.all(initialized_only=True):
+        conn.connection = None
+
+
+def post_worker_init(worker):
+    # open database connections now rather than in the first requests
+    from utils.db import pool
+
+    pool.warm()
+
+
+def worker_exit(server, worker):
+    # write the audit events still buffered in this worker
+    from iam import audit, dispatch
+
+    audit.get_buffer().close()
+    # and send the emails it has accepted, when it sends them itself
+    dispatch.close()
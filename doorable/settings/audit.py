@@ -0,0 +1,18 @@
+from doorable.env import env
+
+# events waiting to be written per process; beyond this they are dropped
+IAM_AUDIT_BUFFER_SIZE = env.int("IAM_AUDIT_BUFFER_SIZE", default=10000)
+
+# a flush writes once this many events are waiting, or after the interval
+IAM_AUDIT_FLUSH_SIZE = env.int("IAM_AUDIT_FLUSH_SIZE", default=500)
+IAM_AUDIT_FLUSH_INTERVAL = env.float("IAM_AUDIT_FLUSH_INTERVAL", default=2.0)
+
+# "database" bulk inserts from the web process, "celery" hands each batch
+# to the record_auth_events task, or inserts like "database" where
+# CELERY_BROKER_ENABLED is False; "sync" writes each event in the request
+# without a writer thread and "disabled" drops them, both meant for tests
+IAM_AUDIT_SINK = env.str("IAM_AUDIT_SINK", default="database")
+
+# months of partitions audit_partitions keeps, and creates ahead, on MySQL
+IAM_AUDIT_RETENTION_MONTHS = env.int("IAM_AUDIT_RETENTION_MONTHS", default=13)
+IAM_AUDIT_PARTITIONS_AHEAD = env.int("IAM_AUDIT_PARTITIONS_AHEAD", default=3)
@@ -0,0 +1,7 @@
+from doorable.env import env
+
+# e.g. redis://localhost:6379/0. locmem is per process and only fits tests;
+# prod requires CACHE_URL, see doorable.django.prod
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+}
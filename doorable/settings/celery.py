@@ -1,5 +1,9 @@
 from doorable.env import env
 
+# False where no broker and worker are deployed: the tasks then run in the
+# web process, emails are sent by iam.dispatch and readiness skips the broker
+CELERY_BROKER_ENABLED = env.bool("CELERY_BROKER_ENABLED", default=True)
+
 CELERY_BROKER_URL = env.str("BROKER_URL", default="redis://localhost:6379/1")
 
 CELERY_RESULT_BACKEND = "django-cache"
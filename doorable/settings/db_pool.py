@@ -0,0 +1,19 @@
+from doorable.env import env
+
+# serves the MySQL databases through utils.db.mysql, a pooled version of
+# django.db.backends.mysql; not yet run against a MySQL server in CI
+DB_POOL_ENABLED = env.bool("DB_POOL_ENABLED", default=False)
+
+# connections each process keeps per database; a database's "POOL" dict in
+# DATABASES overrides any of these
+DB_POOL = {
+    "SIZE": env.int("DB_POOL_SIZE", default=10),
+    # seconds a checkout waits for a connection once all of them are in use
+    "TIMEOUT": env.float("DB_POOL_TIMEOUT", default=10.0),
+    # recycled after this many seconds, before the server's wait_timeout
+    "MAX_LIFETIME": env.float("DB_POOL_MAX_LIFETIME", default=3600.0),
+    # connections idle for longer are pinged before they are handed out
+    "CHECK_AFTER": env.float("DB_POOL_CHECK_AFTER", default=5.0),
+    # opened when a gunicorn or celery worker starts
+    "WARM": env.int("DB_POOL_WARM", default=2),
+}
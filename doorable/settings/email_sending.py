@@ -1,8 +1,45 @@
 from doorable.env import env, env_to_enum
+from doorable.settings.celery import CELERY_BROKER_ENABLED
 
 EMAIL_SENDING_FAILURE_TRIGGER = env.bool("EMAIL_SENDING_FAILURE_TRIGGER", default=False)
 EMAIL_SENDING_FAILURE_RATE = env.float("EMAIL_SENDING_FAILURE_RATE", default=0.2)
 
+# verification and reset emails to one recipient within this many seconds are
+# coalesced: the first goes out at once, the newest of the rest after the
+# window, the others are dropped. 0 sends every one
+EMAIL_COALESCE_WINDOW = env.float("EMAIL_COALESCE_WINDOW", default=60)
+
+# a dead provider fails a send in seconds instead of at the task time limit
+EMAIL_TIMEOUT = env.int("EMAIL_TIMEOUT", default=5)
+
+# a failed send is retried CELERY_TASK_MAX_RETRIES times, after this many
+# seconds doubled on each attempt, up to the maximum; half of it is random
+EMAIL_RETRY_BACKOFF = env.float("EMAIL_RETRY_BACKOFF", default=5)
+EMAIL_RETRY_BACKOFF_MAX = env.float("EMAIL_RETRY_BACKOFF_MAX", default=300)
+
+# that many failures in a row stop every worker from sending for the
+# cooldown; a send that finds the circuit open is deferred, at most
+# EMAIL_CIRCUIT_MAX_DEFERRALS times, then dropped
+EMAIL_CIRCUIT_FAILURE_THRESHOLD = env.int("EMAIL_CIRCUIT_FAILURE_THRESHOLD", default=5)
+EMAIL_CIRCUIT_COOLDOWN = env.float("EMAIL_CIRCUIT_COOLDOWN", default=30)
+EMAIL_CIRCUIT_MAX_DEFERRALS = env.int("EMAIL_CIRCUIT_MAX_DEFERRALS", default=20)
+
+# "celery" sends through the send_email task, "inprocess" from threads of
+# the web process itself, for deployments without a broker, see iam.dispatch
+EMAIL_DISPATCH = env.str(
+    "EMAIL_DISPATCH", default="celery" if CELERY_BROKER_ENABLED else "inprocess"
+)
+EMAIL_DISPATCH_THREADS = env.int("EMAIL_DISPATCH_THREADS", default=2)
+# emails waiting per process; beyond this they are dropped
+EMAIL_DISPATCH_QUEUE_SIZE = env.int("EMAIL_DISPATCH_QUEUE_SIZE", default=1000)
+# seconds a stopping process keeps sending; without a spool this includes
+# the coalesced emails still waiting out their countdown
+EMAIL_DISPATCH_DRAIN_TIMEOUT = env.float("EMAIL_DISPATCH_DRAIN_TIMEOUT", default=10)
+# an SMTP connection unused for this many seconds is closed
+EMAIL_DISPATCH_KEEPALIVE = env.float("EMAIL_DISPATCH_KEEPALIVE", default=30)
+# journals the waiting emails here, so a restart does not lose them
+EMAIL_DISPATCH_SPOOL_DIR = env.str("EMAIL_DISPATCH_SPOOL_DIR", default="")
+
 EMAIL_HOST = env("EMAIL_HOST")
 EMAIL_PORT = env.int("EMAIL_PORT", default=587)
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
@@ -0,0 +1,8 @@
+from doorable.env import env
+
+LIVENESS_PATH = "/healthz"
+READINESS_PATH = "/readyz"
+
+READINESS_CACHE_SECONDS = env.float("READINESS_CACHE_SECONDS", default=5)
+# seconds each dependency check may take before it counts as failed
+READINESS_CHECK_TIMEOUT = env.float("READINESS_CHECK_TIMEOUT", default=2)
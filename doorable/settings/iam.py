@@ -0,0 +1,6 @@
+from doorable.env import env
+
+# how long an email with no matching user is answered from the cache
+IAM_NEGATIVE_EMAIL_CACHE_TIMEOUT = env.int(
+    "IAM_NEGATIVE_EMAIL_CACHE_TIMEOUT", default=300
+)
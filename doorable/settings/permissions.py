@@ -0,0 +1,3 @@
+from doorable.env import env
+
+IAM_PERMISSION_CACHE_TIMEOUT = env.int("IAM_PERMISSION_CACHE_TIMEOUT", default=3600)
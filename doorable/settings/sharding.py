@@ -0,0 +1,17 @@
+from doorable.env import env
+
+# database aliases users are spread over, see iam.sharding; "default" also
+# holds the user directory and the reference data (groups, permissions)
+IAM_SHARDS = env.list("IAM_SHARDS", default=["default"])
+
+# every shard other than default is configured by IAM_SHARD_<ALIAS>_URL
+IAM_SHARD_DATABASES = {
+    alias: env.db_url(f"IAM_SHARD_{alias.upper()}_URL")
+    for alias in IAM_SHARDS
+    if alias != "default"
+}
+
+# how long the shard a user lives on is answered from the cache
+IAM_SHARD_LOCATION_CACHE_TIMEOUT = env.int(
+    "IAM_SHARD_LOCATION_CACHE_TIMEOUT", default=3600
+)
@@ -0,0 +1,8 @@
+from doorable.env import env
+
+# fraction of requests traced, decided once when the request arrives
+TRACE_SAMPLE_RATE = env.float("TRACE_SAMPLE_RATE", default=0.0)
+TRACE_EXPORT_FILE = env.str("TRACE_EXPORT_FILE", default="traces.jsonl")
+# "local" writes one compact trace per line, "otlp" writes OTLP/JSON resourceSpans
+TRACE_EXPORT_FORMAT = env.str("TRACE_EXPORT_FORMAT", default="local")
+TRACE_SERVICE_NAME = env.str("TRACE_SERVICE_NAME", default="doorable-iam")
@@ -0,0 +1,12 @@
+from doorable.env import env
+
+# Unix socket the token verifier listens on, see iam.verifier
+IAM_VERIFIER_SOCKET = env(
+    "IAM_VERIFIER_SOCKET", default="/tmp/doorable-iam-verify.sock"
+)
+
+# seconds between reloads of the users and sessions the verifier has seen
+IAM_VERIFIER_REFRESH_INTERVAL = env.float("IAM_VERIFIER_REFRESH_INTERVAL", default=1.0)
+
+# decoded tokens kept to skip the signature check on repeated tokens
+IAM_VERIFIER_TOKEN_CACHE_SIZE = env.int("IAM_VERIFIER_TOKEN_CACHE_SIZE", default=10000)
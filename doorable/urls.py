@@ -4,6 +4,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from utils.views import DatabasePools
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Doorable API",
@@ -29,6 +31,7 @@ urlpatterns = [
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
     path("admin/", admin.site.urls),
     path("api/v1/auth/", include("iam.urls")),
+    path("api/v1/database-pools", DatabasePools.as_view(), name="database-pools"),
 ]
 
 handler404 = "utils.views.error_404"
@@ -1,7 +1,42 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Q
 
-from .models import User
+from utils.pagination import EstimatedCountPaginator
+
+from .models import User, UserSession
+from .utils import canonical_email
+
+# primary key of the last row of the previous page, see EstimatedCountPaginator
+AFTER_VAR = "after"
+
+
+class UserChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        qs = super().get_queryset(request, exclude_parameters)
+        # the list only renders these columns, skip loading the rest
+        return qs.only(*self.model_admin.list_display)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # a cursor only holds for the page after the one it was taken from
+        return super().get_query_string(new_params, [AFTER_VAR, *(remove or [])])
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.next_page_query = None
+        paginated = self.multi_page and not (self.show_all and self.can_show_all)
+        if paginated and self.page_num < self.paginator.num_pages:
+            rows = list(self.result_list)
+            if rows:
+                self.next_page_query = self.get_query_string(
+                    {PAGE_VAR: self.page_num + 1, AFTER_VAR: rows[-1].pk}
+                )
 
 
 @admin.register(User)
@@ -10,3 +45,50 @@ class UserAdmin(BaseUserAdmin):
         None,
         {"classes": ("wide",), "fields": ("email", "username", "password1", "password2", "first_name", "last_name")},
     )
+    list_display = ("email", "username", "is_active", "is_verified", "date_joined")
+    # boolean flags match most of the table, filtering on them is a full scan
+    list_filter = ()
+    ordering = ("-id",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # searching is done on indexed columns only, see get_search_results
+    search_fields = ("email",)
+
+    def get_changelist(self, request, **kwargs):
+        return UserChangeList
+
+    def get_paginator(
+        self, request, queryset, per_page, orphans=0, allow_empty_first_page=True
+    ):
+        after = request.GET.get(AFTER_VAR, "")
+        return self.paginator(
+            queryset,
+            per_page,
+            orphans,
+            allow_empty_first_page,
+            after=int(after) if after.isdigit() else None,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        # a prefix match on the unique normalized email stays an index range scan
+        matches = Q(email_normalized__startswith=canonical_email(term))
+        if term.isdigit():
+            matches |= Q(id=int(term))
+        return queryset.filter(matches), False
+
+
+@admin.register(UserSession)
+class UserSessionAdmin(admin.ModelAdmin):
+    list_display = (
+        "user",
+        "device",
+        "ip_address",
+        "created_at",
+        "last_used_at",
+        "revoked_at",
+    )
+    raw_id_fields = ("user",)
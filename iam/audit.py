@@ -0,0 +1,251 @@
+import atexit
+import base64
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import AuthEvent
+from .sessions import client_ip
+
+logger = logging.getLogger(__name__)
+
+Kind = AuthEvent.Kind
+
+
+class AuditBuffer:
+    """
+    Collects audit events in a bounded per-process queue. A background thread
+    writes them in bulk once `flush_size` events are waiting or every
+    `flush_interval` seconds, whichever comes first. When the queue is full
+    the event is dropped and counted instead of blocking the request.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        flush_size: int,
+        flush_interval: float,
+        sink: str = "database",
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=capacity)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._pid = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        # a flush from the caller and one from the thread never interleave
+        self._flush_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_writer(self) -> None:
+        # the writer thread does not survive a fork, so each process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def record(self, event: Dict) -> None:
+        if self.sink == "disabled":
+            return
+        if self.sink == "sync":
+            # no thread, the event is written in the caller's transaction
+            self._write([event])
+            return
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.queue.qsize() >= self.flush_size:
+            self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes every waiting event, in batches of `flush_size`."""
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.flush_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return flushed
+                self._write(batch)
+                flushed += len(batch)
+
+    def _write(self, batch: List[Dict]) -> None:
+        try:
+            if self.sink == "celery":
+                # imported here, the tasks import this module
+                from .tasks import record_auth_events
+
+                record_auth_events.delay(batch)
+            else:
+                if self.sink == "database":
+                    # the thread's connection is not closed by any request cycle
+                    close_old_connections()
+                write_events(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("could not write %d audit events", len(batch))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def close(self) -> None:
+        """Stops the writer and writes what is left, on worker shutdown."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join(timeout=max(self.flush_interval * 4, 1))
+            self._thread = None
+            self._pid = None
+            self.flush()
+
+
+_buffer: Optional[AuditBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> AuditBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                sink = settings.IAM_AUDIT_SINK
+                if sink == "celery" and not settings.CELERY_BROKER_ENABLED:
+                    # there is no worker, the writer thread writes them itself
+                    sink = "database"
+                _buffer = AuditBuffer(
+                    capacity=settings.IAM_AUDIT_BUFFER_SIZE,
+                    flush_size=settings.IAM_AUDIT_FLUSH_SIZE,
+                    flush_interval=settings.IAM_AUDIT_FLUSH_INTERVAL,
+                    sink=sink,
+                )
+    return _buffer
+
+
+def record(kind: str, request=None, user=None, email: str = "") -> None:
+    """Queues an event; it reaches the database with the next flush."""
+    meta = request.META if request is not None else {}
+    get_buffer().record(
+        {
+            "kind": kind,
+            "occurred_at": time.time(),
+            "user_id": user.pk if user is not None else None,
+            "email": (email or getattr(user, "email", ""))[:254],
+            "ip_address": client_ip(request) if request is not None else None,
+            "user_agent": meta.get("HTTP_USER_AGENT", "")[:255],
+        }
+    )
+
+
+def flush() -> int:
+    return get_buffer().flush()
+
+
+def stats() -> Dict[str, int]:
+    return get_buffer().stats()
+
+
+def write_events(events: List[Dict]) -> None:
+    AuthEvent.objects.bulk_create(
+        [
+            AuthEvent(
+                **{
+                    **event,
+                    "occurred_at": datetime.fromtimestamp(
+                        event["occurred_at"], tz=dt_timezone.utc
+                    ),
+                }
+            )
+            for event in events
+        ]
+    )
+
+
+def encode_cursor(event: AuthEvent) -> str:
+    position = f"{event.occurred_at.isoformat()}|{event.pk}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        occurred_at = parse_datetime(at)
+        if occurred_at is None:
+            raise ValueError
+        return occurred_at, int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+
+def events(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    kind: Optional[str] = None,
+    user_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+) -> Tuple[List[AuthEvent], Optional[str]]:
+    """
+    Events newest first within [since, until), a page at a time. The cursor
+    is the position of the last event returned, so a page costs an index
+    range scan however deep it is.
+    """
+    queryset = AuthEvent.objects.order_by("-occurred_at", "-id")
+    if since is not None:
+        queryset = queryset.filter(occurred_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(occurred_at__lt=until)
+    if kind is not None:
+        queryset = queryset.filter(kind=kind)
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    if cursor is not None:
+        occurred_at, id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(occurred_at__lt=occurred_at) | Q(occurred_at=occurred_at, id__lt=id)
+        )
+
+    page = list(queryset[: limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
@@ -0,0 +1,33 @@
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication as BaseJWTAuthentication,
+)
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from . import sharding
+from .models import UserDirectory
+from .rotation import FAMILY_CLAIM, issued_before_revocation, is_revoked
+
+
+class JWTAuthentication(BaseJWTAuthentication):
+    """
+    Rejects tokens issued before the user's `tokens_valid_after` marker, read
+    from the row that is loaded anyway, and tokens whose session was revoked.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        with sharding.pinned(UserDirectory.objects.shard_of(user_id)):
+            user = super().get_user(validated_token)
+
+        valid_after = user.tokens_valid_after
+        if valid_after is not None and issued_before_revocation(
+            validated_token, int(valid_after.timestamp())
+        ):
+            raise AuthenticationFailed("token has been revoked", code="token_revoked")
+
+        family = validated_token.get(FAMILY_CLAIM)
+        if family and is_revoked(family):
+            raise AuthenticationFailed("session has been revoked", code="token_revoked")
+
+        return user
@@ -0,0 +1,18 @@
+from django.contrib.auth.backends import ModelBackend as BaseModelBackend
+
+from .models import User
+
+
+class ModelBackend(BaseModelBackend):
+    """Looks users up on their shard, for the admin's session authentication."""
+
+    def get_user(self, user_id):
+        try:
+            user = User.objects.get_by_id(user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    def _get_group_permissions(self, user_obj):
+        # joins the user's group memberships, which live on the user's shard
+        return super()._get_group_permissions(user_obj).using(user_obj._state.db)
@@ -0,0 +1,343 @@
+"""
+Sending emails from the web process itself, for deployments without a
+broker and a celery worker (EMAIL_DISPATCH = "inprocess").
+
+A few threads take the messages from a bounded schedule, ordered by when
+they are due, and each keeps its SMTP connection open between messages.
+Failed sends are retried and deferred like the send_email task does. On
+shutdown the waiting messages are sent, for up to
+EMAIL_DISPATCH_DRAIN_TIMEOUT seconds; with a spool only those already due,
+the next process sends the others when their countdown ends.
+
+With EMAIL_DISPATCH_SPOOL_DIR every accepted message is journaled to a file
+before it is queued, so what a process could not send before it exited or
+died is sent by the next process to start.
+"""
+
+import atexit
+import fcntl
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from . import emails
+
+logger = logging.getLogger(__name__)
+
+# what _take returns when a thread has had nothing to send for a while
+IDLE = object()
+
+
+class Spool:
+    """
+    Journal of the messages a process accepted and has not sent yet, one
+    JSON line per change, synced before the message is queued. The process
+    holds a lock on its file; a file nobody holds belongs to a process that
+    is gone, and its messages are adopted by the next spool opened in the
+    directory.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex}.spool")
+        self.file = open(self.path, "ab")
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def _write(self, record: Dict) -> None:
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self.lock:
+            if self.file.closed:
+                return
+            if record.get("done"):
+                self.pending.discard(record["id"])
+            else:
+                self.pending.add(record["id"])
+            if not self.pending:
+                # nothing left to recover, so the journal starts over
+                self.file.truncate(0)
+            else:
+                self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def add(self, key: str, message: Dict, due: float) -> None:
+        self._write({"id": key, "message": message, "due": due})
+
+    def done(self, key: str) -> None:
+        self._write({"id": key, "done": True})
+
+    @staticmethod
+    def read(file) -> Dict[str, Tuple[Dict, float]]:
+        pending = {}
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line of a process killed while writing it
+                continue
+            if record.get("done"):
+                pending.pop(record["id"], None)
+            else:
+                pending[record["id"]] = (record["message"], record["due"])
+        return pending
+
+    def adopt(self) -> List[Tuple[str, Dict, float]]:
+        """Takes over the messages of the spools no running process holds."""
+        adopted = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".spool") or path == self.path:
+                continue
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with file:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if not os.path.exists(path):
+                    # adopted by another process while this one opened it
+                    continue
+                for key, (message, due) in self.read(file).items():
+                    self.add(key, message, due)
+                    adopted.append((key, message, due))
+                os.unlink(path)
+        return adopted
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.pending:
+                os.unlink(self.path)
+            # unlocks the file, so the next process adopts what is left
+            self.file.close()
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        threads: int,
+        capacity: int,
+        drain_timeout: float,
+        keepalive: float,
+        spool_dir: Optional[str] = None,
+    ):
+        self.threads = threads
+        self.capacity = capacity
+        self.drain_timeout = drain_timeout
+        self.keepalive = keepalive
+        self.spool_dir = spool_dir
+        self.spool: Optional[Spool] = None
+        # (due, order, key, message), due on the monotonic clock
+        self.schedule: List[Tuple[float, int, str, Dict]] = []
+        self.order = itertools.count()
+        self.ready = threading.Condition(threading.Lock())
+        self.sending = 0
+        self.sent = 0
+        self.retried = 0
+        self.rejected = 0
+        self.closing = False
+        self._pid = None
+        self._workers: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_started(self) -> None:
+        # threads and file locks do not survive a fork, each process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.schedule = []
+            self.sending = 0
+            self.closing = False
+            self.spool = Spool(self.spool_dir) if self.spool_dir else None
+            self._workers = [
+                threading.Thread(
+                    target=self._run, name=f"email-sender-{i}", daemon=True
+                )
+                for i in range(self.threads)
+            ]
+            for worker in self._workers:
+                worker.start()
+            self._pid = os.getpid()
+            if self.spool is not None:
+                adopted = self.spool.adopt()
+                for key, message, due in adopted:
+                    self._queue(key, message, max(due - time.time(), 0))
+                if adopted:
+                    logger.info("%d spooled emails adopted", len(adopted))
+
+    def submit(self, message: Dict, countdown: float = 0) -> None:
+        self._ensure_started()
+        with self.ready:
+            full = len(self.schedule) >= self.capacity
+            if full:
+                self.rejected += 1
+        if full:
+            # the request does not wait for the senders to catch up
+            emails.give_up(message, "the email queue is full")
+            return
+        self._accept(uuid.uuid4().hex, message, countdown)
+
+    def _accept(self, key: str, message: Dict, countdown: float) -> None:
+        if self.spool is not None:
+            self.spool.add(key, message, time.time() + countdown)
+        if not self._queue(key, message, countdown) and self.spool is None:
+            emails.give_up(message, "the email senders are shut down")
+
+    def _queue(self, key: str, message: Dict, countdown: float) -> bool:
+        with self.ready:
+            if self.closing:
+                # a spooled message is left for the next process
+                return False
+            entry = (time.monotonic() + countdown, next(self.order), key, message)
+            heapq.heappush(self.schedule, entry)
+            self.ready.notify()
+            return True
+
+    def _take(self, wait: Optional[float]) -> Any:
+        """
+        The next message due, IDLE when none came for `wait` seconds, or None
+        once the dispatcher is closing and nothing due is left.
+        """
+        deadline = None if wait is None else time.monotonic() + wait
+        with self.ready:
+            while True:
+                now = time.monotonic()
+                if self.schedule and self.schedule[0][0] <= now:
+                    self.sending += 1
+                    return heapq.heappop(self.schedule)
+                if self.closing:
+                    return None
+                if deadline is not None and now >= deadline:
+                    return IDLE
+                until = deadline
+                if self.schedule:
+                    due = self.schedule[0][0]
+                    until = due if until is None else min(until, due)
+                self.ready.wait(None if until is None else until - now)
+
+    def _run(self) -> None:
+        connection = get_connection()
+        is_open = False
+        while True:
+            item = self._take(self.keepalive if is_open else None)
+            if item is None:
+                break
+            if item is IDLE:
+                # before the provider drops it for being idle
+                connection.close()
+                is_open = False
+                continue
+            _, _, key, message = item
+            is_open = True
+            try:
+                self._send(connection, key, message)
+            except Exception:
+                # e.g. the spool's disk is full; the thread keeps sending
+                logger.exception(
+                    "email to %s not dispatched", message["recipient_list"]
+                )
+            finally:
+                with self.ready:
+                    self.sending -= 1
+        if is_open:
+            connection.close()
+
+    def _send(self, connection, key: str, message: Dict) -> None:
+        try:
+            emails.deliver(message, connection=connection)
+        except (emails.CircuitOpen,) + emails.SEND_ERRORS as e:
+            if not isinstance(e, emails.CircuitOpen):
+                connection.close()
+            retry = emails.next_attempt(message, e)
+            if retry is not None:
+                message, countdown = retry
+                self.retried += 1
+                self._accept(key, message, countdown)
+                return
+            emails.give_up(message, e)
+        except Exception as e:
+            # a message that cannot be rendered would fail every time
+            logger.exception("email to %s could not be sent", message["recipient_list"])
+            emails.give_up(message, e)
+        else:
+            self.sent += 1
+        if self.spool is not None:
+            self.spool.done(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self.schedule),
+            "sending": self.sending,
+            "sent": self.sent,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "spool": self.spool.path if self.spool is not None else None,
+        }
+
+    def close(self) -> None:
+        """Sends what is due and stops the senders, on worker shutdown."""
+        if self._pid != os.getpid():
+            return
+        with self.ready:
+            self.closing = True
+            if self.spool is None:
+                # nothing keeps the coalesced emails still waiting out their
+                # countdown, and they are the newest ones: send them now
+                self.schedule = [(0, *entry[1:]) for entry in self.schedule]
+                heapq.heapify(self.schedule)
+            self.ready.notify_all()
+        deadline = time.monotonic() + self.drain_timeout
+        for worker in self._workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+        left = len(self.schedule) + self.sending
+        if left:
+            logger.warning(
+                "%d emails not sent on shutdown%s",
+                left,
+                ", kept in the spool" if self.spool is not None else "",
+            )
+        if self.spool is not None:
+            self.spool.close()
+        self._workers = []
+        self._pid = None
+
+
+_dispatcher: Optional[Dispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> Dispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = Dispatcher(
+                    threads=settings.EMAIL_DISPATCH_THREADS,
+                    capacity=settings.EMAIL_DISPATCH_QUEUE_SIZE,
+                    drain_timeout=settings.EMAIL_DISPATCH_DRAIN_TIMEOUT,
+                    keepalive=settings.EMAIL_DISPATCH_KEEPALIVE,
+                    spool_dir=settings.EMAIL_DISPATCH_SPOOL_DIR or None,
+                )
+    return _dispatcher
+
+
+def close() -> None:
+    if _dispatcher is not None:
+        _dispatcher.close()
@@ -0,0 +1,245 @@
+"""
+Delivery of the emails users can ask for again and again.
+
+Within `EMAIL_COALESCE_WINDOW` seconds a recipient gets at most the first
+email of a kind right away and the newest one at the end of the window.
+Every message carries a token and the newest token per recipient and kind
+is kept in the cache, so the worker drops any message a newer one has
+superseded before rendering it or connecting to SMTP.
+
+A circuit breaker, shared by the workers through the cache, stops sends
+for `EMAIL_CIRCUIT_COOLDOWN` seconds once the provider has failed
+`EMAIL_CIRCUIT_FAILURE_THRESHOLD` times in a row. After that a single
+trial send decides whether it closes again.
+"""
+
+import logging
+import random
+import smtplib
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.core.cache import cache
+from templated_mail.mail import BaseEmailMessage
+
+from .tasks import send_email
+from .utils import canonical_email
+
+logger = logging.getLogger(__name__)
+
+VERIFY_EMAIL = "verify_email"
+PASSWORD_RESET = "password_reset"
+KINDS = (VERIFY_EMAIL, PASSWORD_RESET)
+
+COUNTERS = ("enqueued", "suppressed", "delivered", "failed")
+
+# what a provider that is down or overloaded raises
+SEND_ERRORS = (smtplib.SMTPException, OSError, SoftTimeLimitExceeded)
+
+FAILURES_KEY = "iam:smtp:failures"
+OPEN_KEY = "iam:smtp:open_until"
+TRIAL_KEY = "iam:smtp:trial"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, wait: float):
+        super().__init__(f"smtp circuit is open for {wait:.1f}s")
+        self.wait = wait
+
+
+def _latest_key(kind: str, recipient: str) -> str:
+    return f"iam:email:latest:{kind}:{recipient}"
+
+
+def _window_key(kind: str, recipient: str) -> str:
+    return f"iam:email:window:{kind}:{recipient}"
+
+
+def _counter_key(kind: str, counter: str) -> str:
+    return f"iam:email:{counter}:{kind}"
+
+
+def count(kind: str, counter: str) -> None:
+    key = _counter_key(kind, counter)
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    keys = {
+        _counter_key(kind, counter): (kind, counter)
+        for kind in KINDS
+        for counter in COUNTERS
+    }
+    values = cache.get_many(keys)
+    result = {kind: dict.fromkeys(COUNTERS, 0) for kind in KINDS}
+    for key, (kind, counter) in keys.items():
+        result[kind][counter] = values.get(key, 0)
+    return result
+
+
+def enqueue(kind: str, message: Dict) -> None:
+    window = settings.EMAIL_COALESCE_WINDOW
+    recipient = canonical_email(message["recipient_list"][0])
+    coalesce = {"kind": kind, "recipient": recipient, "token": None}
+    message = {**message, "coalesce": coalesce}
+    count(kind, "enqueued")
+    if window <= 0:
+        dispatch(message)
+        return
+
+    coalesce["token"] = uuid.uuid4().hex
+    # outlives the delayed message, which runs a window from now
+    cache.set(_latest_key(kind, recipient), coalesce["token"], timeout=window * 2)
+
+    if cache.add(_window_key(kind, recipient), True, timeout=window):
+        dispatch(message)
+    else:
+        # the first of the window went out already; only the newest of the
+        # rest is delivered, once the window is over
+        dispatch(message, countdown=window)
+
+
+def dispatch(message: Dict, countdown: float = 0) -> None:
+    """Hands `message` to the send_email task or to this process's senders."""
+    if settings.EMAIL_DISPATCH == "inprocess":
+        # imported here, it imports this module
+        from .dispatch import get_dispatcher
+
+        get_dispatcher().submit(message, countdown)
+    elif countdown:
+        send_email.apply_async((message,), countdown=countdown)
+    else:
+        send_email.delay(message)
+
+
+def is_superseded(message: Dict) -> bool:
+    coalesce = message.get("coalesce")
+    if coalesce is None or coalesce["token"] is None:
+        return False
+    latest = cache.get(_latest_key(coalesce["kind"], coalesce["recipient"]))
+    return latest is not None and latest != coalesce["token"]
+
+
+def circuit_wait() -> float:
+    """0 when a send may go ahead, otherwise the seconds to wait."""
+    open_until = cache.get(OPEN_KEY)
+    if open_until is None:
+        return 0
+    remaining = open_until - time.time()
+    if remaining > 0:
+        return remaining
+    # half open: one send tries the provider, the others wait for its outcome
+    if cache.add(TRIAL_KEY, True, timeout=settings.EMAIL_CIRCUIT_COOLDOWN):
+        return 0
+    return settings.EMAIL_CIRCUIT_COOLDOWN
+
+
+def record_success() -> None:
+    cache.delete_many([FAILURES_KEY, OPEN_KEY, TRIAL_KEY])
+
+
+def record_failure() -> None:
+    cache.add(FAILURES_KEY, 0, timeout=None)
+    failures = cache.incr(FAILURES_KEY)
+    trial = cache.get(TRIAL_KEY) is not None
+    if failures >= settings.EMAIL_CIRCUIT_FAILURE_THRESHOLD or trial:
+        cache.set(OPEN_KEY, time.time() + settings.EMAIL_CIRCUIT_COOLDOWN, timeout=None)
+        cache.delete_many([FAILURES_KEY, TRIAL_KEY])
+
+
+def circuit_state() -> str:
+    open_until = cache.get(OPEN_KEY)
+    if open_until is None:
+        return "closed"
+    return "open" if open_until > time.time() else "half-open"
+
+
+def backoff(retries: int) -> float:
+    """Exponential, with half of it random so retries of a burst spread out."""
+    delay = min(
+        settings.EMAIL_RETRY_BACKOFF * 2**retries, settings.EMAIL_RETRY_BACKOFF_MAX
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def deferral(wait: float) -> float:
+    # workers deferred together must not all come back at the same moment
+    return wait + random.uniform(0, settings.EMAIL_RETRY_BACKOFF)
+
+
+def inject_failure() -> None:
+    if (
+        settings.EMAIL_SENDING_FAILURE_TRIGGER
+        and random.random() < settings.EMAIL_SENDING_FAILURE_RATE
+    ):
+        raise smtplib.SMTPServerDisconnected("injected failure")
+
+
+def kind_of(message: Dict) -> Optional[str]:
+    coalesce = message.get("coalesce")
+    return coalesce["kind"] if coalesce is not None else None
+
+
+def next_attempt(message: Dict, error: Exception) -> Optional[Tuple[Dict, float]]:
+    """
+    The message to send again after a failed send and the seconds to wait,
+    or None once it has used up its attempts. Both are counted in the
+    message, so waiting out an outage does not use up the retries of a
+    failing send.
+    """
+    if isinstance(error, CircuitOpen):
+        deferrals = message.get("deferrals", 0)
+        if deferrals >= settings.EMAIL_CIRCUIT_MAX_DEFERRALS:
+            return None
+        return {**message, "deferrals": deferrals + 1}, deferral(error.wait)
+
+    failures = message.get("failures", 0)
+    if failures >= settings.CELERY_TASK_MAX_RETRIES:
+        return None
+    return {**message, "failures": failures + 1}, backoff(failures)
+
+
+def give_up(message: Dict, error) -> None:
+    kind = kind_of(message)
+    if kind is not None:
+        count(kind, "failed")
+    logger.error("email to %s dropped: %s", message["recipient_list"], error)
+
+
+def deliver(message: Dict, connection=None) -> bool:
+    """
+    Sends `message` unless a newer one superseded it, and returns whether
+    it was sent. Raises CircuitOpen while the provider is considered down,
+    and the provider's error when the send fails. An open `connection` is
+    used and left open.
+    """
+    kind = kind_of(message)
+    if is_superseded(message):
+        count(kind, "suppressed")
+        return False
+
+    wait = circuit_wait()
+    if wait:
+        raise CircuitOpen(wait)
+
+    email = BaseEmailMessage(
+        template_name="emails/auth.html", context=message, connection=connection
+    )
+    try:
+        inject_failure()
+        if connection is not None:
+            # reconnects after an error closed it, otherwise does nothing
+            connection.open()
+        email.send(message["recipient_list"])
+    except SEND_ERRORS:
+        record_failure()
+        raise
+    record_success()
+
+    if kind is not None:
+        count(kind, "delivered")
+    return True
@@ -0,0 +1,147 @@
+from datetime import date, datetime, time, timezone as dt_timezone
+from typing import List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from iam import sharding
+from iam.models import AuthEvent
+
+TABLE = AuthEvent._meta.db_table
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(start: date) -> str:
+    return f"p{start:%Y%m}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly auth_event partitions ahead of time and drop the "
+        "expired ones; without partitioning, delete expired events in batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-months", type=int, default=settings.IAM_AUDIT_RETENTION_MONTHS
+        )
+        parser.add_argument(
+            "--ahead", type=int, default=settings.IAM_AUDIT_PARTITIONS_AHEAD
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="events deleted per statement without partitioning",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="print what would change"
+        )
+
+    def handle(self, *args, **options):
+        if options["retention_months"] < 1 or options["batch_size"] < 1:
+            raise CommandError("retention and batch size must be positive")
+
+        this_month = timezone.now().date().replace(day=1)
+        # everything before the first kept month is expired
+        cutoff = add_months(this_month, -options["retention_months"] + 1)
+
+        connection = connections[sharding.DIRECTORY_DATABASE]
+        if connection.vendor == "mysql":
+            self.partitions(connection, this_month, cutoff, options)
+        else:
+            self.delete_expired(cutoff, options)
+
+    def existing(self, connection) -> List[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT partition_name FROM information_schema.partitions "
+                "WHERE table_schema = DATABASE() AND table_name = %s "
+                "AND partition_name IS NOT NULL "
+                "ORDER BY partition_ordinal_position",
+                [TABLE],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def run_sql(self, connection, sql: str, dry_run: bool) -> None:
+        self.stdout.write(sql)
+        if not dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+
+    def partitions(self, connection, this_month, cutoff, options) -> None:
+        existing = self.existing(connection)
+        if "p_future" not in existing:
+            raise CommandError(f"{TABLE} is not partitioned, see migration iam 0009")
+
+        # p_future is empty while months are created ahead, so splitting it is cheap
+        months = [
+            add_months(this_month, offset) for offset in range(options["ahead"] + 1)
+        ]
+        missing = [start for start in months if partition_name(start) not in existing]
+        if missing:
+            last = max(
+                [start for start in months if partition_name(start) in existing],
+                default=None,
+            )
+            # ranges must keep increasing, so never split below a month that exists
+            missing = [start for start in missing if last is None or start > last]
+            definitions = ", ".join(
+                f"PARTITION {partition_name(start)} "
+                f"VALUES LESS THAN ('{add_months(start, 1):%Y-%m-%d}')"
+                for start in missing
+            )
+            if definitions:
+                self.run_sql(
+                    connection,
+                    f"ALTER TABLE {TABLE} REORGANIZE PARTITION p_future INTO "
+                    f"({definitions}, PARTITION p_future VALUES LESS THAN (MAXVALUE))",
+                    options["dry_run"],
+                )
+
+        expired = [
+            name
+            for name in existing
+            if name != "p_future" and name < partition_name(cutoff)
+        ]
+        if expired:
+            # dropping a partition discards its rows without touching the others
+            self.run_sql(
+                connection,
+                f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}",
+                options["dry_run"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(missing)} partitions created, {len(expired)} dropped"
+            )
+        )
+
+    def delete_expired(self, cutoff, options) -> None:
+        expired = AuthEvent.objects.filter(
+            occurred_at__lt=datetime.combine(cutoff, time.min, tzinfo=dt_timezone.utc)
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} events to delete")
+            return
+
+        deleted = 0
+        while True:
+            # short statements, so the inserts of the web processes never wait long
+            ids = list(
+                expired.order_by("occurred_at", "id").values_list("id", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not ids:
+                break
+            deleted += AuthEvent.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} events deleted"))
@@ -0,0 +1,67 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from utils.parsers import FastJSONParser
+from utils.renderers import FastJSONRenderer, orjson
+
+
+def endpoint_payloads():
+    refresh = RefreshToken()
+    return {
+        "login": {
+            "email": "example@abc.org",
+            "username": "example@abc.org",
+            "tokens": {
+                "refresh_token": str(refresh),
+                "access_token": str(refresh.access_token),
+            },
+        },
+        "token-refresh": {"access": str(refresh.access_token)},
+        "register": {"message": "register successful!"},
+        "error": {
+            "detail": "invalid credentials",
+            "status_code": 401,
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare stdlib and fast JSON rendering/parsing cost per endpoint payload"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+
+    def timed(self, func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            # both would measure the stdlib
+            raise CommandError("orjson is not installed")
+
+        iterations = options["iterations"]
+        pairs = {
+            "stdlib": (JSONRenderer(), JSONParser()),
+            "fast": (FastJSONRenderer(), FastJSONParser()),
+        }
+
+        self.stdout.write(
+            f"{'endpoint':<16}{'impl':<8}{'render us':>12}{'parse us':>12}"
+        )
+        for endpoint, payload in endpoint_payloads().items():
+            body = JSONRenderer().render(payload)
+            for impl, (renderer, parser) in pairs.items():
+                render = self.timed(lambda: renderer.render(payload), iterations)
+                parse = self.timed(lambda: parser.parse(io.BytesIO(body)), iterations)
+                self.stdout.write(
+                    f"{endpoint:<16}{impl:<8}{render:>12.2f}{parse:>12.2f}"
+                )
@@ -0,0 +1,60 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+SCOPED_MIDDLEWARE = "utils.middleware.PathScopedMiddleware"
+
+
+def flat_middleware():
+    """MIDDLEWARE as it was before scoping: the session stack runs everywhere."""
+    middleware = []
+    for path in settings.MIDDLEWARE:
+        if path == SCOPED_MIDDLEWARE:
+            middleware.extend(settings.SESSION_STACK_MIDDLEWARE)
+        else:
+            middleware.append(path)
+    return middleware
+
+
+class Command(BaseCommand):
+    help = "Compare per-request middleware cost of the flat and path-scoped stacks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--path",
+            default="/api/v1/auth/email-verify?token=invalid",
+            help="a cheap endpoint that does not touch the database",
+        )
+
+    def bench(self, middleware, path, requests):
+        with override_settings(MIDDLEWARE=middleware):
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            # the first request builds the middleware chain
+            client.get(path)
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        return (time.perf_counter() - start) / requests * 1e6
+
+    def handle(self, *args, **options):
+        path, requests = options["path"], options["requests"]
+
+        # keep per-request 4xx warnings out of the measurement
+        logging.disable(logging.WARNING)
+        try:
+            flat = self.bench(flat_middleware(), path, requests)
+            scoped = self.bench(settings.MIDDLEWARE, path, requests)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f"path:   {path} ({requests} requests)")
+        self.stdout.write(f"flat:   {flat:.1f} us/request")
+        self.stdout.write(f"scoped: {scoped:.1f} us/request")
+        self.stdout.write(
+            f"saved:  {flat - scoped:.1f} us/request ({(flat - scoped) / flat:.1%})"
+        )
@@ -0,0 +1,59 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from iam.minting import minter
+from iam.rotation import FAMILY_CLAIM
+
+
+def claims():
+    # what a login puts in a pair, without the database
+    return {
+        api_settings.USER_ID_CLAIM: "12345",
+        FAMILY_CLAIM: uuid.uuid4().hex,
+        "perms": "gAAAAAAAAAAAAAAAAAAAAQ",
+        "groups": [3, 7],
+        "su": False,
+    }
+
+
+def simplejwt_pair(claims):
+    refresh = RefreshToken()
+    for claim, value in claims.items():
+        refresh[claim] = value
+    return str(refresh), str(refresh.access_token)
+
+
+def minted_pair(claims):
+    return minter().pair(claims)
+
+
+class Command(BaseCommand):
+    help = "Compare minting token pairs through simplejwt with iam.minting"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+
+    def timed(self, mint, iterations):
+        payload = claims()
+        mint(payload)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            mint(payload)
+        return (time.perf_counter() - start) / iterations
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        baseline = self.timed(simplejwt_pair, iterations)
+        minted = self.timed(minted_pair, iterations)
+
+        for name, seconds in (("simplejwt", baseline), ("minting", minted)):
+            self.stdout.write(
+                f"{name:10} {seconds * 1e6:6.1f} us/pair  "
+                f"{2 / seconds:9.0f} tokens/s"
+            )
+        self.stdout.write(f"speedup    {baseline / minted:.1f}x")
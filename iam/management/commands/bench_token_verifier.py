@@ -0,0 +1,85 @@
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from iam.models import User
+from iam.verifier import OK, TokenVerifier, VerifierClient
+
+
+class Command(BaseCommand):
+    help = "Compare token verification over HTTP with the Unix socket verifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument(
+            "--pipeline", type=int, default=32, help="requests in flight per write"
+        )
+        parser.add_argument(
+            "--path",
+            default=None,
+            help="an authenticated endpoint, the sessions list by default",
+        )
+
+    def bench_http(self, path, token, requests):
+        client = Client(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0], HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+        assert client.get(path).status_code == 200
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        return (time.perf_counter() - start) / requests * 1e6
+
+    def bench_socket(self, client, token, requests, pipeline):
+        assert client.verify(token)[0] == OK
+
+        start = time.perf_counter()
+        if pipeline == 1:
+            for _ in range(requests):
+                client.verify(token)
+        else:
+            batch = [token] * pipeline
+            for _ in range(0, requests, pipeline):
+                client.verify_many(batch)
+        return (time.perf_counter() - start) / requests * 1e6
+
+    def handle(self, *args, **options):
+        requests, pipeline = options["requests"], options["pipeline"]
+        path = options["path"] or reverse("sessions")
+
+        email = f"bench-{uuid.uuid4().hex[:12]}@example.org"
+        user = User.objects.create_user(
+            email=email, username=email, password=uuid.uuid4().hex, is_verified=True
+        )
+        token = user.tokens()["access_token"]
+
+        socket_path = os.path.join(tempfile.mkdtemp(), "verify.sock")
+        verifier = TokenVerifier(socket_path).start()
+        # keep per-request logging out of the measurement
+        logging.disable(logging.WARNING)
+        try:
+            http = self.bench_http(path, token, requests)
+            with VerifierClient(socket_path) as client:
+                sequential = self.bench_socket(client, token, requests, 1)
+                pipelined = self.bench_socket(client, token, requests, pipeline)
+        finally:
+            logging.disable(logging.NOTSET)
+            verifier.stop()
+            user.delete()
+
+        self.stdout.write(f"http:       {http:.1f} us/verification ({path})")
+        self.stdout.write(f"socket:     {sequential:.1f} us/verification")
+        self.stdout.write(
+            f"pipelined:  {pipelined:.1f} us/verification ({pipeline} in flight)"
+        )
+        self.stdout.write(
+            f"speedup:    {http / sequential:.0f}x, {http / pipelined:.0f}x"
+        )
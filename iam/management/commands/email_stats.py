@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from iam import emails
+
+
+class Command(BaseCommand):
+    help = "Show the SMTP circuit and what became of the emails enqueued"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"smtp circuit: {emails.circuit_state()}")
+        for kind, counters in emails.stats().items():
+            enqueued = counters["enqueued"]
+            share = counters["suppressed"] / enqueued if enqueued else 0
+            self.stdout.write(
+                f"{kind}: {enqueued} enqueued, {counters['delivered']} delivered, "
+                f"{counters['suppressed']} suppressed ({share:.0%}), "
+                f"{counters['failed']} failed"
+            )
@@ -0,0 +1,183 @@
+import json
+import re
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from iam.models import User, UserDirectory, UserSession
+from iam.utils import canonical_email
+
+TABLES = (
+    User._meta.db_table,
+    UserDirectory._meta.db_table,
+    UserSession._meta.db_table,
+    OutstandingToken._meta.db_table,
+    BlacklistedToken._meta.db_table,
+)
+
+
+def auth_queries(user, email, jti, family):
+    """The ORM queries the iam views, serializers and authentication issue."""
+    now = timezone.now()
+    return {
+        "login / reset-email: user by email": User.objects.filter(
+            email_normalized=canonical_email(email)
+        ),
+        "login / reset-email: shard by email": UserDirectory.objects.filter(
+            email_normalized=canonical_email(email)
+        ).values_list("shard"),
+        "token checks: shard by user id": UserDirectory.objects.filter(
+            pk=user
+        ).values_list("shard"),
+        "register: email and username uniqueness": UserDirectory.objects.filter(
+            Q(email_normalized=canonical_email(email)) | Q(username=email)
+        ).values_list("email_normalized", "username"),
+        "jwt auth / verify-email / reset-check: user by id": User.objects.filter(
+            id=user
+        ),
+        "permissions: direct permissions": User.user_permissions.through.objects.filter(
+            user_id=user
+        ).values_list("permission_id"),
+        "permissions: groups": User.groups.through.objects.filter(
+            user_id=user
+        ).values_list("group_id"),
+        "logout: outstanding token by jti": OutstandingToken.objects.filter(jti=jti),
+        "logout / rotation audit: blacklist check": BlacklistedToken.objects.filter(
+            token__jti=jti
+        ),
+        "sessions: active sessions": UserSession.objects.filter(
+            user_id=user,
+            revoked_at__isnull=True,
+            last_used_at__gt=now - timedelta(days=1),
+        ).order_by("-last_used_at"),
+        "rotation audit: session by family": UserSession.objects.filter(family=family),
+        "revoke: outstanding tokens of user": OutstandingToken.objects.filter(
+            user_id=user, expires_at__gt=now, blacklistedtoken__isnull=True
+        ).values_list("id"),
+        "revoke: outstanding tokens of selected sessions": OutstandingToken.objects.filter(
+            jti__in=UserSession.objects.filter(
+                user_id=user, revoked_at__isnull=True, id__in=[1, 2]
+            ).values("refresh_jti")
+        ).values_list(
+            "id"
+        ),
+        "admin: user list by email prefix": User.objects.filter(
+            email_normalized__startswith=canonical_email(email)[:3]
+        ).order_by("-id")[:100],
+    }
+
+
+class PlanReader:
+    """Extracts full scans and used indexes from a backend's EXPLAIN output."""
+
+    def __init__(self, vendor: str):
+        self.vendor = vendor
+
+    def explain(self, queryset) -> str:
+        if self.vendor == "mysql":
+            return queryset.explain(format="json")
+        return queryset.explain()
+
+    def read(self, plan: str):
+        if self.vendor == "mysql":
+            return self._read_mysql(json.loads(plan))
+        if self.vendor == "postgresql":
+            scans = re.findall(r"Seq Scan on (\w+)", plan)
+            indexes = re.findall(
+                r"Index(?: Only)? Scan(?: Backward)? using (\w+)", plan
+            )
+            indexes += re.findall(r"Bitmap Index Scan on (\w+)", plan)
+            return scans, indexes
+        scans = re.findall(r"SCAN (\w+)(?! USING)", plan)
+        indexes = re.findall(r"USING (?:COVERING )?INDEX (\w+)", plan)
+        if "PRIMARY KEY" in plan:
+            indexes.append("PRIMARY")
+        return scans, indexes
+
+    def _read_mysql(self, node, scans=None, indexes=None):
+        scans = [] if scans is None else scans
+        indexes = [] if indexes is None else indexes
+        if isinstance(node, dict):
+            if "table_name" in node and "access_type" in node:
+                if node["access_type"] == "ALL":
+                    scans.append(node["table_name"])
+                if node.get("key"):
+                    indexes.append(node["key"])
+            for value in node.values():
+                self._read_mysql(value, scans, indexes)
+        elif isinstance(node, list):
+            for value in node:
+                self._read_mysql(value, scans, indexes)
+        return scans, indexes
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the auth access patterns and flag full scans and unused indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="print every plan"
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        reader = PlanReader(connection.vendor)
+
+        sample = User.objects.using(options["database"]).order_by("id").first()
+        token = (
+            OutstandingToken.objects.using(options["database"]).order_by("id").first()
+        )
+        session = UserSession.objects.using(options["database"]).order_by("id").first()
+        queries = auth_queries(
+            user=sample.id if sample else 1,
+            email=sample.email if sample else "someone@example.org",
+            jti=token.jti if token else "0" * 32,
+            family=session.family if session else "0" * 32,
+        )
+
+        used = set()
+        full_scans = []
+        for name, queryset in queries.items():
+            plan = reader.explain(queryset.using(options["database"]))
+            scans, indexes = reader.read(plan)
+            used.update(indexes)
+
+            status = "FULL SCAN" if scans else "ok"
+            self.stdout.write(f"[{status:>9}] {name}: indexes {sorted(set(indexes))}")
+            if scans:
+                full_scans.append((name, scans))
+            if options["verbose_plans"]:
+                self.stdout.write(plan)
+
+        self.stdout.write("")
+        with connection.cursor() as cursor:
+            for table in TABLES:
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for index_name, info in sorted(constraints.items()):
+                    if not info["index"] or info["primary_key"] or index_name in used:
+                        continue
+                    kind = (
+                        "unique, still enforces a constraint"
+                        if info["unique"]
+                        else "index"
+                    )
+                    self.stdout.write(
+                        f"unused by auth queries: {table}.{index_name} "
+                        f"({', '.join(info['columns'])}; {kind})"
+                    )
+
+        if full_scans:
+            self.stdout.write(
+                self.style.WARNING(f"{len(full_scans)} queries do a full scan")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("no full scans"))
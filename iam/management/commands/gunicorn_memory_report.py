@@ -0,0 +1,123 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def children(pid: int):
+    result = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name may contain spaces, the ppid follows its closing paren
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        if ppid == pid:
+            result.append(int(entry))
+    return result
+
+
+def memory(pid: int):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare per-worker memory of gunicorn with and without app preloading"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--bind", default="127.0.0.1:8765")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--path", default="/api/v1/auth/email-verify?token=invalid")
+        parser.add_argument("--boot-timeout", type=float, default=60)
+
+    def warm_up(self, options):
+        url = f"http://{options['bind']}{options['path']}"
+        for _ in range(options["requests"]):
+            try:
+                urllib.request.urlopen(url, timeout=5).read()
+            except urllib.error.HTTPError:
+                pass
+
+    def measure(self, preload: bool, options):
+        env = {
+            **os.environ,
+            "GUNICORN_PRELOAD": str(preload),
+            "GUNICORN_WORKERS": str(options["workers"]),
+            "GUNICORN_WORKER_CLASS": "sync",
+            "GUNICORN_BIND": options["bind"],
+            "GUNICORN_MAX_REQUESTS": "0",
+        }
+        master = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "python:doorable.gunicorn_config"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + options["boot_timeout"]
+            while True:
+                if master.poll() is not None:
+                    raise CommandError("gunicorn exited during boot")
+                try:
+                    self.warm_up({**options, "requests": 1})
+                    if len(children(master.pid)) >= options["workers"]:
+                        break
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise CommandError("gunicorn did not boot in time")
+                time.sleep(0.5)
+
+            self.warm_up(options)
+            workers = [memory(pid) for pid in children(master.pid)]
+            return memory(master.pid), workers
+        finally:
+            master.send_signal(signal.SIGTERM)
+            master.wait(timeout=30)
+
+    def handle(self, *args, **options):
+        if not os.path.exists("/proc/self/smaps_rollup"):
+            raise CommandError("this report needs Linux /proc/<pid>/smaps_rollup")
+
+        self.stdout.write(
+            f"{'mode':<12}{'master rss':>12}{'worker rss':>12}"
+            f"{'worker pss':>12}{'worker uss':>12}"
+        )
+        for preload in (False, True):
+            master, workers = self.measure(preload, options)
+            count = len(workers)
+            averages = {
+                key: sum(w[key] for w in workers) / count
+                for key in ("rss", "pss", "uss")
+            }
+            self.stdout.write(
+                f"{'preload' if preload else 'no preload':<12}"
+                f"{master['rss'] / 1024:>10.1f}MB"
+                f"{averages['rss'] / 1024:>10.1f}MB"
+                f"{averages['pss'] / 1024:>10.1f}MB"
+                f"{averages['uss'] / 1024:>10.1f}MB"
+            )
+        self.stdout.write(
+            "pss splits shared pages across processes and uss counts only private "
+            "pages, so they show the real per-worker cost"
+        )
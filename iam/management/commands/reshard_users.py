@@ -0,0 +1,64 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from iam import sharding
+from iam.resharding import misplaced_users, move_users, sync_reference_data
+
+
+class Command(BaseCommand):
+    help = "Move users to the shard their id hashes to, in batches, while serving"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="seconds to sleep between batches, to bound the load on the shards",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="only count the users to move"
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("batch size must be positive")
+        missing = [
+            alias for alias in sharding.shards() if alias not in settings.DATABASES
+        ]
+        if missing:
+            raise CommandError(f"shards without a database: {', '.join(missing)}")
+
+        if not options["dry_run"]:
+            for alias in sharding.shards():
+                if alias != sharding.DIRECTORY_DATABASE:
+                    copied = sync_reference_data(alias)
+                    self.stdout.write(f"{alias}: {copied} reference rows in sync")
+
+        moved = 0
+        start = time.perf_counter()
+        for batch in misplaced_users(options["batch_size"]):
+            routes = defaultdict(list)
+            for user_id, source, target in batch:
+                routes[(source, target)].append(user_id)
+
+            for (source, target), user_ids in routes.items():
+                if options["dry_run"]:
+                    count = len(user_ids)
+                else:
+                    count = move_users(user_ids, source, target)
+                moved += count
+                self.stdout.write(f"{source} -> {target}: {count} users")
+
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        verb = "to move" if options["dry_run"] else "moved"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{moved} users {verb} in {time.perf_counter() - start:.1f}s"
+            )
+        )
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from iam.verifier import TokenVerifier
+
+
+class Command(BaseCommand):
+    help = "Serve token verification on a Unix socket for services on this host"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.IAM_VERIFIER_SOCKET)
+        parser.add_argument(
+            "--refresh-interval",
+            type=float,
+            default=settings.IAM_VERIFIER_REFRESH_INTERVAL,
+            help="seconds between reloads of user and session state",
+        )
+
+    def handle(self, *args, **options):
+        verifier = TokenVerifier(
+            options["socket"], refresh_interval=options["refresh_interval"]
+        )
+        self.stdout.write(f"verifying tokens on {options['socket']}")
+        try:
+            verifier.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,214 @@
+import base64
+import os
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from iam import sharding
+from iam.models import User, UserDirectory
+from iam.utils import canonical_email
+
+# a signed refresh token is about this long, keeps table sizes realistic
+TOKEN_LENGTH = 330
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users and token histories for scale testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--verified-ratio", type=float, default=0.8)
+        parser.add_argument("--active-ratio", type=float, default=0.97)
+        parser.add_argument(
+            "--tokens-per-user",
+            type=float,
+            default=2.0,
+            help="average outstanding refresh tokens per user",
+        )
+        parser.add_argument(
+            "--blacklisted-ratio",
+            type=float,
+            default=0.3,
+            help="share of outstanding tokens that are blacklisted",
+        )
+        parser.add_argument("--password", default="password123")
+        parser.add_argument("--days", type=int, default=3 * 365)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument(
+            "--fast-load",
+            action="store_true",
+            help="relax per-row checks for this session where the backend allows it",
+        )
+        parser.add_argument(
+            "--prefix",
+            default=None,
+            help="email prefix that keeps repeated runs unique",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["count"] < 1:
+            raise CommandError("count and batch size must be positive")
+
+        self.rng = random.Random(options["seed"])
+        fake = Faker()
+        if options["seed"] is not None:
+            Faker.seed(options["seed"])
+
+        # names come from small Faker pools, generating millions one by one is too slow
+        self.first_names = [fake.first_name() for _ in range(1000)]
+        self.last_names = [fake.last_name() for _ in range(1000)]
+        self.domains = [fake.free_email_domain() for _ in range(50)]
+        self.prefix = options["prefix"] or uuid.uuid4().hex[:6]
+        # hashing is the slow part of creating a user, every row shares one hash
+        self.password = make_password(options["password"])
+        self.now = timezone.now()
+        self.options = options
+
+        if options["fast_load"]:
+            self.relax_session_checks()
+
+        totals = {"users": 0, "outstanding": 0, "blacklisted": 0}
+        start = time.perf_counter()
+        for offset in range(0, options["count"], options["batch_size"]):
+            size = min(options["batch_size"], options["count"] - offset)
+            with transaction.atomic():
+                counts = self.seed_batch(offset, size)
+            for table, count in counts.items():
+                totals[table] += count
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{totals['users']} users, {totals['outstanding']} tokens, "
+                f"{totals['blacklisted']} blacklisted "
+                f"({totals['users'] / elapsed:.0f} users/s)"
+            )
+
+        elapsed = time.perf_counter() - start
+        rows = sum(totals.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"inserted {rows} rows in {elapsed:.1f}s on {connection.vendor}: "
+                f"{totals['users'] / elapsed:.0f} users/s, {rows / elapsed:.0f} rows/s"
+            )
+        )
+
+    def relax_session_checks(self) -> None:
+        # rows are generated unique and with valid references, so the per-row
+        # checks only slow the load down
+        statements = {
+            "mysql": [
+                "SET SESSION unique_checks = 0",
+                "SET SESSION foreign_key_checks = 0",
+            ],
+            "sqlite": ["PRAGMA synchronous = OFF", "PRAGMA journal_mode = MEMORY"],
+        }.get(connection.vendor, [])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def build_user(self, index: int) -> User:
+        first = self.rng.choice(self.first_names)
+        last = self.rng.choice(self.last_names)
+        email = f"{first}.{last}.{self.prefix}{index}@{self.rng.choice(self.domains)}".lower()
+        joined = self.now - timedelta(
+            seconds=self.rng.randrange(self.options["days"] * 86400)
+        )
+        return User(
+            email=email,
+            username=email,
+            email_normalized=canonical_email(email),
+            password=self.password,
+            first_name=first,
+            last_name=last,
+            is_active=self.rng.random() < self.options["active_ratio"],
+            is_verified=self.rng.random() < self.options["verified_ratio"],
+            date_joined=joined,
+            last_login=joined + (self.now - joined) * self.rng.random(),
+        )
+
+    def token_count(self) -> int:
+        average = self.options["tokens_per_user"]
+        count = int(average)
+        if self.rng.random() < average - count:
+            count += 1
+        return count
+
+    def fake_token(self) -> str:
+        return base64.urlsafe_b64encode(os.urandom(TOKEN_LENGTH * 3 // 4)).decode()
+
+    def seed_batch(self, offset: int, size: int):
+        users = [self.build_user(offset + i) for i in range(size)]
+        # the directory hands out user ids; everyone starts on the directory
+        # database and reshard_users spreads them over the shards
+        UserDirectory.objects.bulk_create(
+            [
+                UserDirectory(
+                    email_normalized=user.email_normalized,
+                    username=user.username,
+                    shard=sharding.DIRECTORY_DATABASE,
+                )
+                for user in users
+            ],
+            batch_size=size,
+        )
+
+        # MySQL does not return primary keys from bulk inserts, read them back
+        ids = dict(
+            UserDirectory.objects.filter(
+                email_normalized__in=[u.email_normalized for u in users]
+            ).values_list("email_normalized", "id")
+        )
+        for user in users:
+            user.pk = ids[user.email_normalized]
+        User.objects.bulk_create(users, batch_size=size)
+        user_ids = list(ids.values())
+
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+        tokens, blacklist_jtis = [], []
+        for user_id in user_ids:
+            for _ in range(self.token_count()):
+                created = self.now - timedelta(
+                    seconds=self.rng.randrange(self.options["days"] * 86400)
+                )
+                jti = uuid.uuid4().hex
+                tokens.append(
+                    OutstandingToken(
+                        user_id=user_id,
+                        jti=jti,
+                        token=self.fake_token(),
+                        created_at=created,
+                        expires_at=created + lifetime,
+                    )
+                )
+                if self.rng.random() < self.options["blacklisted_ratio"]:
+                    blacklist_jtis.append(jti)
+
+        OutstandingToken.objects.bulk_create(tokens, batch_size=size)
+
+        blacklisted = [
+            BlacklistedToken(token_id=id, blacklisted_at=self.now)
+            for id in OutstandingToken.objects.filter(
+                jti__in=blacklist_jtis
+            ).values_list("id", flat=True)
+        ]
+        BlacklistedToken.objects.bulk_create(blacklisted, batch_size=size)
+
+        return {
+            "users": len(users),
+            "outstanding": len(tokens),
+            "blacklisted": len(blacklisted),
+        }
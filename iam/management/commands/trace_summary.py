@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.tracing import read_traces
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = "Summarize the slowest traced phases per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None, help="trace export file")
+        parser.add_argument("--endpoint", default=None, help="only this endpoint")
+        parser.add_argument(
+            "--top", type=int, default=5, help="phases shown per endpoint"
+        )
+
+    def handle(self, *args, **options):
+        filename = options["file"] or settings.TRACE_EXPORT_FILE
+        phases = defaultdict(lambda: defaultdict(list))
+        traces = defaultdict(int)
+
+        for endpoint, spans in read_traces(filename):
+            endpoint = endpoint or "unknown"
+            if options["endpoint"] and endpoint != options["endpoint"]:
+                continue
+            traces[endpoint] += 1
+            for name, duration in spans:
+                phases[endpoint][name].append(duration)
+
+        if not traces:
+            self.stdout.write("no traces found")
+            return
+
+        for endpoint in sorted(traces, key=traces.get, reverse=True):
+            self.stdout.write(f"{endpoint} ({traces[endpoint]} traces)")
+            self.stdout.write(
+                f"  {'phase':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+            )
+            rows = sorted(
+                phases[endpoint].items(),
+                key=lambda item: percentile(item[1], 0.95),
+                reverse=True,
+            )
+            for name, durations in rows[: options["top"]]:
+                self.stdout.write(
+                    f"  {name:<24}{len(durations):>7}"
+                    f"{percentile(durations, 0.5):>10.2f}"
+                    f"{percentile(durations, 0.95):>10.2f}"
+                    f"{max(durations):>10.2f}"
+                )
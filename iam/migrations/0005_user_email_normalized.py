@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+import iam.models
+from django.db import migrations, models, transaction
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+
+BATCH_SIZE = 1000
+# colliding groups listed in the error, the rest are counted
+REPORTED_COLLISIONS = 20
+
+
+def check_email_collisions(apps, schema_editor):
+    """
+    Stops before any change when emails that differ only in case or
+    surrounding whitespace, like Foo@x.com and foo@x.com, would violate the
+    unique email_normalized column. The migration commits step by step, so
+    failing at the constraint would leave the column half-migrated.
+
+    The database groups the emails, and only the ids of the colliding ones
+    are fetched. Its LOWER differs from casefold() for a few characters like
+    ß; the unique constraint still catches collisions among those.
+    """
+    User = apps.get_model("iam", "User")
+    users = (
+        User.objects.using(schema_editor.connection.alias)
+        .annotate(normalized=Lower(Trim("email")))
+        .order_by()
+    )
+    collisions = users.values("normalized").annotate(n=Count("id")).filter(n__gt=1)
+    total = collisions.count()
+    if not total:
+        return
+
+    listed = list(
+        collisions.order_by("normalized").values_list("normalized", flat=True)[
+            :REPORTED_COLLISIONS
+        ]
+    )
+    ids = defaultdict(list)
+    for id, normalized in (
+        users.filter(normalized__in=listed)
+        .order_by("id")
+        .values_list("id", "normalized")
+    ):
+        ids[normalized].append(id)
+
+    more = total - len(listed)
+    raise RuntimeError(
+        f"{total} emails are shared by several users once normalized; merge or "
+        "rename them, then migrate again:\n"
+        + "\n".join(f"  {email!r}: users {ids[email]}" for email in listed)
+        + (f"\n  and {more} more" if more > 0 else "")
+    )
+
+
+def backfill_email_normalized(apps, schema_editor):
+    User = apps.get_model("iam", "User")
+    db_alias = schema_editor.connection.alias
+    users = User.objects.using(db_alias)
+
+    last_id = 0
+    while True:
+        batch = list(
+            users.filter(id__gt=last_id, email_normalized__isnull=True)
+            .order_by("id")
+            .only("id", "email")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for user in batch:
+            user.email_normalized = (user.email or "").strip().casefold()
+        with transaction.atomic(using=db_alias):
+            users.bulk_update(batch, ["email_normalized"])
+
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    # the backfill commits chunk by chunk instead of holding one huge transaction
+    atomic = False
+
+    dependencies = [
+        ("iam", "0004_alter_user_username"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_collisions, migrations.RunPython.noop),
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", iam.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="email_normalized",
+            field=models.CharField(editable=False, max_length=254, null=True),
+        ),
+        migrations.RunPython(backfill_email_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="user",
+            name="email_normalized",
+            field=models.CharField(editable=False, max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("iam", "0005_user_email_normalized"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="tokens_valid_after",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="UserSession",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("family", models.CharField(max_length=32, unique=True)),
+                ("refresh_jti", models.CharField(db_index=True, max_length=255)),
+                ("device", models.CharField(blank=True, max_length=255)),
+                ("ip_address", models.GenericIPAddressField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now_add=True)),
+                ("revoked_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sessions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "user_session",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "revoked_at", "created_at"],
+                        name="user_sessio_user_id_7db283_idx",
+                    )
+                ],
+            },
+        ),
+    ]
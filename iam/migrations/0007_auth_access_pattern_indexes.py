@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# token_blacklist is a third-party app; revoking a user's sessions filters its
+# outstanding tokens by (user_id, expires_at), so the index is added here.
+OUTSTANDING_TOKEN_INDEX = models.Index(
+    fields=["user", "expires_at"], name="outstanding_user_expiry_idx"
+)
+
+
+def add_outstanding_token_index(apps, schema_editor):
+    model = apps.get_model("token_blacklist", "OutstandingToken")
+    schema_editor.add_index(model, OUTSTANDING_TOKEN_INDEX)
+
+
+def remove_outstanding_token_index(apps, schema_editor):
+    model = apps.get_model("token_blacklist", "OutstandingToken")
+    schema_editor.remove_index(model, OUTSTANDING_TOKEN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("iam", "0006_user_tokens_valid_after_usersession"),
+        ("token_blacklist", "0012_alter_outstandingtoken_user"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="usersession",
+            index=models.Index(
+                fields=["user", "revoked_at", "last_used_at"],
+                name="user_session_active_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="email",
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="is_verified",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="username",
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="usersession",
+            name="refresh_jti",
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="usersession",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="sessions",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(
+            add_outstanding_token_index, remove_outstanding_token_index
+        ),
+        migrations.RemoveIndex(
+            model_name="usersession",
+            name="user_sessio_user_id_7db283_idx",
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:12
+
+from django.core.management.color import no_style
+from django.db import migrations, models, router, transaction
+
+BATCH_SIZE = 1000
+
+
+def backfill_directory(apps, schema_editor):
+    User = apps.get_model("iam", "User")
+    UserDirectory = apps.get_model("iam", "UserDirectory")
+    connection = schema_editor.connection
+    if not router.allow_migrate_model(connection.alias, UserDirectory):
+        return
+
+    users = User.objects.using(connection.alias)
+    last_id = 0
+    while True:
+        batch = list(
+            users.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "email_normalized", "username")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        # existing users keep their ids, which the directory hands out from now on
+        with transaction.atomic(using=connection.alias):
+            UserDirectory.objects.using(connection.alias).bulk_create(
+                [
+                    UserDirectory(
+                        id=id,
+                        email_normalized=email_normalized,
+                        username=username,
+                        shard=connection.alias,
+                    )
+                    for id, email_normalized, username in batch
+                ]
+            )
+
+        last_id = batch[-1][0]
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [UserDirectory]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # the backfill commits chunk by chunk instead of holding one huge transaction
+    atomic = False
+
+    dependencies = [
+        ("iam", "0007_auth_access_pattern_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDirectory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("email_normalized", models.CharField(max_length=254, unique=True)),
+                ("username", models.EmailField(max_length=254, unique=True)),
+                ("shard", models.CharField(max_length=64)),
+            ],
+            options={
+                "db_table": "user_directory",
+            },
+        ),
+        migrations.RunPython(backfill_directory, migrations.RunPython.noop),
+    ]
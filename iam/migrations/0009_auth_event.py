@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+# MySQL only partitions on columns of every unique key, so the primary key
+# takes occurred_at too. audit_partitions splits p_future into months and
+# drops the expired ones; other backends keep a single table.
+PARTITION_SQL = [
+    "ALTER TABLE auth_event DROP PRIMARY KEY, ADD PRIMARY KEY (id, occurred_at)",
+    "ALTER TABLE auth_event PARTITION BY RANGE COLUMNS(occurred_at) "
+    "(PARTITION p_future VALUES LESS THAN (MAXVALUE))",
+]
+UNPARTITION_SQL = [
+    "ALTER TABLE auth_event REMOVE PARTITIONING",
+    "ALTER TABLE auth_event DROP PRIMARY KEY, ADD PRIMARY KEY (id)",
+]
+
+
+def _run_on_mysql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "mysql":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("iam", "0008_user_directory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("occurred_at", models.DateTimeField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("login", "Login"),
+                            ("login_failed", "Login Failed"),
+                            ("logout", "Logout"),
+                            ("password_reset", "Password Reset"),
+                            ("email_verified", "Email Verified"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("user_id", models.BigIntegerField(blank=True, null=True)),
+                ("email", models.CharField(blank=True, max_length=254)),
+                ("ip_address", models.GenericIPAddressField(blank=True, null=True)),
+                ("user_agent", models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                "db_table": "auth_event",
+                "indexes": [
+                    models.Index(
+                        fields=["occurred_at", "id"], name="auth_event_time_idx"
+                    ),
+                    models.Index(
+                        fields=["user_id", "occurred_at", "id"],
+                        name="auth_event_user_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(
+            _run_on_mysql(PARTITION_SQL),
+            _run_on_mysql(UNPARTITION_SQL),
+            # not on shards, the table is only on the directory database
+            hints={"model_name": "authevent"},
+        ),
+    ]
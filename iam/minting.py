@@ -0,0 +1,140 @@
+"""
+Token minting for login, registration and refresh.
+
+A pair is built from one claim dict: the refresh and access payloads share
+everything but type, expiry and id, and are signed with a header segment
+and a key prepared once per process. The tokens are the same JWTs
+simplejwt's `TokenBackend.encode` produces, byte for byte.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import jwt
+from django.core.signals import setting_changed
+
+from rest_framework_simplejwt import settings as simplejwt_settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+def _b64(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+class TokenPair(NamedTuple):
+    refresh: str
+    access: str
+    # the claims of the refresh token, for recording the session
+    payload: Dict[str, Any]
+
+
+class TokenMinter:
+    def __init__(self):
+        # looked up here, simplejwt replaces the object when its settings change
+        api_settings = simplejwt_settings.api_settings
+        algorithm = api_settings.ALGORITHM
+        # PyJWT's header, with its key order
+        header = json.dumps(
+            {"alg": algorithm, "typ": "JWT"}, separators=(",", ":"), sort_keys=True
+        )
+        self.header = _b64(header.encode()) + b"."
+
+        self.algorithm = jwt.PyJWS().get_algorithm_by_name(algorithm)
+        self.key = self.algorithm.prepare_key(api_settings.SIGNING_KEY)
+        digest = HMAC_DIGESTS.get(algorithm)
+        # keyed once; a copy per token skips hashing the key again
+        self.mac = hmac.new(self.key, digestmod=digest) if digest else None
+
+        # what PyJWT encodes with; orjson writes the same bytes for the claims
+        encoder = api_settings.JSON_ENCODER
+        self.dumps: Callable[[Dict], bytes] = lambda payload: json.dumps(
+            payload, separators=(",", ":"), cls=encoder
+        ).encode()
+        if orjson is not None and encoder is None:
+            self.dumps = orjson.dumps
+
+        self.extra = {}
+        if api_settings.AUDIENCE is not None:
+            self.extra["aud"] = api_settings.AUDIENCE
+        if api_settings.ISSUER is not None:
+            self.extra["iss"] = api_settings.ISSUER
+
+        self.type_claim = api_settings.TOKEN_TYPE_CLAIM
+        self.jti_claim = api_settings.JTI_CLAIM
+        self.access_lifetime = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        self.refresh_lifetime = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+    def sign(self, payload: Dict[str, Any]) -> str:
+        if self.extra:
+            payload = {**payload, **self.extra}
+        signing_input = self.header + _b64(self.dumps(payload))
+        if self.mac is not None:
+            mac = self.mac.copy()
+            mac.update(signing_input)
+            signature = mac.digest()
+        else:
+            signature = self.algorithm.sign(signing_input, self.key)
+        return (signing_input + b"." + _b64(signature)).decode()
+
+    def payload(
+        self, token_type: str, lifetime: int, claims: Dict, now: int
+    ) -> Dict[str, Any]:
+        return {
+            self.type_claim: token_type,
+            "exp": now + lifetime,
+            "iat": now,
+            self.jti_claim: uuid.uuid4().hex,
+            **claims,
+        }
+
+    def pair(self, claims: Dict[str, Any], now: Optional[int] = None) -> TokenPair:
+        now = int(time.time()) if now is None else now
+        refresh = self.payload("refresh", self.refresh_lifetime, claims, now)
+        access = self.payload("access", self.access_lifetime, claims, now)
+        return TokenPair(self.sign(refresh), self.sign(access), refresh)
+
+    def access(self, claims: Dict[str, Any], now: Optional[int] = None) -> str:
+        now = int(time.time()) if now is None else now
+        return self.sign(self.payload("access", self.access_lifetime, claims, now))
+
+
+_minter: Optional[TokenMinter] = None
+
+
+def minter() -> TokenMinter:
+    global _minter
+    if _minter is None:
+        _minter = TokenMinter()
+    return _minter
+
+
+def mint_pair(claims: Dict[str, Any]) -> TokenPair:
+    return minter().pair(claims)
+
+
+def mint_access(claims: Dict[str, Any]) -> str:
+    return minter().access(claims)
+
+
+def _reset(setting, **kwargs):
+    global _minter
+    if setting in ("SIMPLE_JWT", "SECRET_KEY"):
+        _minter = None
+
+
+setting_changed.connect(_reset)
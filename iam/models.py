@@ -1,26 +1,245 @@
-from django.contrib.auth.models import AbstractUser, PermissionsMixin
-from django.db import models
+from typing import Dict, Optional
 
+from django.contrib.auth.models import (
+    AbstractUser,
+    PermissionsMixin,
+    UserManager as BaseUserManager,
+)
+from django.db import models, transaction
+
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from . import negative_cache, sharding
+from .minting import TokenPair, mint_access, mint_pair
+from .permissions import permission_claims
+from .rotation import FAMILY_CLAIM, new_family
+from .utils import canonical_email
+
+
+class UserManager(BaseUserManager):
+    def get_by_natural_key(self, email: str) -> "User":
+        email_normalized = canonical_email(email)
+        # a known-unknown email skips the query; ModelBackend still runs its
+        # dummy password hash on DoesNotExist, so login timing is unchanged
+        if negative_cache.is_known_absent(email_normalized):
+            raise self.model.DoesNotExist
+
+        shard = UserDirectory.objects.shard_of_email(email_normalized)
+        try:
+            if shard is None:
+                raise self.model.DoesNotExist
+            return self.using(shard).get(email_normalized=email_normalized)
+        except self.model.DoesNotExist:
+            negative_cache.remember_absent(email_normalized)
+            raise
+
+    def get_by_id(self, user_id) -> "User":
+        return self.using(UserDirectory.objects.shard_of(user_id)).get(pk=user_id)
+
+    def get_by_email(self, email: str):
+        try:
+            return self.get_by_natural_key(email)
+        except self.model.DoesNotExist:
+            return None
 
 
 # Create your models here.
 class User(AbstractUser, PermissionsMixin):
-    email = models.EmailField(unique=True, db_index=True)
-    username = models.EmailField(unique=True, db_index=True)
-    is_verified = models.BooleanField(default=False, db_index=True)
+    email = models.EmailField(unique=True)
+    username = models.EmailField(unique=True)
+    email_normalized = models.CharField(max_length=254, unique=True, editable=False)
+    is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # tokens issued at or before this moment are rejected
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
+    objects = UserManager()
+
     class Meta:
         db_table = "user"
 
-    def tokens(self):
-        refresh = RefreshToken.for_user(self)
-        return {
-            "refresh_token": str(refresh),
-            "access_token": str(refresh.access_token),
-        }
+    def save(self, *args, **kwargs):
+        self.email_normalized = canonical_email(self.email)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "email" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "email_normalized"}
+
+        entry = (self.email_normalized, self.username)
+        if self.pk is None and kwargs.get("using") in (None, *sharding.shards()):
+            # the directory hands out the id, which picks the shard
+            try:
+                with transaction.atomic(using=sharding.DIRECTORY_DATABASE):
+                    kwargs["using"] = UserDirectory.objects.allocate(self)
+                    super().save(*args, **kwargs)
+            except Exception:
+                self.pk = None
+                raise
+        else:
+            super().save(*args, **kwargs)
+            if getattr(self, "_directory_entry", entry) != entry:
+                UserDirectory.objects.filter(pk=self.pk).update(
+                    email_normalized=self.email_normalized, username=self.username
+                )
+        self._directory_entry = entry
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # what the directory holds, save() only updates it on a change
+        user._directory_entry = (
+            user.__dict__.get("email_normalized"),
+            user.__dict__.get("username"),
+        )
+        return user
+
+    def token_claims(self) -> Dict:
+        """What identifies the user in a token, the same claims as `for_user`."""
+        claims = {api_settings.USER_ID_CLAIM: str(self.pk)}
+        if api_settings.CHECK_REVOKE_TOKEN:
+            claims[api_settings.REVOKE_TOKEN_CLAIM] = get_md5_hash_password(
+                self.password
+            )
+        return claims
+
+    def issue_tokens(self) -> TokenPair:
+        """Mints the tokens of a new session and records its refresh token."""
+        claims = self.token_claims()
+        claims[FAMILY_CLAIM] = new_family()
+        claims.update(permission_claims(self))
+        pair = mint_pair(claims)
+
+        # outstanding tokens live on the user's shard
+        OutstandingToken.objects.using(self._state.db).create(
+            user=self,
+            jti=pair.payload[api_settings.JTI_CLAIM],
+            token=pair.refresh,
+            created_at=datetime_from_epoch(pair.payload["iat"]),
+            expires_at=datetime_from_epoch(pair.payload["exp"]),
+        )
+        return pair
+
+    def verification_token(self) -> str:
+        # an access token without a session, the link only proves the address
+        return mint_access(self.token_claims())
+
+    def refresh_token(self) -> RefreshToken:
+        return RefreshToken(self.issue_tokens().refresh, verify=False)
+
+    def tokens(self, pair: Optional[TokenPair] = None) -> Dict[str, str]:
+        pair = pair or self.issue_tokens()
+        return {"refresh_token": pair.refresh, "access_token": pair.access}
+
+
+class UserSession(models.Model):
+    # covered by the leading column of the composite index below
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="sessions", db_index=False
+    )
+    # the refresh token family this login started, see iam.rotation
+    family = models.CharField(max_length=32, unique=True)
+    refresh_jti = models.CharField(max_length=255)
+    device = models.CharField(max_length=255, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "user_session"
+        indexes = [
+            models.Index(
+                fields=["user", "revoked_at", "last_used_at"],
+                name="user_session_active_idx",
+            )
+        ]
+
+
+class UserDirectoryManager(models.Manager):
+    def shard_of(self, user_id) -> str:
+        if user_id is None or not sharding.is_sharded():
+            return sharding.shards()[0]
+
+        shard = sharding.cached_location(user_id)
+        if shard is None:
+            shard = self.filter(pk=user_id).values_list("shard", flat=True).first()
+            if shard is None:
+                return sharding.placement(user_id)
+            sharding.remember_locations({user_id: shard})
+        return shard
+
+    def shard_of_email(self, email_normalized: str) -> Optional[str]:
+        if not sharding.is_sharded():
+            return sharding.shards()[0]
+        return (
+            self.filter(email_normalized=email_normalized)
+            .values_list("shard", flat=True)
+            .first()
+        )
+
+    def allocate(self, user: User) -> str:
+        """Reserves a global id for a new user and returns the shard it goes on."""
+        shards = sharding.shards()
+        entry = self.create(
+            email_normalized=user.email_normalized,
+            username=user.username,
+            shard=shards[0],
+        )
+        if len(shards) > 1:
+            entry.shard = sharding.placement(entry.pk)
+            if entry.shard != shards[0]:
+                entry.save(update_fields=["shard"])
+
+        user.pk = entry.pk
+        return entry.shard
+
+
+class UserDirectory(models.Model):
+    """
+    Global index of users, kept on the directory database: its primary key is
+    the user id, unique across shards, and it finds a user by email.
+    """
+
+    email_normalized = models.CharField(max_length=254, unique=True)
+    username = models.EmailField(unique=True)
+    shard = models.CharField(max_length=64)
+
+    objects = UserDirectoryManager()
+
+    class Meta:
+        db_table = "user_directory"
+
+
+class AuthEvent(models.Model):
+    """Append-only audit trail of authentication events, written by iam.audit."""
+
+    class Kind(models.TextChoices):
+        LOGIN = "login"
+        LOGIN_FAILED = "login_failed"
+        LOGOUT = "logout"
+        PASSWORD_RESET = "password_reset"
+        EMAIL_VERIFIED = "email_verified"
+
+    occurred_at = models.DateTimeField()
+    kind = models.CharField(max_length=32, choices=Kind.choices)
+    # no foreign key: events outlive their users, who may live on other shards
+    user_id = models.BigIntegerField(null=True, blank=True)
+    email = models.CharField(max_length=254, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        db_table = "auth_event"
+        indexes = [
+            models.Index(fields=["occurred_at", "id"], name="auth_event_time_idx"),
+            models.Index(
+                fields=["user_id", "occurred_at", "id"], name="auth_event_user_idx"
+            ),
+        ]
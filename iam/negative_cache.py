@@ -0,0 +1,22 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(email_normalized: str) -> str:
+    digest = hashlib.sha256(email_normalized.encode()).hexdigest()
+    return f"iam:absent:{digest}"
+
+
+def is_known_absent(email_normalized: str) -> bool:
+    return cache.get(_key(email_normalized)) is not None
+
+
+def remember_absent(email_normalized: str) -> None:
+    # entries expire on their own and the cache backend bounds the total size
+    cache.set(_key(email_normalized), 1, settings.IAM_NEGATIVE_EMAIL_CACHE_TIMEOUT)
+
+
+def forget_absent(email_normalized: str) -> None:
+    cache.delete(_key(email_normalized))
@@ -0,0 +1,180 @@
+import time
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+
+from rest_framework import permissions
+
+PERMS_CLAIM = "perms"
+GROUPS_CLAIM = "groups"
+SUPERUSER_CLAIM = "su"
+
+GENERATION_KEY = "iam:perms:generation"
+
+
+def _generation() -> int:
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # seeded from the clock so an evicted counter never reuses old keys
+        generation = time.time_ns()
+        cache.add(GENERATION_KEY, generation, timeout=None)
+        generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def _key(kind: str, id=None) -> str:
+    if id is None:
+        return f"iam:perms:{_generation()}:{kind}"
+    return f"iam:perms:{_generation()}:{kind}:{id}"
+
+
+def _to_bits(permission_ids: Iterable[int]) -> int:
+    bits = 0
+    for permission_id in permission_ids:
+        bits |= 1 << permission_id
+    return bits
+
+
+def encode_bits(bits: int) -> str:
+    return format(bits, "x")
+
+
+def decode_bits(value: str) -> int:
+    try:
+        return int(value or "0", 16)
+    except (TypeError, ValueError):
+        return 0
+
+
+def bump_generation() -> None:
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_users(user_ids: Iterable[int]) -> None:
+    cache.delete_many([_key("user", id) for id in user_ids])
+
+
+def invalidate_groups(group_ids: Iterable[int]) -> None:
+    cache.delete_many([_key("group", id) for id in group_ids])
+
+
+def get_registry() -> Dict[str, int]:
+    """
+    Map of "app_label.codename" to the bit position of the permission.
+
+    The bit position is the permission primary key, which never changes once a
+    permission exists, so tokens issued before a new permission is added keep
+    their meaning.
+    """
+    key = _key("registry")
+    registry = cache.get(key)
+    if registry is None:
+        registry = {
+            f"{app_label}.{codename}": id
+            for app_label, codename, id in Permission.objects.values_list(
+                "content_type__app_label", "codename", "id"
+            )
+        }
+        cache.set(key, registry, settings.IAM_PERMISSION_CACHE_TIMEOUT)
+    return registry
+
+
+def get_group_bits(group_ids: List[int]) -> Dict[int, int]:
+    if not group_ids:
+        return {}
+
+    keys = {_key("group", id): id for id in group_ids}
+    cached = cache.get_many(keys.keys())
+    result = {keys[key]: bits for key, bits in cached.items()}
+
+    missing = [id for id in group_ids if id not in result]
+    if missing:
+        fetched = {id: 0 for id in missing}
+        for group_id, permission_id in Permission.objects.filter(
+            group__in=missing
+        ).values_list("group", "id"):
+            fetched[group_id] |= 1 << permission_id
+        cache.set_many(
+            {_key("group", id): bits for id, bits in fetched.items()},
+            settings.IAM_PERMISSION_CACHE_TIMEOUT,
+        )
+        result.update(fetched)
+
+    return result
+
+
+def resolve(user_id, db) -> Dict:
+    key = _key("user", user_id)
+    entry = cache.get(key)
+    if entry is None:
+        User = get_user_model()
+        # the membership rows live on the user's shard, read them without a join
+        entry = {
+            "bits": _to_bits(
+                User.user_permissions.through.objects.using(db)
+                .filter(user_id=user_id)
+                .values_list("permission_id", flat=True)
+            ),
+            "groups": list(
+                User.groups.through.objects.using(db)
+                .filter(user_id=user_id)
+                .values_list("group_id", flat=True)
+            ),
+        }
+        cache.set(key, entry, settings.IAM_PERMISSION_CACHE_TIMEOUT)
+
+    bits = entry["bits"]
+    for group_bits in get_group_bits(entry["groups"]).values():
+        bits |= group_bits
+
+    return {"bits": bits, "groups": entry["groups"]}
+
+
+def resolve_user(user) -> Dict:
+    return resolve(user.pk, user._state.db)
+
+
+def claims(user_id, db, is_superuser: bool) -> Dict:
+    resolved = resolve(user_id, db)
+    return {
+        PERMS_CLAIM: encode_bits(resolved["bits"]),
+        GROUPS_CLAIM: resolved["groups"],
+        SUPERUSER_CLAIM: is_superuser,
+    }
+
+
+def permission_claims(user) -> Dict:
+    return claims(user.pk, user._state.db, user.is_superuser)
+
+
+def has_perms(bits: int, perm_list: Iterable[str]) -> bool:
+    registry = get_registry()
+    for perm in perm_list:
+        id = registry.get(perm)
+        if id is None or not bits >> id & 1:
+            return False
+    return True
+
+
+class HasTokenPermissions(permissions.BasePermission):
+    """
+    Checks `view.required_permissions` against the claims embedded by
+    `User.tokens()`, so the check itself never touches the database.
+    """
+
+    def has_permission(self, request, view) -> bool:
+        token = request.auth
+        if token is None:
+            return False
+
+        if token.get(SUPERUSER_CLAIM, False):
+            return True
+
+        required = getattr(view, "required_permissions", ())
+        return has_perms(decode_bits(token.get(PERMS_CLAIM, "")), required)
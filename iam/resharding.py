@@ -0,0 +1,143 @@
+from typing import Dict, Iterator, List, Tuple
+
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from . import sharding
+from .models import User, UserDirectory, UserSession
+
+# copied in this order so every row finds what it points to; each is matched
+# on its primary key and the fields it is unique by
+REFERENCE_MODELS = [
+    (ContentType, ("app_label", "model")),
+    (Permission, ("content_type_id", "codename")),
+    (Group, ("name",)),
+    (Group.permissions.through, ("group_id", "permission_id")),
+]
+
+
+def sync_reference_data(alias: str) -> int:
+    """
+    Makes the reference data on `alias` an exact copy of the directory
+    database's, so a shard's membership rows point at the same ids.
+    """
+    copied = 0
+    with transaction.atomic(using=alias):
+        for model, unique_by in REFERENCE_MODELS:
+            fields = [f.attname for f in model._meta.concrete_fields]
+            rows = list(model.objects.using(sharding.DIRECTORY_DATABASE))
+            keep = {(row.pk, *[getattr(row, f) for f in unique_by]) for row in rows}
+
+            # rows migrate created on the shard may use the ids differently
+            stale = [
+                pk
+                for pk, *key in model.objects.using(alias).values_list("pk", *unique_by)
+                if (pk, *key) not in keep
+            ]
+            model.objects.using(alias).filter(pk__in=stale).delete()
+
+            options = {"update_conflicts": True, "update_fields": fields[1:]}
+            if connections[alias].features.supports_update_conflicts_with_target:
+                options["unique_fields"] = [model._meta.pk.name]
+            if len(fields) == 1 + len(unique_by) and model._meta.auto_created:
+                # a through table has nothing to update, only to insert
+                options = {"ignore_conflicts": True}
+            model.objects.using(alias).bulk_create(rows, **options)
+            copied += len(rows)
+    return copied
+
+
+def misplaced_users(batch_size: int) -> Iterator[List[Tuple[int, str, str]]]:
+    """Yields batches of (user id, current shard, placement) to move."""
+    last_id = 0
+    while True:
+        batch = list(
+            UserDirectory.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", "shard")[:batch_size]
+        )
+        if not batch:
+            return
+
+        moves = [
+            (id, shard, sharding.placement(id))
+            for id, shard in batch
+            if shard != sharding.placement(id)
+        ]
+        if moves:
+            yield moves
+        last_id = batch[-1][0]
+
+
+def _copy(model, rows, target: str) -> None:
+    for row in rows:
+        # ids of these tables are local to a shard
+        row.pk = None
+    model.objects.using(target).bulk_create(rows)
+
+
+def move_users(user_ids: List[int], source: str, target: str) -> int:
+    """
+    Moves users and every row that belongs to them from `source` to
+    `target`, then points the directory at `target`.
+
+    The user rows stay locked on `source` until the move commits, so writes
+    for these users wait instead of being lost; rows are copied before the
+    directory changes and deleted from `source` last, so a failed move can
+    be run again.
+    """
+    with transaction.atomic(using=source), transaction.atomic(
+        using=sharding.DIRECTORY_DATABASE
+    ), transaction.atomic(using=target):
+        users = list(
+            User.objects.using(source)
+            .select_for_update()
+            .filter(pk__in=user_ids)
+            .order_by("pk")
+        )
+        if not users:
+            return 0
+        ids = [user.pk for user in users]
+
+        # left behind by a move that stopped before deleting from source
+        User.objects.using(target).filter(pk__in=ids).delete()
+        User.objects.using(target).bulk_create(users)
+
+        for model in (User.groups.through, User.user_permissions.through):
+            _copy(
+                model, list(model.objects.using(source).filter(user_id__in=ids)), target
+            )
+        _copy(
+            UserSession,
+            list(UserSession.objects.using(source).filter(user_id__in=ids)),
+            target,
+        )
+
+        tokens = list(OutstandingToken.objects.using(source).filter(user_id__in=ids))
+        blacklisted: Dict[str, object] = dict(
+            BlacklistedToken.objects.using(source)
+            .filter(token__user_id__in=ids)
+            .values_list("token__jti", "blacklisted_at")
+        )
+        _copy(OutstandingToken, tokens, target)
+        token_ids = OutstandingToken.objects.using(target).filter(
+            jti__in=list(blacklisted)
+        )
+        BlacklistedToken.objects.using(target).bulk_create(
+            [
+                BlacklistedToken(token_id=id, blacklisted_at=blacklisted[jti])
+                for jti, id in token_ids.values_list("jti", "id")
+            ]
+        )
+
+        UserDirectory.objects.filter(pk__in=ids).update(shard=target)
+        User.objects.using(source).filter(pk__in=ids).delete()
+
+    sharding.remember_locations({id: target for id in ids})
+    return len(ids)
@@ -0,0 +1,203 @@
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token, TokenError
+
+from . import permissions
+from .minting import TokenPair, mint_pair
+from .tasks import defer, record_token_reuse, record_token_rotation
+
+logger = logging.getLogger(__name__)
+
+FAMILY_CLAIM = "fam"
+
+# claims a rotated refresh token copies from the one it replaces; the
+# permission claims are resolved again
+COPIED_CLAIMS = (api_settings.USER_ID_CLAIM, api_settings.REVOKE_TOKEN_CLAIM)
+
+
+class TokenReused(TokenError):
+    pass
+
+
+def _ttl() -> int:
+    return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def _consumed_key(family: str, jti: str) -> str:
+    return f"iam:family:{family}:consumed:{jti}"
+
+
+def _revoked_key(family: str) -> str:
+    # 1 once the family is revoked, 0 while it is known to be live
+    return f"iam:family:{family}:revoked"
+
+
+def new_family() -> str:
+    family = uuid.uuid4().hex
+    # so its first rotation does not look the family up in the database
+    cache.set(_revoked_key(family), 0, _ttl())
+    return family
+
+
+def family_of(token: Token) -> str:
+    # tokens issued before rotation existed start a family of their own
+    return token.get(FAMILY_CLAIM) or token[api_settings.JTI_CLAIM]
+
+
+def _valid_after_key(user_id) -> str:
+    return f"iam:user:{user_id}:tokens_valid_after"
+
+
+def _user_state_key(user_id) -> str:
+    return f"iam:user:{user_id}:state"
+
+
+def user_state(user_id) -> Optional[Dict]:
+    """
+    What a refresh needs to know about the user, cached until the user is
+    saved: whether they may still log in, the shard they live on and their
+    tokens_valid_after. None when the user no longer exists.
+    """
+    key = _user_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        # imported here, the models import this module
+        from .models import User, UserDirectory
+
+        shard = UserDirectory.objects.shard_of(user_id)
+        user = User.objects.using(shard).filter(pk=user_id).first()
+        if user is None:
+            return None
+        valid_after = user.tokens_valid_after
+        state = {
+            "allowed": api_settings.USER_AUTHENTICATION_RULE(user),
+            "superuser": user.is_superuser,
+            "shard": shard,
+            "valid_after": int(valid_after.timestamp()) if valid_after else None,
+        }
+        cache.set(key, state, settings.IAM_PERMISSION_CACHE_TIMEOUT)
+    return state
+
+
+def forget_user_state(user_id) -> None:
+    cache.delete(_user_state_key(user_id))
+
+
+def revoke_family(family: str) -> None:
+    cache.set(_revoked_key(family), 1, _ttl())
+
+
+def revoke_families(families: Iterable[str]) -> None:
+    cache.set_many({_revoked_key(family): 1 for family in families}, _ttl())
+
+
+def revoke_user_tokens(user_id, at: datetime) -> None:
+    cache.set(_valid_after_key(user_id), int(at.timestamp()), _ttl())
+
+
+def issued_before_revocation(token: Token, valid_after: Optional[int]) -> bool:
+    # iat has second precision, so a token from the revocation second is rejected too
+    return valid_after is not None and token.get("iat", 0) <= valid_after
+
+
+def is_revoked(family: str) -> bool:
+    return bool(cache.get(_revoked_key(family)))
+
+
+def revoked_families(families: Iterable[str]) -> Set[str]:
+    keys = {_revoked_key(family): family for family in families}
+    return {keys[key] for key, revoked in cache.get_many(keys).items() if revoked}
+
+
+def revoked_in_database(token: Token, family: str, shard: str) -> bool:
+    """
+    Whether a family the cache holds nothing for, e.g. after an eviction,
+    was revoked: its session was, or `token` was consumed or logged out
+    with. The answer is cached like a revocation.
+    """
+    # imported here, the models import this module
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    from .models import UserSession
+
+    revoked = (
+        UserSession.objects.using(shard)
+        .filter(family=family, revoked_at__isnull=False)
+        .exists()
+        or BlacklistedToken.objects.using(shard)
+        .filter(token__jti=token[api_settings.JTI_CLAIM])
+        .exists()
+    )
+    if revoked:
+        revoke_family(family)
+    else:
+        # a revocation made in the meantime wins
+        cache.add(_revoked_key(family), 0, _ttl())
+    return revoked
+
+
+class RotatingToken(RefreshToken):
+    """A refresh token verified without the database blacklist lookup."""
+
+    def verify(self, *args, **kwargs) -> None:
+        # the family state in the cache stands in for the blacklist
+        Token.verify(self, *args, **kwargs)
+
+
+def rotate(raw_token: str) -> TokenPair:
+    """
+    Exchanges a refresh token for a new one in the same family.
+
+    The family state lives in the cache: a refresh token may be consumed
+    once, claimed with an atomic `cache.add`, and presenting it again revokes
+    the whole family. The database blacklist and sessions are written
+    afterwards by tasks, and only read when the cache has lost the family's
+    state. The user must still be allowed to log in, and the permission
+    claims are those the user has now.
+    """
+    # checks the signature, expiry and token type
+    refresh = RotatingToken(raw_token)
+
+    family = family_of(refresh)
+    user_id = refresh.get(api_settings.USER_ID_CLAIM)
+    state = cache.get_many([_revoked_key(family), _valid_after_key(user_id)])
+    revoked = state.get(_revoked_key(family))
+    valid_after = state.get(_valid_after_key(user_id))
+    if revoked or issued_before_revocation(refresh, valid_after):
+        raise TokenError("token family has been revoked")
+
+    user = user_state(user_id)
+    if user is None or not user["allowed"]:
+        raise TokenError("user is inactive or deleted")
+    if issued_before_revocation(refresh, user["valid_after"]):
+        raise TokenError("token family has been revoked")
+    if revoked is None and revoked_in_database(refresh, family, user["shard"]):
+        raise TokenError("token family has been revoked")
+
+    claims = {
+        claim: refresh.payload[claim]
+        for claim in COPIED_CLAIMS
+        if claim in refresh.payload
+    }
+    claims[FAMILY_CLAIM] = family
+    claims.update(permissions.claims(user_id, user["shard"], user["superuser"]))
+    rotated = mint_pair(claims)
+
+    jti = refresh[api_settings.JTI_CLAIM]
+    if not cache.add(
+        _consumed_key(family, jti), rotated.payload[api_settings.JTI_CLAIM], _ttl()
+    ):
+        revoke_family(family)
+        logger.warning("refresh token reuse detected, family %s revoked", family)
+        defer(record_token_reuse, raw_token)
+        raise TokenReused("token has already been used")
+
+    defer(record_token_rotation, raw_token, rotated.refresh)
+    return rotated
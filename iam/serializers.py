@@ -2,6 +2,8 @@ from typing import Dict
 
 from django.contrib import auth
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.encoding import (
     force_str,
 )
@@ -10,9 +12,16 @@ from django.utils.http import urlsafe_base64_decode
 from rest_framework import serializers, status
 from rest_framework.exceptions import AuthenticationFailed
 
+from rest_framework_simplejwt.exceptions import InvalidToken
+
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 
-from .models import User
+from utils.tracing import span
+
+from . import sharding
+from .models import AuthEvent, User, UserDirectory, UserSession
+from .rotation import FAMILY_CLAIM, family_of, revoke_family, rotate
+from .utils import canonical_email
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -26,7 +35,30 @@ class RegisterSerializer(serializers.ModelSerializer):
             "username",
             "password",
         ]
-        extra_kwargs = {"password": {"write_only": True}}
+        extra_kwargs = {
+            "password": {"write_only": True},
+            # uniqueness of both is checked in validate() with a single query
+            "email": {"validators": []},
+            "username": {"validators": []},
+        }
+
+    def validate(self, attrs: Dict) -> Dict:
+        email_normalized = canonical_email(attrs.get("email"))
+        username = attrs.get("username")
+
+        errors = {}
+        # the directory is global, users on every shard are checked at once
+        for existing_email, existing_username in UserDirectory.objects.filter(
+            Q(email_normalized=email_normalized) | Q(username=username)
+        ).values_list("email_normalized", "username"):
+            if existing_email == email_normalized:
+                errors["email"] = ["user with this email already exists."]
+            if existing_username == username:
+                errors["username"] = ["user with this username already exists."]
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
 
     def create(self, validated_data: Dict) -> User:
         password = validated_data.pop("password", None)
@@ -59,7 +91,8 @@ class LoginSerializer(serializers.ModelSerializer):
         email = attrs.get("email", "")
         password = attrs.get("password", "")
 
-        user = auth.authenticate(email=email, password=password)
+        with span("auth.authenticate"):
+            user = auth.authenticate(email=email, password=password)
 
         if not user:
             raise AuthenticationFailed("invalid credentials")
@@ -70,10 +103,16 @@ class LoginSerializer(serializers.ModelSerializer):
         if not user.is_verified:
             raise AuthenticationFailed("email is not verified")
 
+        with span("tokens.mint"):
+            pair = user.issue_tokens()
+
         return {
             "email": user.email,
             "username": user.username,
-            "tokens": user.tokens,
+            "tokens": user.tokens(pair),
+            # not serializer fields, the view uses these to record the session
+            "user": user,
+            "claims": pair.payload,
         }
 
 
@@ -102,7 +141,7 @@ class SetNewPasswordSerializer(serializers.ModelSerializer):
             uidb64 = attrs.get("uidb64")
 
             id = force_str(urlsafe_base64_decode(uidb64))
-            user = User.objects.get(id=id)
+            user = User.objects.get_by_id(id)
 
             if not PasswordResetTokenGenerator().check_token(user, token):
                 raise AuthenticationFailed(
@@ -111,6 +150,8 @@ class SetNewPasswordSerializer(serializers.ModelSerializer):
 
             user.set_password(password)
             user.save()
+            # not a serializer field, the view records the event against it
+            attrs["user"] = user
         except Exception:
             raise AuthenticationFailed(
                 "the reset link is invalid", status.HTTP_401_UNAUTHORIZED
@@ -129,7 +170,76 @@ class LogoutSerializer(serializers.Serializer):
         return attrs
 
     def save(self, **kwargs) -> None:
+        user_id = sharding.token_user_id(self.token)
         try:
-            RefreshToken(self.token).blacklist()
+            with sharding.pinned(UserDirectory.objects.shard_of(user_id)):
+                refresh = RefreshToken(self.token)
+                refresh.blacklist()
+                UserSession.objects.filter(
+                    family=family_of(refresh), revoked_at__isnull=True
+                ).update(revoked_at=timezone.now())
+            revoke_family(family_of(refresh))
         except TokenError:
             self.fail("bad_token")
+
+
+class TokenRotationSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs: Dict) -> Dict:
+        try:
+            pair = rotate(attrs["refresh"])
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        return {"refresh": pair.refresh, "access": pair.access}
+
+
+class UserSessionSerializer(serializers.ModelSerializer):
+    current = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserSession
+        fields = ["id", "device", "ip_address", "created_at", "last_used_at", "current"]
+
+    def get_current(self, session: UserSession) -> bool:
+        token = self.context.get("token")
+        return token is not None and token.get(FAMILY_CLAIM) == session.family
+
+
+class RevokeSessionsSerializer(serializers.Serializer):
+    sessions = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, attrs: Dict) -> Dict:
+        if attrs["all"] == ("sessions" in attrs):
+            raise serializers.ValidationError(
+                "provide either a list of sessions or all=true"
+            )
+        return attrs
+
+
+class AuthEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuthEvent
+        fields = [
+            "id",
+            "occurred_at",
+            "kind",
+            "user_id",
+            "email",
+            "ip_address",
+            "user_agent",
+        ]
+
+
+class AuthEventQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+    kind = serializers.ChoiceField(choices=AuthEvent.Kind.choices, required=False)
+    user = serializers.IntegerField(required=False)
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
@@ -0,0 +1,88 @@
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from .models import User, UserSession
+from .rotation import (
+    FAMILY_CLAIM,
+    forget_user_state,
+    revoke_families,
+    revoke_user_tokens,
+)
+
+
+def client_ip(request) -> Optional[str]:
+    """
+    The client's address, as DRF's throttling finds it: X-Forwarded-For is
+    only read behind NUM_PROXIES proxies, and only the entry the outermost of
+    them appended, as any before it were sent by the client.
+    """
+    num_proxies = drf_settings.NUM_PROXIES
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if num_proxies and forwarded:
+        addresses = forwarded.split(",")
+        return addresses[-min(num_proxies, len(addresses))].strip()
+    return request.META.get("REMOTE_ADDR")
+
+
+def start_session(user: User, claims: Dict, request) -> UserSession:
+    """Records the session whose refresh token carries `claims`."""
+    return user.sessions.create(
+        family=claims[FAMILY_CLAIM],
+        refresh_jti=claims[api_settings.JTI_CLAIM],
+        device=request.META.get("HTTP_USER_AGENT", "")[:255],
+        ip_address=client_ip(request),
+    )
+
+
+def active_sessions(user: User):
+    expired_before = timezone.now() - api_settings.REFRESH_TOKEN_LIFETIME
+    return user.sessions.filter(
+        revoked_at__isnull=True, last_used_at__gt=expired_before
+    ).order_by("-last_used_at")
+
+
+def revoke_sessions(user: User, session_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Revokes the given sessions of `user`, or all of them when `session_ids` is
+    None. Every step is a single set-based statement, whatever the number of
+    tokens, and revoking all sessions also rejects any token issued so far.
+    """
+    now = timezone.now()
+    # all of a user's rows live on the user's shard
+    db = user._state.db
+    sessions = user.sessions.filter(revoked_at__isnull=True)
+    outstanding = OutstandingToken.objects.using(db).filter(
+        user=user, expires_at__gt=now, blacklistedtoken__isnull=True
+    )
+    if session_ids is not None:
+        sessions = sessions.filter(id__in=list(session_ids))
+        outstanding = outstanding.filter(jti__in=sessions.values("refresh_jti"))
+
+    with transaction.atomic(using=db):
+        families = list(sessions.values_list("family", flat=True))
+        BlacklistedToken.objects.using(db).bulk_create(
+            [
+                BlacklistedToken(token_id=id)
+                for id in outstanding.values_list("id", flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+        sessions.filter(family__in=families).update(revoked_at=now)
+        if session_ids is None:
+            User.objects.using(db).filter(pk=user.pk).update(tokens_valid_after=now)
+
+    revoke_families(families)
+    if session_ids is None:
+        revoke_user_tokens(user.pk, now)
+        forget_user_state(user.pk)
+
+    return len(families)
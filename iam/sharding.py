@@ -0,0 +1,119 @@
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.state import token_backend
+
+# the user directory and the reference data (content types, permissions,
+# groups) are not sharded, they live here and are copied to every shard
+DIRECTORY_DATABASE = DEFAULT_DB_ALIAS
+# global tables that exist on the directory database only
+DIRECTORY_MODELS = {"iam.userdirectory", "iam.authevent"}
+
+# a user row and every row that belongs to it live on the same shard
+SHARDED_MODELS = {
+    "iam.user",
+    "iam.user_groups",
+    "iam.user_user_permissions",
+    "iam.usersession",
+    "token_blacklist.outstandingtoken",
+    "token_blacklist.blacklistedtoken",
+}
+
+_pinned: ContextVar[Optional[str]] = ContextVar("iam_shard", default=None)
+
+
+def shards() -> List[str]:
+    return settings.IAM_SHARDS
+
+
+def is_sharded() -> bool:
+    return len(shards()) > 1
+
+
+def placement(user_id) -> str:
+    """The shard a user is placed on, by a hash that is stable across processes."""
+    aliases = shards()
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return aliases[int.from_bytes(digest, "big") % len(aliases)]
+
+
+def _location_key(user_id) -> str:
+    return f"iam:shard:{user_id}"
+
+
+def cached_location(user_id) -> Optional[str]:
+    return cache.get(_location_key(user_id))
+
+
+def remember_locations(locations: Dict) -> None:
+    cache.set_many(
+        {_location_key(id): alias for id, alias in locations.items()},
+        settings.IAM_SHARD_LOCATION_CACHE_TIMEOUT,
+    )
+
+
+def token_user_id(raw_token: str):
+    """The user id of a token, read without verifying it, to pick a shard."""
+    try:
+        payload = token_backend.decode(raw_token, verify=False)
+    except TokenBackendError:
+        return None
+    return payload.get(api_settings.USER_ID_CLAIM)
+
+
+@contextmanager
+def pinned(alias: str):
+    """
+    Routes the sharded models to `alias` for the duration of the block, for
+    code that queries them without an instance to route by, like the token
+    models of simplejwt.
+    """
+    token = _pinned.set(alias)
+    try:
+        yield alias
+    finally:
+        _pinned.reset(token)
+
+
+class ShardRouter:
+    """
+    Sends the sharded models to the database of the instance they are
+    reached through, or of the enclosing `pinned` block, and to default
+    otherwise. Everything else is left to Django.
+    """
+
+    def _db_for(self, model, instance=None, **hints) -> Optional[str]:
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _pinned.get()
+
+    db_for_read = _db_for
+    db_for_write = _db_for
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        sharded = [obj._meta.label_lower in SHARDED_MODELS for obj in (obj1, obj2)]
+        if all(sharded):
+            return obj1._state.db == obj2._state.db
+        if any(sharded):
+            # the reference data a user row points to is copied to its shard
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if (
+            f"{app_label}.{model_name}" in DIRECTORY_MODELS
+            and db in shards()
+            and db != DIRECTORY_DATABASE
+        ):
+            return False
+        return None
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import sharding
+from .models import User, UserDirectory
+from .negative_cache import forget_absent
+from .permissions import bump_generation, invalidate_groups, invalidate_users
+from .rotation import forget_user_state
+
+M2M_ACTIONS = ("post_add", "post_remove", "post_clear")
+
+
+def _invalidate_membership(reverse, instance, pk_set, invalidate) -> None:
+    if not reverse:
+        invalidate([instance.pk])
+    elif pk_set:
+        invalidate(pk_set)
+    else:
+        # a reverse clear does not tell us which rows were affected
+        bump_generation()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in M2M_ACTIONS:
+        _invalidate_membership(reverse, instance, pk_set, invalidate_users)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in M2M_ACTIONS:
+        _invalidate_membership(reverse, instance, pk_set, invalidate_groups)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    email_normalized = instance.email_normalized
+    user_id = instance.pk
+    forget_absent(email_normalized)
+    forget_user_state(user_id)
+
+    # a concurrent miss may re-cache either before this transaction commits
+    def forget():
+        forget_absent(email_normalized)
+        forget_user_state(user_id)
+
+    transaction.on_commit(forget, using=instance._state.db)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+    forget_user_state(instance.pk)
+    # a user moved to another shard is deleted from the old one only
+    UserDirectory.objects.filter(pk=instance.pk, shard=instance._state.db).delete()
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    invalidate_groups([instance.pk])
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def permission_changed(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def reference_data_changed(sender, instance, **kwargs):
+    if not sharding.is_sharded() or instance._state.db != sharding.DIRECTORY_DATABASE:
+        return
+    if kwargs.get("action", "post_").startswith("pre_"):
+        return
+    transaction.on_commit(_sync_shards, using=sharding.DIRECTORY_DATABASE)
+
+
+def _sync_shards():
+    # imported here, it imports the models of simplejwt
+    from .resharding import sync_reference_data
+
+    for alias in sharding.shards():
+        if alias != sharding.DIRECTORY_DATABASE:
+            sync_reference_data(alias)
@@ -1,8 +1,82 @@
+import logging
+
 from celery import shared_task
-from templated_mail.mail import BaseEmailMessage
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+def defer(task, *args) -> None:
+    """Hands `task` to a worker, or runs it here when there is no broker."""
+    if settings.CELERY_BROKER_ENABLED:
+        task.delay(*args)
+        return
+    try:
+        task(*args)
+    except Exception:
+        # the caller is done by then, as with a worker
+        logger.exception("task %s failed", task.name)
+
+
+@shared_task(bind=True, max_retries=None)
+def send_email(self, message):
+    # imported here, it enqueues this task
+    from . import emails
+
+    try:
+        emails.deliver(message)
+    except (emails.CircuitOpen,) + emails.SEND_ERRORS as e:
+        retry = emails.next_attempt(message, e)
+        if retry is None:
+            emails.give_up(message, e)
+            return
+        message, countdown = retry
+        raise self.retry(args=(message,), countdown=countdown)
+
+
+@shared_task
+def record_token_rotation(consumed_token, issued_token):
+    # imported here, the token modules import this one
+    from . import sharding
+    from .models import UserDirectory, UserSession
+    from .rotation import FAMILY_CLAIM
+
+    # rotate() verified both tokens, which may have expired since
+    issued = RefreshToken(issued_token, verify=False)
+    shard = UserDirectory.objects.shard_of(issued.get(api_settings.USER_ID_CLAIM))
+    with sharding.pinned(shard):
+        issued.outstand()
+        RefreshToken(consumed_token, verify=False).blacklist()
+
+    UserSession.objects.using(shard).filter(family=issued.get(FAMILY_CLAIM)).update(
+        refresh_jti=issued["jti"], last_used_at=timezone.now()
+    )
 
 
 @shared_task
-def send_email(message):
-    email = BaseEmailMessage(template_name="emails/auth.html", context=message)
-    email.send(message["recipient_list"])
+def record_token_reuse(reused_token):
+    from . import sharding
+    from .models import UserDirectory, UserSession
+    from .rotation import family_of
+
+    # verified by rotate()
+    reused = RefreshToken(reused_token, verify=False)
+    user_id = reused.get(api_settings.USER_ID_CLAIM)
+    shard = UserDirectory.objects.shard_of(user_id)
+    with sharding.pinned(shard):
+        reused.blacklist()
+
+    # the family stays revoked should the cache lose it
+    UserSession.objects.using(shard).filter(
+        family=family_of(reused), revoked_at__isnull=True
+    ).update(revoked_at=timezone.now())
+
+
+@shared_task
+def record_auth_events(events):
+    from .audit import write_events
+
+    write_events(events)
@@ -0,0 +1,61 @@
+import socketserver
+import threading
+import time
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        if server.mode == "down":
+            self.wfile.write(b"421 service not available\r\n")
+            return
+        if server.mode == "hang":
+            # accepts and never greets, like a provider that is overloaded
+            time.sleep(server.hang)
+            return
+
+        self.wfile.write(b"220 stub ready\r\n")
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    server.messages += 1
+                    self.wfile.write(b"250 queued\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"DATA":
+                in_data = True
+                self.wfile.write(b"354 go ahead\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+class FlakySMTPServer(socketserver.ThreadingTCPServer):
+    """A local SMTP server that can be switched between up, down and hanging."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, hang: float = 1.0):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.mode = "up"
+        self.hang = hang
+        self.connections = 0
+        self.messages = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
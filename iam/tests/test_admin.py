@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.core.paginator import InvalidPage
+from django.test import TestCase
+from django.urls import reverse
+
+from utils.pagination import EstimatedCountPaginator
+
+from ..admin import UserAdmin
+from ..models import User
+
+
+class TestUserAdminChangelist(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email="admin@example.org", username="admin@example.org", password="pw"
+        )
+        User.objects.bulk_create(
+            User(
+                email=f"user{i}@example.org",
+                username=f"user{i}@example.org",
+                email_normalized=f"user{i}@example.org",
+            )
+            for i in range(30)
+        )
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:iam_user_changelist")
+
+    def test_search_uses_email_prefix(self):
+        res = self.client.get(self.url, {"q": "USER1"})
+
+        emails = {u.email for u in res.context["cl"].result_list}
+        self.assertEqual(emails, {f"user{i}@example.org" for i in [1, *range(10, 20)]})
+
+    def test_search_by_id(self):
+        res = self.client.get(self.url, {"q": str(self.admin.id)})
+        self.assertEqual(list(res.context["cl"].result_list), [self.admin])
+
+    def test_digits_also_search_emails(self):
+        [user] = User.objects.bulk_create(
+            [
+                User(
+                    email="2024@example.org",
+                    username="2024@example.org",
+                    email_normalized="2024@example.org",
+                )
+            ]
+        )
+
+        res = self.client.get(self.url, {"q": "2024"})
+
+        self.assertEqual(list(res.context["cl"].result_list), [user])
+
+    def test_changelist_defers_unused_columns(self):
+        res = self.client.get(self.url)
+
+        user = res.context["cl"].result_list[0]
+        self.assertIn("password", user.get_deferred_fields())
+
+    def test_deep_pages_match_offset_pagination(self):
+        queryset = User.objects.order_by("-id")
+        offset_pages = EstimatedCountPaginator(queryset, 5)
+        offset_pages.seek_offset = 10**9
+        seek_pages = EstimatedCountPaginator(queryset, 5)
+        seek_pages.seek_offset = 0
+
+        for number in seek_pages.page_range:
+            page = list(seek_pages.page(number).object_list)
+            self.assertEqual(page, list(offset_pages.page(number).object_list))
+            seek_pages.after = page[-1].pk
+
+    def test_deep_pages_need_a_cursor(self):
+        paginator = EstimatedCountPaginator(User.objects.order_by("-id"), 5)
+        paginator.seek_offset = 10
+
+        self.assertEqual(len(paginator.page(2).object_list), 5)
+        with self.assertRaises(InvalidPage):
+            paginator.page(3)
+        self.assertEqual(list(paginator.get_elided_page_range(3)), [1, 2, "…", 3])
+
+    @mock.patch.object(EstimatedCountPaginator, "seek_offset", 10)
+    @mock.patch.object(UserAdmin, "list_per_page", 5)
+    def test_changelist_links_deep_pages_with_a_cursor(self):
+        res = self.client.get(self.url)
+        self.assertContains(res, "after=")
+
+        seen = []
+        while True:
+            cl = res.context["cl"]
+            seen += [user.pk for user in cl.result_list]
+            if cl.next_page_query is None:
+                break
+            res = self.client.get(self.url + cl.next_page_query)
+
+        ordered = User.objects.order_by("-id").values_list("pk", flat=True)
+        self.assertEqual(seen, list(ordered))
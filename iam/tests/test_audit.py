@@ -0,0 +1,155 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+
+from rest_framework import status
+
+from .test_setup import TestSetUp
+from .. import audit
+from ..models import AuthEvent, User
+
+START = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def buffer(**options):
+    # never wakes up on its own, events are written by flush() in the test
+    return audit.AuditBuffer(
+        **{"capacity": 100, "flush_size": 1000, "flush_interval": 3600, **options}
+    )
+
+
+class TestAuditBuffer(TestSetUp):
+    def test_full_buffer_drops_and_counts(self):
+        events = buffer(capacity=3)
+        for _ in range(5):
+            events.record({"kind": "login", "occurred_at": time.time()})
+
+        self.assertEqual(events.flush(), 3)
+        self.assertEqual(events.stats()["dropped"], 2)
+        self.assertEqual(events.stats()["written"], 3)
+        self.assertEqual(AuthEvent.objects.count(), 3)
+
+    def test_sync_sink_writes_at_once(self):
+        events = buffer(sink="sync")
+        events.record({"kind": "login", "occurred_at": time.time()})
+
+        self.assertEqual(AuthEvent.objects.count(), 1)
+
+    def test_writer_flushes_full_batches(self):
+        events = buffer(flush_size=2)
+        batches = []
+        with mock.patch.object(events, "_write", batches.append):
+            for _ in range(4):
+                events.record({"kind": "login", "occurred_at": time.time()})
+            for _ in range(100):
+                if sum(len(batch) for batch in batches) == 4:
+                    break
+                time.sleep(0.01)
+            events.close()
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+
+
+class TestAuditEvents(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.events = buffer()
+        patcher = mock.patch.object(audit, "_buffer", self.events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.audit_url = reverse("audit-events")
+        self.password = self.fake.password()
+        self.user = User.objects.create_user(
+            email="auditor@example.org",
+            username="auditor@example.org",
+            password=self.password,
+            is_verified=True,
+        )
+
+    def test_logins_are_recorded(self):
+        self.client.post(
+            self.login_url,
+            data={"email": self.user.email, "password": self.password},
+            format="json",
+            HTTP_USER_AGENT="tests",
+        )
+        self.client.post(
+            self.login_url,
+            data={"email": self.user.email, "password": "wrong password"},
+            format="json",
+        )
+        self.events.flush()
+
+        success, failure = AuthEvent.objects.order_by("id")
+        self.assertEqual(success.kind, AuthEvent.Kind.LOGIN)
+        self.assertEqual(success.user_id, self.user.pk)
+        self.assertEqual(success.user_agent, "tests")
+        self.assertEqual(failure.kind, AuthEvent.Kind.LOGIN_FAILED)
+        self.assertIsNone(failure.user_id)
+        self.assertEqual(failure.email, self.user.email)
+
+    def test_events_are_paged_by_time(self):
+        AuthEvent.objects.bulk_create(
+            [
+                AuthEvent(
+                    occurred_at=START + timedelta(minutes=i // 2),
+                    kind=AuthEvent.Kind.LOGIN,
+                    user_id=self.user.pk,
+                )
+                for i in range(7)
+            ]
+        )
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="view_authevent")
+        )
+        token = self.user.tokens()["access_token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        seen, cursor = [], None
+        while True:
+            params = {"since": START.isoformat(), "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            res = self.client.get(self.audit_url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [event["id"] for event in res.data["results"]]
+            cursor = res.data["next"]
+            if cursor is None:
+                break
+
+        newest_first = AuthEvent.objects.order_by("-occurred_at", "-id")
+        self.assertEqual(seen, list(newest_first.values_list("id", flat=True)))
+
+        res = self.client.get(self.audit_url, {"cursor": "not a cursor"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_events_need_permission(self):
+        token = self.user.tokens()["access_token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        res = self.client.get(self.audit_url)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_expired_events_are_deleted(self):
+        now = datetime.now(dt_timezone.utc)
+        AuthEvent.objects.bulk_create(
+            [
+                AuthEvent(occurred_at=now - timedelta(days=days), kind="login")
+                for days in (0, 40, 400, 800)
+            ]
+        )
+
+        call_command(
+            "audit_partitions", retention_months=12, batch_size=1, stdout=StringIO()
+        )
+
+        self.assertEqual(AuthEvent.objects.count(), 2)
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import override_settings
+
+from .smtp_stub import FlakySMTPServer
+from .test_setup import TestSetUp
+from .. import dispatch, emails
+
+MESSAGE = {
+    "subject": "Verify your email",
+    "message": "Use link below to verify your email",
+    "recipient_list": ["someone@example.org"],
+}
+
+
+def dispatcher(**options):
+    return dispatch.Dispatcher(
+        **{
+            "threads": 2,
+            "capacity": 100,
+            "drain_timeout": 5,
+            "keepalive": 30,
+            **options,
+        }
+    )
+
+
+def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        time.sleep(0.01)
+
+
+class TestInProcessDispatch(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_senders_keep_their_smtp_connection(self):
+        with FlakySMTPServer() as smtp, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=smtp.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        ):
+            senders = dispatcher(threads=1)
+            for _ in range(5):
+                senders.submit(MESSAGE)
+            # sends what is due before it stops
+            senders.close()
+
+            self.assertEqual(smtp.messages, 5)
+            self.assertEqual(smtp.connections, 1)
+        self.assertEqual(senders.stats()["sent"], 5)
+
+    @override_settings(EMAIL_DISPATCH="inprocess", EMAIL_COALESCE_WINDOW=0)
+    def test_enqueue_uses_the_dispatcher(self):
+        senders = dispatcher()
+        with mock.patch.object(dispatch, "_dispatcher", senders):
+            emails.enqueue(emails.VERIFY_EMAIL, MESSAGE)
+            wait_for(lambda: mail.outbox)
+        senders.close()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(emails.stats()[emails.VERIFY_EMAIL]["delivered"], 1)
+
+    @override_settings(EMAIL_RETRY_BACKOFF=0.01, CELERY_TASK_MAX_RETRIES=3)
+    def test_failed_sends_are_retried(self):
+        senders = dispatcher(threads=1)
+        with mock.patch.object(
+            emails, "inject_failure", side_effect=[OSError, OSError, None]
+        ):
+            senders.submit(MESSAGE)
+            wait_for(lambda: mail.outbox)
+        senders.close()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(senders.stats()["retried"], 2)
+
+    def test_full_queue_drops_the_email(self):
+        senders = dispatcher(capacity=1)
+        senders.submit(MESSAGE, countdown=60)
+        senders.submit(MESSAGE, countdown=60)
+        senders.close()
+
+        self.assertEqual(senders.stats()["rejected"], 1)
+        # the accepted one is not left behind on shutdown
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_spooled_emails_are_sent_by_the_next_process(self):
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        directory = spool.name
+        stopped = dispatcher(spool_dir=directory)
+        stopped.submit(MESSAGE, countdown=0.2)
+        stopped.close()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        started = dispatcher(spool_dir=directory)
+        started._ensure_started()
+        wait_for(lambda: mail.outbox)
+        started.close()
+
+        self.assertEqual(len(mail.outbox), 1)
+        # nothing is left to recover
+        self.assertEqual(os.listdir(directory), [])
@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.contrib import auth
+from django.core.cache import cache
+
+from rest_framework import status
+
+from .test_setup import TestSetUp
+from ..models import User
+
+
+class TestNormalizedEmailLookup(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        self.saved_user.set_password(self.saved_user_data["password"])
+        self.saved_user.is_verified = True
+        self.saved_user.save()
+
+    def test_normalized_email_is_stored(self):
+        user = User.objects.create(email=" Foo@X.com ", username="foo@x.com")
+        self.assertEqual(user.email_normalized, "foo@x.com")
+
+    def test_lookup_is_case_insensitive_and_single_query(self):
+        with self.assertNumQueries(1):
+            user = User.objects.get_by_email("EXAMPLE2@Gmail.com")
+        self.assertEqual(user, self.saved_user)
+
+    def test_unknown_email_returns_none(self):
+        self.assertIsNone(User.objects.get_by_email("nobody@example.org"))
+
+    def test_authenticate_ignores_email_case(self):
+        user = auth.authenticate(
+            email="Example2@GMAIL.com", password=self.saved_user_data["password"]
+        )
+        self.assertEqual(user, self.saved_user)
+
+    def test_user_can_login_with_different_case(self):
+        res = self.client.post(
+            path=self.login_url,
+            data={
+                "email": "Example2@Gmail.com",
+                "password": self.saved_user_data["password"],
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_reset_email_ignores_email_case(self):
+        res = self.client.post(
+            path=self.request_pw_reset_email_url,
+            data={"email": "EXAMPLE2@gmail.com"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_user_cannot_register_with_email_differing_in_case(self):
+        res = self.client.post(
+            path=self.register_url,
+            data={
+                "email": "Example2@Gmail.com",
+                "username": "other@gmail.com",
+                "password": self.fake.password(),
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", res.data)
+
+
+class TestNegativeEmailCache(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_unknown_email_is_answered_from_cache(self):
+        self.assertIsNone(User.objects.get_by_email("nobody@example.org"))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(User.objects.get_by_email("Nobody@example.org"))
+
+    def test_creating_user_clears_cached_miss(self):
+        User.objects.get_by_email("new@example.org")
+        user = User.objects.create(email="New@example.org", username="new@example.org")
+
+        self.assertEqual(User.objects.get_by_email("new@example.org"), user)
+
+    def test_login_with_cached_unknown_email_is_rejected(self):
+        data = {"email": "nobody@example.org", "password": self.fake.password()}
+        for _ in range(2):
+            res = self.client.post(path=self.login_url, data=data, format="json")
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_miss_still_hashes_password(self):
+        User.objects.get_by_email("nobody@example.org")
+
+        with mock.patch.object(User, "set_password") as set_password:
+            auth.authenticate(email="nobody@example.org", password="password")
+        set_password.assert_called_once()
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import override_settings
+
+from rest_framework import status
+
+from .test_setup import TestSetUp
+from .. import emails
+from ..tasks import send_email
+
+
+class TestEmailCoalescing(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def request_resets(self, times):
+        """Returns the queued messages, in the order the worker would run them."""
+        with mock.patch.object(emails, "send_email") as task:
+            for _ in range(times):
+                res = self.client.post(
+                    path=self.request_pw_reset_email_url,
+                    data={"email": self.saved_user_data["email"]},
+                )
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return task
+
+    def test_only_the_newest_message_is_delivered(self):
+        task = self.request_resets(4)
+
+        # the first of the window goes out at once, the rest after the window
+        self.assertEqual(task.delay.call_count, 1)
+        self.assertEqual(task.apply_async.call_count, 3)
+        self.assertEqual(task.apply_async.call_args.kwargs["countdown"], 60)
+
+        messages = [task.delay.call_args.args[0]] + [
+            call.args[0][0] for call in task.apply_async.call_args_list
+        ]
+        for message in messages:
+            send_email(message)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.saved_user_data["email"]])
+        self.assertEqual(
+            emails.stats()[emails.PASSWORD_RESET],
+            {"enqueued": 4, "suppressed": 3, "delivered": 1, "failed": 0},
+        )
+
+    def test_first_message_is_delivered_before_a_newer_one(self):
+        task = self.request_resets(1)
+        send_email(task.delay.call_args.args[0])
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_recipients_and_kinds_are_coalesced_separately(self):
+        emails.enqueue(emails.PASSWORD_RESET, {"recipient_list": ["a@example.org"]})
+        with mock.patch.object(emails, "send_email") as task:
+            emails.enqueue(emails.PASSWORD_RESET, {"recipient_list": ["b@example.org"]})
+            emails.enqueue(emails.VERIFY_EMAIL, {"recipient_list": ["A@example.org"]})
+
+        self.assertEqual(task.delay.call_count, 2)
+        self.assertEqual(task.apply_async.call_count, 0)
+
+    @override_settings(EMAIL_COALESCE_WINDOW=0)
+    def test_zero_window_sends_every_message(self):
+        task = self.request_resets(3)
+
+        self.assertEqual(task.delay.call_count, 3)
+        for call in task.delay.call_args_list:
+            send_email(call.args[0])
+        self.assertEqual(len(mail.outbox), 3)
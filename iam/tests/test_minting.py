@@ -0,0 +1,72 @@
+import jwt
+from django.conf import settings
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.state import token_backend
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .test_setup import TestSetUp
+from ..minting import minter
+from ..models import User
+from ..rotation import FAMILY_CLAIM
+
+CLAIMS = {"user_id": "42", FAMILY_CLAIM: "f" * 32, "groups": [1, 2], "su": False}
+
+
+class TestMinting(TestSetUp):
+    def test_tokens_match_simplejwt_encoding(self):
+        pair = minter().pair(CLAIMS, now=1_700_000_000)
+
+        refresh = RefreshToken(pair.refresh, verify=False)
+        access = AccessToken(pair.access, verify=False)
+        self.assertEqual(token_backend.encode(refresh.payload), pair.refresh)
+        self.assertEqual(token_backend.encode(access.payload), pair.access)
+
+    def test_pair_shares_claims_and_differs_in_type_expiry_and_id(self):
+        pair = minter().pair(CLAIMS)
+
+        refresh = RefreshToken(pair.refresh)
+        access = AccessToken(pair.access)
+        for claim, value in CLAIMS.items():
+            self.assertEqual(refresh[claim], value)
+            self.assertEqual(access[claim], value)
+        self.assertEqual(refresh.payload, pair.payload)
+        self.assertEqual(access["iat"], refresh["iat"])
+        self.assertEqual(
+            access["exp"] - access["iat"],
+            api_settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+        )
+        self.assertNotEqual(access["jti"], refresh["jti"])
+
+    @override_settings(SIMPLE_JWT={"ALGORITHM": "HS512", "ISSUER": "doorable"})
+    def test_settings_changes_are_picked_up(self):
+        pair = minter().pair(CLAIMS)
+
+        payload = jwt.decode(
+            pair.access, settings.SECRET_KEY, algorithms=["HS512"], issuer="doorable"
+        )
+        self.assertEqual(payload["user_id"], "42")
+
+    def test_login_records_the_issued_refresh_token(self):
+        user = User.objects.create_user(
+            email="mint@example.org",
+            username="mint@example.org",
+            password="secret1",
+            is_verified=True,
+        )
+
+        res = self.client.post(
+            self.login_url,
+            data={"email": user.email, "password": "secret1"},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        refresh = res.data["tokens"]["refresh_token"]
+        outstanding = OutstandingToken.objects.get(user=user)
+        self.assertEqual(outstanding.token, refresh)
+        self.assertEqual(outstanding.jti, RefreshToken(refresh)["jti"])
+        self.assertEqual(user.sessions.get().refresh_jti, outstanding.jti)
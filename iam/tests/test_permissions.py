@@ -0,0 +1,81 @@
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .test_setup import TestSetUp
+from ..permissions import (
+    HasTokenPermissions,
+    PERMS_CLAIM,
+    decode_bits,
+    get_registry,
+    has_perms,
+    resolve_user,
+)
+
+
+class FakeView:
+    required_permissions = ("iam.view_user",)
+
+
+class FakeRequest:
+    def __init__(self, auth):
+        self.auth = auth
+
+
+class TestPermissionClaims(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.view_user = Permission.objects.get(
+            content_type__app_label="iam", codename="view_user"
+        )
+        self.group = Group.objects.create(name="support")
+
+    def access_token(self):
+        return AccessToken(self.saved_user.tokens()["access_token"])
+
+    def test_token_has_no_permissions_by_default(self):
+        token = self.access_token()
+        self.assertEqual(decode_bits(token[PERMS_CLAIM]), 0)
+        self.assertFalse(
+            HasTokenPermissions().has_permission(FakeRequest(token), FakeView())
+        )
+
+    def test_group_permissions_are_embedded_in_token(self):
+        self.group.permissions.add(self.view_user)
+        self.saved_user.groups.add(self.group)
+
+        token = self.access_token()
+        self.assertEqual(token["groups"], [self.group.id])
+        self.assertTrue(
+            HasTokenPermissions().has_permission(FakeRequest(token), FakeView())
+        )
+
+    def test_claim_check_does_not_query_database(self):
+        self.saved_user.user_permissions.add(self.view_user)
+        token = self.access_token()
+        get_registry()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                HasTokenPermissions().has_permission(FakeRequest(token), FakeView())
+            )
+
+    def test_cache_is_invalidated_on_group_permission_change(self):
+        self.saved_user.groups.add(self.group)
+        self.assertEqual(resolve_user(self.saved_user)["bits"], 0)
+
+        self.group.permissions.add(self.view_user)
+        bits = resolve_user(self.saved_user)["bits"]
+        self.assertTrue(has_perms(bits, ["iam.view_user"]))
+
+        self.saved_user.groups.remove(self.group)
+        self.assertEqual(resolve_user(self.saved_user)["bits"], 0)
+
+    def test_resolution_is_cached(self):
+        self.saved_user.groups.add(self.group)
+        resolve_user(self.saved_user)
+
+        with self.assertNumQueries(0):
+            resolve_user(self.saved_user)
@@ -0,0 +1,37 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class TestAuthQueryPlans(TestCase):
+    def setUp(self):
+        call_command(
+            "seed_users",
+            count=20,
+            tokens_per_user=1,
+            password="seeded-password",
+            seed=1,
+            stdout=StringIO(),
+        )
+
+    def test_hot_auth_queries_use_an_index(self):
+        out = StringIO()
+        call_command("explain_auth_queries", stdout=out)
+        lines = out.getvalue().splitlines()
+
+        for name in (
+            "login / reset-email: user by email",
+            "jwt auth / verify-email / reset-check: user by id",
+            "sessions: active sessions",
+            "revoke: outstanding tokens of user",
+        ):
+            line = next(line for line in lines if f"] {name}:" in line)
+            self.assertTrue(line.startswith("[       ok]"), line)
+
+    def test_dropped_indexes_are_gone(self):
+        out = StringIO()
+        call_command("explain_auth_queries", stdout=out)
+
+        self.assertNotIn("is_verified", out.getvalue())
+        self.assertNotIn("refresh_jti", out.getvalue())
@@ -0,0 +1,33 @@
+from io import StringIO
+
+from django.contrib import auth
+from django.core.management import call_command
+from django.test import TestCase
+
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from ..models import User
+
+
+class TestSeedUsers(TestCase):
+    def test_seeds_users_with_token_history(self):
+        call_command(
+            "seed_users",
+            count=10,
+            batch_size=4,
+            tokens_per_user=2,
+            verified_ratio=1,
+            active_ratio=1,
+            password="seeded-password",
+            seed=1,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(OutstandingToken.objects.count(), 20)
+
+        user = User.objects.first()
+        self.assertEqual(user.email_normalized, user.email)
+        self.assertEqual(
+            auth.authenticate(email=user.email, password="seeded-password"), user
+        )
@@ -0,0 +1,175 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .test_setup import TestSetUp
+from ..models import UserSession
+
+
+class TestSessions(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.sessions_url = reverse("sessions")
+        self.revoke_url = reverse("sessions-revoke")
+        self.refresh_url = reverse("token-refresh")
+        self.logout_url = reverse("logout")
+
+        self.saved_user.set_password(self.saved_user_data["password"])
+        self.saved_user.is_verified = True
+        self.saved_user.save()
+
+    def login(self, user_agent="test-agent"):
+        res = self.client.post(
+            path=self.login_url,
+            data={
+                "email": self.saved_user_data["email"],
+                "password": self.saved_user_data["password"],
+            },
+            format="json",
+            HTTP_USER_AGENT=user_agent,
+        )
+        return res.data["tokens"]
+
+    def refresh(self, tokens):
+        return self.client.post(
+            self.refresh_url, data={"refresh": tokens["refresh_token"]}, format="json"
+        )
+
+    def authenticate(self, tokens):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}")
+
+    def test_login_records_session_metadata(self):
+        tokens = self.login("phone")
+        self.authenticate(tokens)
+
+        res = self.client.get(self.sessions_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        [session] = res.data
+        self.assertEqual(session["device"], "phone")
+        self.assertEqual(session["ip_address"], "127.0.0.1")
+        self.assertTrue(session["current"])
+
+    def test_revoke_selected_session(self):
+        phone = self.login("phone")
+        laptop = self.login("laptop")
+        session = UserSession.objects.get(device="phone")
+
+        self.authenticate(laptop)
+        res = self.client.post(
+            self.revoke_url, data={"sessions": [session.id]}, format="json"
+        )
+        self.assertEqual(res.data["revoked"], 1)
+
+        refreshed = self.client.post(
+            self.refresh_url, data={"refresh": phone["refresh_token"]}, format="json"
+        )
+        self.assertEqual(refreshed.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.authenticate(phone)
+        self.assertEqual(
+            self.client.get(self.sessions_url).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+        self.authenticate(laptop)
+        self.assertEqual(len(self.client.get(self.sessions_url).data), 1)
+
+    def test_revoke_all_sessions(self):
+        first = self.login()
+        second = self.login()
+
+        self.authenticate(second)
+        res = self.client.post(self.revoke_url, data={"all": True}, format="json")
+        self.assertEqual(res.data["revoked"], 2)
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+        for tokens in (first, second):
+            self.authenticate(tokens)
+            self.assertEqual(
+                self.client.get(self.sessions_url).status_code,
+                status.HTTP_401_UNAUTHORIZED,
+            )
+            refreshed = self.client.post(
+                self.refresh_url,
+                data={"refresh": tokens["refresh_token"]},
+                format="json",
+            )
+            self.assertEqual(refreshed.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_requires_sessions_or_all(self):
+        self.authenticate(self.login())
+        res = self.client.post(self.revoke_url, data={}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revoked_session_stays_revoked_after_a_cache_flush(self):
+        phone = self.login("phone")
+        self.authenticate(self.login("laptop"))
+        session = UserSession.objects.get(device="phone")
+        self.client.post(
+            self.revoke_url, data={"sessions": [session.id]}, format="json"
+        )
+
+        cache.clear()
+
+        self.assertEqual(self.refresh(phone).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logged_out_session_stays_revoked_after_a_cache_flush(self):
+        tokens = self.login()
+        self.authenticate(tokens)
+        self.client.post(
+            self.logout_url,
+            data={"refresh_token": tokens["refresh_token"]},
+            format="json",
+        )
+        self.assertIsNotNone(UserSession.objects.get().revoked_at)
+
+        cache.clear()
+
+        self.assertEqual(self.refresh(tokens).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_consumed_token_is_rejected_after_a_cache_flush(self):
+        tokens = self.login()
+        rotated = self.refresh(tokens).data
+
+        cache.clear()
+
+        self.assertEqual(self.refresh(tokens).status_code, status.HTTP_401_UNAUTHORIZED)
+        # the replay revoked the family
+        self.assertEqual(
+            self.refresh({"refresh_token": rotated["refresh"]}).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_forwarded_address_is_ignored_without_proxies(self):
+        self.client.post(
+            path=self.login_url,
+            data={
+                "email": self.saved_user_data["email"],
+                "password": self.saved_user_data["password"],
+            },
+            format="json",
+            HTTP_X_FORWARDED_FOR="10.9.9.9",
+        )
+        self.assertEqual(UserSession.objects.get().ip_address, "127.0.0.1")
+
+    def test_forwarded_address_is_read_behind_a_proxy(self):
+        with override_settings(
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+        ):
+            self.client.post(
+                path=self.login_url,
+                data={
+                    "email": self.saved_user_data["email"],
+                    "password": self.saved_user_data["password"],
+                },
+                format="json",
+                # the first entry was made up by the client
+                HTTP_X_FORWARDED_FOR="10.9.9.9, 203.0.113.7",
+            )
+        self.assertEqual(UserSession.objects.get().ip_address, "203.0.113.7")
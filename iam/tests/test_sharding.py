@@ -0,0 +1,163 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from .test_setup import TestSetUp
+from .. import sharding
+from ..models import User, UserDirectory, UserSession
+from ..permissions import resolve_user
+from ..resharding import sync_reference_data
+from ..tasks import record_token_rotation
+
+SHARDS = ["default", "extra"]
+
+
+@override_settings(IAM_SHARDS=SHARDS)
+class TestSharding(TestSetUp):
+    databases = {"default", "extra"}
+
+    def setUp(self):
+        cache.clear()
+        sync_reference_data("extra")
+        super().setUp()
+        self.logout_url = reverse("logout")
+        self.refresh_url = reverse("token-refresh")
+        self.sessions_url = reverse("sessions")
+        self.password = self.fake.password()
+        self.count = 0
+
+    def create_user(self, shard=None):
+        # ids decide the shard, create users until one lands on `shard`
+        while True:
+            self.count += 1
+            email = f"user{self.count}@example.org"
+            user = User.objects.create_user(
+                email=email, username=email, password=self.password, is_verified=True
+            )
+            if shard is None or user._state.db == shard:
+                return user
+
+    def login(self, user):
+        res = self.client.post(
+            path=self.login_url,
+            data={"email": user.email, "password": self.password},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data["tokens"]
+
+    def test_users_are_placed_by_id_hash(self):
+        users = [self.create_user() for _ in range(20)]
+
+        for user in users:
+            self.assertEqual(user._state.db, sharding.placement(user.pk))
+            self.assertEqual(
+                UserDirectory.objects.get(pk=user.pk).shard, user._state.db
+            )
+            other = "default" if user._state.db == "extra" else "extra"
+            self.assertFalse(User.objects.using(other).filter(pk=user.pk).exists())
+        self.assertEqual({user._state.db for user in users}, set(SHARDS))
+
+    def test_login_and_authenticated_requests_on_a_shard(self):
+        user = self.create_user("extra")
+
+        tokens = self.login(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}")
+        res = self.client.get(self.sessions_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertTrue(UserSession.objects.using("extra").filter(user=user).exists())
+        self.assertEqual(OutstandingToken.objects.using("extra").count(), 1)
+        self.assertEqual(OutstandingToken.objects.using("default").count(), 0)
+
+    def test_refresh_and_logout_on_a_shard(self):
+        user = self.create_user("extra")
+        tokens = self.login(user)
+
+        with mock.patch("iam.rotation.record_token_rotation") as record:
+            rotated = self.client.post(
+                self.refresh_url,
+                data={"refresh": tokens["refresh_token"]},
+                format="json",
+            ).data["refresh"]
+        # what the worker runs
+        record_token_rotation(*record.delay.call_args.args)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}")
+        res = self.client.post(
+            self.logout_url, data={"refresh_token": rotated}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(OutstandingToken.objects.using("extra").count(), 2)
+        self.assertEqual(BlacklistedToken.objects.using("extra").count(), 2)
+        self.assertEqual(BlacklistedToken.objects.using("default").count(), 0)
+
+    def test_register_checks_uniqueness_across_shards(self):
+        user = self.create_user("extra")
+
+        res = self.client.post(
+            self.register_url,
+            data={
+                "email": user.email,
+                "username": "new@example.org",
+                "password": "secret1",
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", res.data)
+
+    def test_group_permissions_of_a_user_on_a_shard(self):
+        user = self.create_user("extra")
+        permission = Permission.objects.get(codename="view_user")
+        # groups reach the shards once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.create(name="auditors")
+            group.permissions.add(permission)
+
+        user.groups.add(group)
+
+        self.assertEqual(resolve_user(user)["groups"], [group.pk])
+        self.assertTrue(resolve_user(user)["bits"] & 1 << permission.pk)
+
+    def test_reshard_moves_users_with_their_rows(self):
+        with self.settings(IAM_SHARDS=["default"]):
+            users = [self.create_user() for _ in range(10)]
+            for user in users:
+                self.login(user)
+                user.refresh_token().blacklist()
+        cache.clear()
+
+        call_command("reshard_users", batch_size=3, stdout=StringIO())
+
+        moved = [user for user in users if sharding.placement(user.pk) == "extra"]
+        self.assertTrue(moved)
+        for user in moved:
+            self.assertEqual(UserDirectory.objects.get(pk=user.pk).shard, "extra")
+            self.assertFalse(User.objects.using("default").filter(pk=user.pk).exists())
+            self.assertEqual(
+                UserSession.objects.using("extra").filter(user=user).count(), 1
+            )
+            self.assertEqual(
+                BlacklistedToken.objects.using("extra")
+                .filter(token__user_id=user.pk)
+                .count(),
+                1,
+            )
+        self.assertEqual(
+            OutstandingToken.objects.using("extra").count(), 2 * len(moved)
+        )
+        self.login(moved[0])
@@ -0,0 +1,129 @@
+import smtplib
+import time
+from collections import Counter
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from .smtp_stub import FlakySMTPServer
+from .test_setup import TestSetUp
+from .. import emails
+from ..tasks import send_email
+
+MESSAGE = {
+    "subject": "Reset your password",
+    "message": "Use link below to reset your password",
+    "recipient_list": ["someone@example.org"],
+}
+
+
+class TestSMTPCircuit(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.smtp = FlakySMTPServer(hang=1.0).__enter__()
+        self.addCleanup(self.smtp.__exit__, None, None, None)
+        settings = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.smtp.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            EMAIL_TIMEOUT=0.2,
+            EMAIL_CIRCUIT_FAILURE_THRESHOLD=5,
+            EMAIL_CIRCUIT_COOLDOWN=30,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # the cooldown passes when a test moves this clock, not by sleeping
+        self.now = time.time()
+        clock = mock.patch.object(emails, "time", mock.Mock(time=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def send(self, count):
+        """Sends like a worker would, returning the outcomes."""
+        outcomes = Counter()
+        for _ in range(count):
+            try:
+                emails.deliver(MESSAGE)
+                outcomes["sent"] += 1
+            except emails.CircuitOpen:
+                outcomes["deferred"] += 1
+            except emails.SEND_ERRORS:
+                outcomes["failed"] += 1
+        return outcomes
+
+    def send_for(self, seconds, per_second=5):
+        """Sends like a busy worker for `seconds` of the clock; sends per second."""
+        sent = 0
+        for _ in range(seconds):
+            sent += self.send(per_second)["sent"]
+            self.now += 1
+        return sent / seconds
+
+    def test_circuit_opens_on_outage_and_recovers(self):
+        healthy_rate = self.send_for(4)
+        self.assertEqual(healthy_rate, 5)
+
+        # every send would wait out the timeout; only the first ones do
+        self.smtp.mode = "hang"
+        connections = self.smtp.connections
+        self.assertEqual(self.send_for(10), 0)
+        self.assertEqual(self.smtp.connections - connections, 5)
+        self.assertEqual(emails.circuit_state(), "open")
+
+        self.smtp.mode = "up"
+        self.now += 19
+        self.assertEqual(emails.circuit_state(), "open")
+        self.now += 1
+        self.assertEqual(emails.circuit_state(), "half-open")
+
+        # the trial closes the circuit and every send goes out again
+        self.assertEqual(self.send_for(4), healthy_rate)
+        self.assertEqual(emails.circuit_state(), "closed")
+
+    def test_failed_trial_reopens_the_circuit(self):
+        self.smtp.mode = "down"
+        self.send(5)
+        self.now += 30
+
+        outcomes = self.send(3)
+
+        self.assertEqual(outcomes, {"failed": 1, "deferred": 2})
+        self.assertEqual(emails.circuit_state(), "open")
+
+    @override_settings(EMAIL_SENDING_FAILURE_TRIGGER=True, EMAIL_SENDING_FAILURE_RATE=1)
+    def test_injected_failures_never_reach_the_provider(self):
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            emails.deliver(MESSAGE)
+
+        self.assertEqual(self.smtp.connections, 0)
+
+    def test_backoff_grows_with_jitter_up_to_the_maximum(self):
+        with self.settings(EMAIL_RETRY_BACKOFF=5, EMAIL_RETRY_BACKOFF_MAX=300):
+            for retries, delay in [(0, 5), (1, 10), (3, 40), (10, 300)]:
+                backoff = emails.backoff(retries)
+                self.assertGreaterEqual(backoff, delay / 2)
+                self.assertLessEqual(backoff, delay)
+
+    @override_settings(EMAIL_CIRCUIT_FAILURE_THRESHOLD=2, CELERY_TASK_MAX_RETRIES=3)
+    def test_deferrals_do_not_use_up_retries(self):
+        retried = []
+
+        def retry(args, countdown):
+            retried.append(args[0])
+            return Exception("retry")
+
+        self.smtp.mode = "down"
+        with mock.patch.object(send_email, "retry", retry):
+            for _ in range(5):
+                with self.assertRaisesMessage(Exception, "retry"):
+                    send_email(retried[-1] if retried else MESSAGE)
+
+        # two failures opened the circuit, the next three sends were deferred
+        self.assertEqual(retried[-1]["failures"], 2)
+        self.assertEqual(retried[-1]["deferrals"], 3)
+        self.assertEqual(self.smtp.connections, 2)
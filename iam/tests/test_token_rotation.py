@@ -0,0 +1,135 @@
+from unittest import mock
+
+import jwt
+from kombu.exceptions import OperationalError
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .test_setup import TestSetUp
+from ..tasks import record_token_rotation
+from ..permissions import PERMS_CLAIM, decode_bits, has_perms
+
+
+class TestTokenRotation(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.refresh_url = reverse("token-refresh")
+        self.logout_url = reverse("logout")
+        self.tokens = self.saved_user.tokens()
+
+    def refresh(self, token):
+        return self.client.post(
+            path=self.refresh_url, data={"refresh": token}, format="json"
+        )
+
+    def test_refresh_rotates_token(self):
+        res = self.refresh(self.tokens["refresh_token"])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data["refresh"], self.tokens["refresh_token"])
+        self.assertIn("access", res.data)
+        self.assertEqual(self.refresh(res.data["refresh"]).status_code, 200)
+
+    def test_reuse_revokes_whole_family(self):
+        rotated = self.refresh(self.tokens["refresh_token"]).data["refresh"]
+
+        reused = self.refresh(self.tokens["refresh_token"])
+        self.assertEqual(reused.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(reused.data["status_code"], 401)
+
+        self.assertEqual(
+            self.refresh(rotated).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_refresh_signed_with_foreign_key_is_rejected(self):
+        self.saved_user.is_superuser = True
+        self.saved_user.save()
+        payload = jwt.decode(
+            self.tokens["refresh_token"], options={"verify_signature": False}
+        )
+        forged = jwt.encode(payload, "attacker-key", algorithm="HS256")
+
+        with mock.patch("iam.rotation.record_token_rotation") as record:
+            res = self.refresh(forged)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        record.delay.assert_not_called()
+
+    def test_rotation_is_recorded_for_audit(self):
+        with mock.patch("iam.rotation.record_token_rotation") as record:
+            self.refresh(self.tokens["refresh_token"])
+        # what the worker runs
+        record_token_rotation(*record.delay.call_args.args)
+
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    @override_settings(CELERY_BROKER_ENABLED=False)
+    def test_rotation_is_recorded_without_a_broker(self):
+        with mock.patch(
+            "celery.app.task.Task.apply_async", side_effect=OperationalError
+        ):
+            res = self.refresh(self.tokens["refresh_token"])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    def test_rotation_does_not_touch_database(self):
+        with mock.patch("iam.rotation.record_token_rotation") as record:
+            # the first refresh caches the user's state and permissions
+            rotated = self.refresh(self.tokens["refresh_token"]).data["refresh"]
+            with self.assertNumQueries(0):
+                res = self.refresh(rotated)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(record.delay.call_count, 2)
+
+    def test_deactivated_user_cannot_refresh(self):
+        rotated = self.refresh(self.tokens["refresh_token"]).data["refresh"]
+        self.saved_user.is_active = False
+        self.saved_user.save()
+
+        res = self.refresh(rotated)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_drops_permissions_of_a_removed_group(self):
+        group = Group.objects.create(name="auditors")
+        group.permissions.add(Permission.objects.get(codename="view_authevent"))
+        self.saved_user.groups.add(group)
+        tokens = self.saved_user.tokens()
+        self.assertTrue(
+            has_perms(
+                decode_bits(AccessToken(tokens["access_token"])[PERMS_CLAIM]),
+                ["iam.view_authevent"],
+            )
+        )
+
+        self.saved_user.groups.remove(group)
+        res = self.refresh(tokens["refresh_token"])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        access = AccessToken(res.data["access"])
+        self.assertEqual(decode_bits(access[PERMS_CLAIM]), 0)
+        self.assertEqual(access["groups"], [])
+
+    def test_logout_revokes_family(self):
+        rotated = self.refresh(self.tokens["refresh_token"]).data["refresh"]
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.tokens['access_token']}"
+        )
+        res = self.client.post(
+            path=self.logout_url, data={"refresh_token": rotated}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(
+            self.refresh(rotated).status_code, status.HTTP_401_UNAUTHORIZED
+        )
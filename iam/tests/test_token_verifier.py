@@ -0,0 +1,131 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from .test_setup import TestSetUp
+from ..models import User, UserDirectory
+from ..rotation import revoke_family
+from ..sessions import revoke_sessions
+from ..verifier import (
+    HEADER,
+    INACTIVE,
+    INVALID,
+    OK,
+    REVOKED,
+    UNAVAILABLE,
+    Connection,
+    TokenVerifier,
+    VerifierClient,
+    VerifierState,
+)
+
+
+class TestTokenVerifier(TestSetUp):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.state = VerifierState(token_cache_size=100)
+        self.refresh = self.saved_user.refresh_token()
+        self.token = str(self.refresh.access_token)
+
+    def verify(self, token=None):
+        return self.state.verify((token or self.token).encode())
+
+    def test_valid_token(self):
+        self.assertEqual(self.verify(), (OK, str(self.saved_user.pk).encode()))
+        # answered from memory the second time
+        with self.assertNumQueries(0):
+            self.assertEqual(self.verify()[0], OK)
+
+    def test_refresh_keeps_users_in_memory(self):
+        self.verify()
+        self.state.refresh()
+
+        self.assertEqual(list(self.state.users), [str(self.saved_user.pk)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.verify()[0], OK)
+
+    def test_tampered_token(self):
+        self.assertEqual(self.verify(self.token[:-2] + "xx")[0], INVALID)
+        self.assertEqual(self.verify("not a token")[0], INVALID)
+
+    def test_inactive_user_after_refresh(self):
+        self.verify()
+        self.saved_user.is_active = False
+        self.saved_user.save()
+
+        self.assertEqual(self.verify()[0], OK)
+        self.state.refresh()
+        self.assertEqual(self.verify()[0], INACTIVE)
+
+    def test_revoked_sessions_after_refresh(self):
+        self.verify()
+        revoke_sessions(self.saved_user)
+
+        self.state.refresh()
+        self.assertEqual(self.verify()[0], REVOKED)
+
+    def test_revoked_family_after_refresh(self):
+        self.verify()
+        revoke_family(self.refresh["fam"])
+
+        self.state.refresh()
+        self.assertEqual(self.verify()[0], REVOKED)
+
+    def test_frames_split_and_pipelined(self):
+        connection = Connection(sock=None, state=self.state)
+        frame = HEADER.pack(len(self.token)) + self.token.encode()
+        data = frame * 3
+
+        self.assertEqual(connection.feed(data[:10]), b"")
+        response = connection.feed(data[10:])
+
+        body = bytes((OK,)) + str(self.saved_user.pk).encode()
+        self.assertEqual(response, (HEADER.pack(len(body)) + body) * 3)
+        self.assertIsNone(connection.feed(HEADER.pack(1 << 20)))
+
+    def test_socket_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), "verify.sock")
+        verifier = TokenVerifier(path, refresh_interval=60)
+        # the server thread answers from memory, the state is loaded here
+        verifier.state = self.state
+        self.verify()
+
+        verifier.start()
+        try:
+            with VerifierClient(path) as client:
+                self.assertEqual(
+                    client.verify(self.token), (OK, str(self.saved_user.pk))
+                )
+                results = client.verify_many([self.token, "bad", self.token])
+        finally:
+            verifier.stop()
+
+        self.assertEqual([status for status, _ in results], [OK, INVALID, OK])
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_lookup_keeps_serving(self):
+        other = User.objects.create(email="other@example.org", username="other")
+        other_token = str(other.refresh_token().access_token)
+        path = os.path.join(tempfile.mkdtemp(), "verify.sock")
+        verifier = TokenVerifier(path, refresh_interval=60)
+        verifier.state = self.state
+        self.verify()
+
+        verifier.start()
+        try:
+            with VerifierClient(path) as client, mock.patch.object(
+                UserDirectory.objects, "shard_of", side_effect=DatabaseError
+            ), self.assertLogs("iam.verifier", "ERROR"):
+                failed = client.verify(other_token)
+                served = client.verify(self.token)
+                listening = os.path.exists(path)
+        finally:
+            verifier.stop()
+
+        self.assertEqual(failed[0], UNAVAILABLE)
+        self.assertEqual(served, (OK, str(self.saved_user.pk)))
+        self.assertTrue(listening)
@@ -1,23 +1,29 @@
 from django.urls import path
 from .views import (
+    AuditEvents,
     VerifyEmail,
     Register,
     Login,
     Logout,
     PasswordTokenCheck,
     RequestPasswordResetEmail,
+    RevokeSessions,
+    Sessions,
     SetNewPassword,
+    TokenRefresh,
     UserProfile,
 )
-from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     path("profile", UserProfile.as_view(), name="profile"),
     path("register", Register.as_view(), name="register"),
     path("login", Login.as_view(), name="login"),
     path("logout", Logout.as_view(), name="logout"),
+    path("sessions", Sessions.as_view(), name="sessions"),
+    path("sessions/revoke", RevokeSessions.as_view(), name="sessions-revoke"),
+    path("audit/events", AuditEvents.as_view(), name="audit-events"),
     path("email-verify", VerifyEmail.as_view(), name="email-verify"),
-    path("token/refresh", TokenRefreshView.as_view(), name="token-refresh"),
+    path("token/refresh", TokenRefresh.as_view(), name="token-refresh"),
     path(
         "request-reset-email",
         RequestPasswordResetEmail.as_view(),
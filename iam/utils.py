@@ -7,3 +7,7 @@ from django.http import HttpResponsePermanentRedirect
 
 class CustomRedirect(HttpResponsePermanentRedirect):
     allowed_schemes = settings.CUSTOM_REDIRECT
+
+
+def canonical_email(email: str) -> str:
+    return (email or "").strip().casefold()
@@ -0,0 +1,345 @@
+"""
+Token verification over a Unix domain socket, for services on the same host.
+
+Frames in both directions are a 4-byte big-endian length and a body. A
+request body is an access token. A response body is a status byte followed
+by the user id for OK, or a short reason otherwise; UNAVAILABLE means the
+user could not be looked up and the request may be retried. Requests may be
+pipelined; responses come back in request order.
+"""
+
+import logging
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User, UserDirectory
+from .rotation import FAMILY_CLAIM, issued_before_revocation, revoked_families
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+# a token is well below this; anything longer is not a client of ours
+MAX_FRAME = 8192
+# users are reloaded from a shard this many at a time
+REFRESH_CHUNK = 1000
+
+OK, INVALID, REVOKED, INACTIVE, UNAVAILABLE = range(5)
+
+
+class UserState:
+    __slots__ = ("active", "valid_after", "shard", "seen")
+
+    def __init__(self, active: bool, valid_after: Optional[int], shard: str):
+        self.active = active
+        self.valid_after = valid_after
+        self.shard = shard
+        self.seen = time.monotonic()
+
+
+class VerifierState:
+    """
+    What a verification needs, in memory. Decoded tokens are kept in an LRU;
+    users and session families are loaded on first sight and reloaded in
+    bulk by `refresh()`, so a verification itself does no I/O.
+    """
+
+    def __init__(self, token_cache_size: int):
+        self.token_cache_size = token_cache_size
+        self.tokens: OrderedDict = OrderedDict()
+        # keyed by the user id claim, a string; refresh() converts the row ids
+        self.users: Dict[str, UserState] = {}
+        # family -> (revoked, last seen)
+        self.families: Dict[str, Tuple[bool, float]] = {}
+
+    def claims(self, raw: bytes) -> Dict:
+        claims = self.tokens.get(raw)
+        if claims is None:
+            token = AccessToken(raw.decode())
+            claims = {
+                "user_id": token[api_settings.USER_ID_CLAIM],
+                "exp": token["exp"],
+                "iat": token.get("iat", 0),
+                "family": token.get(FAMILY_CLAIM),
+            }
+            self.tokens[raw] = claims
+            if len(self.tokens) > self.token_cache_size:
+                self.tokens.popitem(last=False)
+        else:
+            self.tokens.move_to_end(raw)
+            if claims["exp"] <= time.time():
+                del self.tokens[raw]
+                raise TokenError("token is expired")
+        return claims
+
+    def user(self, user_id) -> Optional[UserState]:
+        user_id = str(user_id)
+        state = self.users.get(user_id)
+        if state is None:
+            shard = UserDirectory.objects.shard_of(user_id)
+            row = (
+                User.objects.using(shard)
+                .filter(pk=user_id)
+                .values_list("is_active", "tokens_valid_after")
+                .first()
+            )
+            if row is None:
+                return None
+            state = self.users[user_id] = UserState(row[0], _timestamp(row[1]), shard)
+        state.seen = time.monotonic()
+        return state
+
+    def is_revoked(self, family: str) -> bool:
+        entry = self.families.get(family)
+        revoked = bool(revoked_families([family])) if entry is None else entry[0]
+        self.families[family] = (revoked, time.monotonic())
+        return revoked
+
+    def verify(self, raw: bytes) -> Tuple[int, bytes]:
+        """The same checks as iam.authentication.JWTAuthentication."""
+        try:
+            claims = self.claims(raw)
+        except (TokenError, KeyError, UnicodeDecodeError) as e:
+            return INVALID, str(e).encode()
+
+        try:
+            user = self.user(claims["user_id"])
+            if user is None:
+                return INACTIVE, b"user not found"
+            if not user.active:
+                return INACTIVE, b"user is inactive"
+            if issued_before_revocation(claims, user.valid_after):
+                return REVOKED, b"token has been revoked"
+            if claims["family"] and self.is_revoked(claims["family"]):
+                return REVOKED, b"session has been revoked"
+        except Exception:
+            # a first-seen user needs the database and cache; their outage
+            # must not stop the server for every client
+            logger.exception("token verifier lookup failed")
+            close_old_connections()
+            return UNAVAILABLE, b"lookup failed"
+        return OK, str(claims["user_id"]).encode()
+
+    def refresh(self) -> None:
+        """Reloads every user and family seen within an access token lifetime."""
+        horizon = time.monotonic() - api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+        by_shard = defaultdict(list)
+        for user_id, state in list(self.users.items()):
+            if state.seen < horizon:
+                self.users.pop(user_id, None)
+            else:
+                by_shard[state.shard].append(user_id)
+        for shard, user_ids in by_shard.items():
+            for start in range(0, len(user_ids), REFRESH_CHUNK):
+                chunk = user_ids[start : start + REFRESH_CHUNK]
+                rows = User.objects.using(shard).filter(pk__in=chunk)
+                found = set()
+                for id, active, valid_after in rows.values_list(
+                    "id", "is_active", "tokens_valid_after"
+                ):
+                    id = str(id)
+                    found.add(id)
+                    state = self.users.get(id)
+                    if state is not None:
+                        state.active = active
+                        state.valid_after = _timestamp(valid_after)
+                # deleted, or moved to another shard: looked up again on next use
+                for id in set(chunk) - found:
+                    self.users.pop(id, None)
+
+        families = {
+            family: seen
+            for family, (_, seen) in list(self.families.items())
+            if seen >= horizon
+        }
+        revoked = revoked_families(families)
+        self.families = {
+            family: (family in revoked, seen) for family, seen in families.items()
+        }
+
+
+def _timestamp(value) -> Optional[int]:
+    return None if value is None else int(value.timestamp())
+
+
+class Connection:
+    def __init__(self, sock: socket.socket, state: VerifierState):
+        self.sock = sock
+        self.state = state
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """Answers every complete frame received so far, None on a bad frame."""
+        self.buffer += data
+        responses = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME:
+                return None
+            end = offset + HEADER.size + length
+            if end > len(self.buffer):
+                break
+
+            status, body = self.state.verify(
+                bytes(self.buffer[offset + HEADER.size : end])
+            )
+            responses.append(HEADER.pack(len(body) + 1) + bytes((status,)) + body)
+            offset = end
+
+        del self.buffer[:offset]
+        # pipelined requests are answered with a single write
+        return b"".join(responses)
+
+    def handle(self) -> bool:
+        data = self.sock.recv(65536)
+        if not data:
+            return False
+        response = self.feed(data)
+        if response is None:
+            return False
+        if response:
+            self.sock.sendall(response)
+        return True
+
+
+class TokenVerifier:
+    """
+    Serves verifications from one thread with a selector loop. The ORM may
+    be called from it, which Django refuses inside an asyncio loop, and the
+    state is refreshed from a second thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        refresh_interval: float = None,
+        token_cache_size: int = None,
+    ):
+        self.path = path
+        self.refresh_interval = (
+            refresh_interval or settings.IAM_VERIFIER_REFRESH_INTERVAL
+        )
+        self.state = VerifierState(
+            token_cache_size or settings.IAM_VERIFIER_TOKEN_CACHE_SIZE
+        )
+        self.stopped = threading.Event()
+        self.ready = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def serve_forever(self) -> None:
+        refresher = threading.Thread(target=self._refresh, daemon=True)
+        refresher.start()
+        self.threads.append(refresher)
+        try:
+            self._serve()
+        finally:
+            self.stopped.set()
+            connections.close_all()
+
+    def start(self) -> "TokenVerifier":
+        """Serves from a background thread, for benchmarks and tests."""
+        server = threading.Thread(target=self.serve_forever, daemon=True)
+        server.start()
+        self.threads.append(server)
+        self.ready.wait(5)
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(5)
+
+    def _serve(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        # only the owner and its group may ask
+        os.chmod(self.path, 0o660)
+        listener.listen(128)
+        listener.setblocking(False)
+
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        logger.info("token verifier listening on %s", self.path)
+        self.ready.set()
+        try:
+            while not self.stopped.is_set():
+                for key, _ in selector.select(timeout=0.2):
+                    if key.data is None:
+                        sock, _ = listener.accept()
+                        # reads only follow readiness; a client that stops
+                        # reading its answers is dropped after the timeout
+                        sock.settimeout(1.0)
+                        selector.register(
+                            sock, selectors.EVENT_READ, Connection(sock, self.state)
+                        )
+                        continue
+                    try:
+                        alive = key.data.handle()
+                    except OSError:
+                        alive = False
+                    if not alive:
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _refresh(self) -> None:
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                self.state.refresh()
+            except Exception:
+                logger.exception("token verifier refresh failed")
+        connections.close_all()
+
+
+class VerifierClient:
+    def __init__(self, path: str, timeout: float = 1.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.file = self.sock.makefile("rb")
+
+    def verify(self, token: str) -> Tuple[int, str]:
+        return self.verify_many([token])[0]
+
+    def verify_many(self, tokens: Iterable[str]) -> List[Tuple[int, str]]:
+        frames = [HEADER.pack(len(token)) + token.encode() for token in tokens]
+        self.sock.sendall(b"".join(frames))
+
+        results = []
+        for _ in frames:
+            (length,) = HEADER.unpack(self.file.read(HEADER.size))
+            body = self.file.read(length)
+            results.append((body[0], body[1:].decode()))
+        return results
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -17,21 +17,29 @@ from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
 from rest_framework import status, permissions
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from rest_framework_simplejwt.tokens import RefreshToken
+from utils.tracing import span
 
 from .serializers import (
+    AuthEventQuerySerializer,
+    AuthEventSerializer,
     RegisterSerializer,
     EmailVerificationSerializer,
     LoginSerializer,
     ResetPasswordEmailRequestSerializer,
     SetNewPasswordSerializer,
     LogoutSerializer,
+    TokenRotationSerializer,
+    UserSessionSerializer,
+    RevokeSessionsSerializer,
 )
-from .models import User
-from .tasks import send_email
+from . import audit, emails
+from .models import AuthEvent, User
+from .permissions import HasTokenPermissions
+from .sessions import active_sessions, revoke_sessions, start_session
 from .utils import CustomRedirect
 
 logger = logging.getLogger(__name__)
@@ -57,10 +65,11 @@ class VerifyEmail(APIView):
             payload = jwt.decode(
                 token, settings.SECRET_KEY, algorithms=settings.JWT_ALGORITHM
             )
-            user = User.objects.get(id=payload["user_id"])
+            user = User.objects.get_by_id(payload["user_id"])
             if not user.is_verified:
                 user.is_verified = True
                 user.save()
+                audit.record(AuthEvent.Kind.EMAIL_VERIFIED, request, user)
 
             return Response(
                 {"message": "email successfully activated!"}, status=status.HTTP_200_OK
@@ -96,16 +105,19 @@ class Register(APIView):
     def post(self, request: HttpRequest) -> HttpResponse:
         serializer = self.serializer_class(data=request.data)
 
-        if not serializer.is_valid():
+        with span("serializer.validate"):
+            valid = serializer.is_valid()
+        if not valid:
             return Response(
                 serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST,
                 exception=True,
             )
-        serializer.save()
+        with span("serializer.save"):
+            user = serializer.save()
 
-        user = User.objects.get(email=request.data["email"])
-        token = RefreshToken.for_user(user).access_token
+        with span("tokens.mint"):
+            token = user.verification_token()
 
         current_site = get_current_site(request).domain
         relative_link = reverse("email-verify")
@@ -122,7 +134,8 @@ class Register(APIView):
             "recipient_list": [user.email],
         }
 
-        send_email.delay(message)
+        with span("email.enqueue"):
+            emails.enqueue(emails.VERIFY_EMAIL, message)
 
         return Response(
             {"message": "register successful!"}, status=status.HTTP_201_CREATED
@@ -139,7 +152,23 @@ class Login(APIView):
     )
     def post(self, request: HttpRequest) -> HttpResponse:
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with span("serializer.validate"):
+            try:
+                serializer.is_valid(raise_exception=True)
+            except AuthenticationFailed:
+                audit.record(
+                    AuthEvent.Kind.LOGIN_FAILED,
+                    request,
+                    email=str(request.data.get("email", "")),
+                )
+                raise
+
+        audit.record(AuthEvent.Kind.LOGIN, request, serializer.validated_data["user"])
+        start_session(
+            serializer.validated_data["user"],
+            serializer.validated_data["claims"],
+            request,
+        )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -155,15 +184,14 @@ class RequestPasswordResetEmail(APIView):
         self.serializer_class(data=request.data)
         email = request.data["email"]
 
-        users = User.objects.filter(email=email)
-        if not users.exists():
+        user = User.objects.get_by_email(email)
+        if user is None:
             return Response(
                 {"error_message": "user not found", "code": status.HTTP_404_NOT_FOUND},
                 status=status.HTTP_404_NOT_FOUND,
                 exception=True,
             )
 
-        user = users.first()
         uidb64 = urlsafe_base64_encode(smart_bytes(user.id))
         token = PasswordResetTokenGenerator().make_token(user)
 
@@ -182,7 +210,8 @@ class RequestPasswordResetEmail(APIView):
             "recipient_list": [user.email],
         }
 
-        send_email.delay(message)
+        with span("email.enqueue"):
+            emails.enqueue(emails.PASSWORD_RESET, message)
         return Response(
             {"message": "link to reset password have been sent"},
             status=status.HTTP_200_OK,
@@ -200,7 +229,7 @@ class PasswordTokenCheck(APIView):
 
         try:
             id = smart_str(urlsafe_base64_decode(uidb64))
-            user = User.objects.get(id=id)
+            user = User.objects.get_by_id(id)
 
             if not PasswordResetTokenGenerator().check_token(user, token):
                 if redirect_url and len(redirect_url) > 3:
@@ -230,6 +259,9 @@ class SetNewPassword(APIView):
     def patch(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
+        audit.record(
+            AuthEvent.Kind.PASSWORD_RESET, request, serializer.validated_data["user"]
+        )
         return Response(
             {"message": "password reset successful!"}, status=status.HTTP_200_OK
         )
@@ -248,10 +280,102 @@ class Logout(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        audit.record(AuthEvent.Kind.LOGOUT, request, request.user)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class TokenRefresh(APIView):
+    serializer_class = TokenRotationSerializer
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
+    www_authenticate_realm = "api"
+
+    def get_authenticate_header(self, request: HttpRequest) -> str:
+        # keeps invalid refresh tokens a 401 even without authenticators
+        return f'Bearer realm="{self.www_authenticate_realm}"'
+
+    @swagger_auto_schema(
+        operation_description="Rotate the refresh token and issue a new access token",
+        request_body=serializer_class,
+        responses={200: serializer_class, 401: "Unauthorized"},
+    )
+    def post(self, request: HttpRequest) -> HttpResponse:
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
+class Sessions(APIView):
+    serializer_class = UserSessionSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @swagger_auto_schema(
+        operation_description="List the active sessions of the current user",
+        responses={200: serializer_class(many=True)},
+    )
+    def get(self, request: HttpRequest) -> HttpResponse:
+        serializer = self.serializer_class(
+            active_sessions(request.user),
+            many=True,
+            context={"token": request.auth},
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class RevokeSessions(APIView):
+    serializer_class = RevokeSessionsSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @swagger_auto_schema(
+        operation_description="Revoke selected sessions, or all of them",
+        request_body=serializer_class,
+        responses={200: "sessions revoked", 400: "Bad request"},
+    )
+    def post(self, request: HttpRequest) -> HttpResponse:
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        session_ids = None
+        if not serializer.validated_data["all"]:
+            session_ids = serializer.validated_data["sessions"]
+        revoked = revoke_sessions(request.user, session_ids)
+
+        return Response({"revoked": revoked}, status=status.HTTP_200_OK)
+
+
+class AuditEvents(APIView):
+    permission_classes = (permissions.IsAuthenticated, HasTokenPermissions)
+    required_permissions = ("iam.view_authevent",)
+
+    @swagger_auto_schema(
+        operation_description="Authentication events, newest first, a page at a time",
+        query_serializer=AuthEventQuerySerializer,
+        responses={200: AuthEventSerializer(many=True), 400: "Bad request"},
+    )
+    def get(self, request: HttpRequest) -> HttpResponse:
+        query = AuthEventQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        try:
+            page, cursor = audit.events(
+                since=params.get("since"),
+                until=params.get("until"),
+                kind=params.get("kind"),
+                user_id=params.get("user"),
+                cursor=params.get("cursor"),
+                limit=params["limit"],
+            )
+        except ValueError as e:
+            raise ValidationError({"cursor": str(e)})
+
+        return Response(
+            {"results": AuthEventSerializer(page, many=True).data, "next": cursor},
+            status=status.HTTP_200_OK,
+        )
+
+
 class UserProfile(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
@@ -260,7 +384,7 @@ class UserProfile(APIView):
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=settings.JWT_ALGORITHM
         )
-        user = User.objects.get(id=payload["user_id"])
+        user = User.objects.get_by_id(payload["user_id"])
 
         if id != user.id:
             return Response(data={})
@@ -0,0 +1,63 @@
+"""
+MySQL backend handing out connections from a per-process pool, used when
+DB_POOL_ENABLED is set.
+
+Closing the connection, which Django does at the end of every request with
+CONN_MAX_AGE = 0, gives it back to the pool instead of closing the socket,
+so requests and tasks skip the TCP and authentication round trips.
+"""
+
+from django.db.backends.mysql import base
+
+from utils.db.pool import ConnectionPool, options, pool_for
+
+Database = base.Database
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pool_entry = None
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return pool_for(
+            self.alias, self.settings_dict, check=lambda connection: connection.ping()
+        )
+
+    def get_new_connection(self, conn_params):
+        entry = self.pool.checkout(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        self.pool_entry = entry
+        return entry.connection
+
+    def init_connection_state(self):
+        # session variables survive a checkin, set them once per connection
+        if self.pool_entry is not None and self.pool_entry.initialized:
+            return
+        super().init_connection_state()
+        if self.pool_entry is not None:
+            self.pool_entry.initialized = True
+
+    def _set_autocommit(self, autocommit):
+        if self.connection.get_autocommit() != autocommit:
+            super()._set_autocommit(autocommit)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection, self.pool_entry = self.connection, None
+        broken = self.errors_occurred
+        if not broken and not connection.get_autocommit():
+            # an abandoned transaction must not leak into the next checkout
+            try:
+                connection.rollback()
+            except Database.Error:
+                broken = True
+        self.pool.checkin(connection, broken=broken)
+
+    def warm_pool(self) -> int:
+        conn_params = self.get_connection_params()
+        return self.pool.warm(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            options(self.settings_dict)["WARM"],
+        )
@@ -0,0 +1,258 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Entry:
+    __slots__ = ("connection", "created_at", "returned_at", "initialized")
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+        # set by the database wrapper once the session is set up
+        self.initialized = False
+
+
+class ConnectionPool:
+    """
+    Up to `size` open connections for one database in one process. A
+    checkout reuses an idle connection after a health check, opens one while
+    the pool is below its size, and otherwise waits up to `timeout` seconds
+    for one to come back. Connections older than `max_lifetime` or returned
+    after an error are closed instead of reused.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float,
+        max_lifetime: float,
+        check_after: float,
+        check: Callable[[Any], None],
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.check = check
+        self.pid = os.getpid()
+        self.idle: deque = deque()
+        self.entries: Dict[int, Entry] = {}
+        self.available = threading.Condition(threading.Lock())
+        self.counters = dict.fromkeys(
+            (
+                "checkouts",
+                "created",
+                "reused",
+                "recycled",
+                "discarded",
+                "waits",
+                "timeouts",
+            ),
+            0,
+        )
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _expired(self, entry: Entry, now: float) -> bool:
+        return now - entry.created_at >= self.max_lifetime
+
+    def _close(self, entry: Entry, counter: str) -> None:
+        self.counters[counter] += 1
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+    def _forget(self, entry: Entry) -> None:
+        with self.available:
+            self.entries.pop(id(entry.connection), None)
+            self.available.notify()
+
+    def checkout(self, connect: Callable[[], Any]) -> Entry:
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            with self.available:
+                entry = self.idle.pop() if self.idle else None
+                grow = entry is None and len(self.entries) < self.size
+                if entry is None and not grow:
+                    waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.available.wait(remaining):
+                        if not self.idle and len(self.entries) >= self.size:
+                            self.counters["timeouts"] += 1
+                            raise PoolTimeout(
+                                f"no connection within {self.timeout}s, "
+                                f"all {self.size} in use"
+                            )
+                    continue
+                if grow:
+                    # reserved before connecting, so the pool never overshoots
+                    placeholder = Entry(None)
+                    self.entries[id(placeholder)] = placeholder
+
+            if grow:
+                try:
+                    entry = Entry(connect())
+                finally:
+                    with self.available:
+                        del self.entries[id(placeholder)]
+                        if entry is not None:
+                            self.entries[id(entry.connection)] = entry
+                        else:
+                            self.available.notify()
+                self.counters["created"] += 1
+                break
+
+            now = time.monotonic()
+            if self._expired(entry, now):
+                self._close(entry, "recycled")
+                self._forget(entry)
+                continue
+            if now - entry.returned_at >= self.check_after:
+                try:
+                    self.check(entry.connection)
+                except Exception:
+                    self._close(entry, "discarded")
+                    self._forget(entry)
+                    continue
+            self.counters["reused"] += 1
+            break
+
+        self.counters["checkouts"] += 1
+        if waited:
+            elapsed = time.monotonic() - start
+            self.counters["waits"] += 1
+            self.wait_total += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+        return entry
+
+    def checkin(self, connection: Any, broken: bool = False) -> None:
+        entry = self.entries.get(id(connection))
+        if entry is None:
+            # opened by the parent before a fork; closing it would close theirs
+            _inherited.append(connection)
+            return
+        if broken or self._expired(entry, time.monotonic()):
+            self._close(entry, "discarded" if broken else "recycled")
+            self._forget(entry)
+            return
+        entry.returned_at = time.monotonic()
+        with self.available:
+            self.idle.append(entry)
+            self.available.notify()
+
+    def entry(self, connection: Any) -> Optional[Entry]:
+        return self.entries.get(id(connection))
+
+    def warm(self, connect: Callable[[], Any], count: int) -> int:
+        """Opens connections up to `count`, so the first requests do not."""
+        opened = 0
+        while len(self.entries) < min(count, self.size):
+            entry = Entry(connect())
+            with self.available:
+                if len(self.entries) >= self.size:
+                    entry.connection.close()
+                    break
+                self.entries[id(entry.connection)] = entry
+                self.idle.append(entry)
+                self.available.notify()
+            self.counters["created"] += 1
+            opened += 1
+        return opened
+
+    def close_all(self) -> None:
+        with self.available:
+            idle, self.idle = list(self.idle), deque()
+            for entry in idle:
+                self.entries.pop(id(entry.connection), None)
+        for entry in idle:
+            self._close(entry, "recycled")
+
+    def stats(self) -> Dict[str, Any]:
+        checkouts = self.counters["checkouts"]
+        return {
+            "size": self.size,
+            "open": len(self.entries),
+            "idle": len(self.idle),
+            **self.counters,
+            "wait_ms_total": round(self.wait_total * 1000, 3),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+            "wait_ms_avg": (
+                round(self.wait_total * 1000 / checkouts, 3) if checkouts else 0.0
+            ),
+        }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+# connections inherited across a fork; closing them would close the parent's
+_inherited: List[Any] = []
+
+
+def options(settings_dict: Dict) -> Dict[str, Any]:
+    return {**settings.DB_POOL, **settings_dict.get("POOL", {})}
+
+
+def pool_for(
+    alias: str, settings_dict: Dict, check: Callable[[Any], None]
+) -> ConnectionPool:
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is not None and pool.pid != os.getpid():
+            _inherited.extend(entry.connection for entry in pool.idle)
+            pool = None
+        if pool is None:
+            config = options(settings_dict)
+            pool = _pools[alias] = ConnectionPool(
+                size=config["SIZE"],
+                timeout=config["TIMEOUT"],
+                max_lifetime=config["MAX_LIFETIME"],
+                check_after=config["CHECK_AFTER"],
+                check=check,
+            )
+        return pool
+
+
+def warm(aliases: Optional[List[str]] = None) -> Dict[str, int]:
+    """Opens the configured number of connections of every pooled database."""
+    from django.db import connections
+
+    opened = {}
+    for alias in aliases or list(settings.DATABASES):
+        connection = connections[alias]
+        if hasattr(connection, "warm_pool"):
+            try:
+                opened[alias] = connection.warm_pool()
+            except Exception:
+                logger.exception("could not warm the %s connection pool", alias)
+    return opened
+
+
+def close_all() -> None:
+    for pool in list(_pools.values()):
+        if pool.pid == os.getpid():
+            pool.close_all()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        alias: pool.stats() for alias, pool in _pools.items() if pool.pid == os.getpid()
+    }
@@ -0,0 +1,134 @@
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+CACHE_PROBE_KEY = "health:probe"
+
+
+def check_database(alias: str) -> None:
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    finally:
+        # opened by the probe's own thread, nothing else would close it
+        connection.close()
+
+
+def check_cache() -> None:
+    cache.set(CACHE_PROBE_KEY, 1, 10)
+    if cache.get(CACHE_PROBE_KEY) != 1:
+        raise RuntimeError("cache did not return the probe value")
+
+
+def check_broker() -> None:
+    from doorable.celery import celery
+
+    with celery.connection_for_write(
+        connect_timeout=settings.READINESS_CHECK_TIMEOUT
+    ) as conn:
+        conn.ensure_connection(max_retries=0)
+
+
+READINESS_CHECKS: Dict[str, Callable[[], None]] = {
+    "cache": check_cache,
+    "broker": check_broker,
+}
+
+# check threads still stuck from an earlier probe, by check name
+_running: Dict[str, threading.Thread] = {}
+
+
+def all_checks() -> Dict[str, Callable[[], None]]:
+    # every database, the IAM shards included
+    checks = {
+        f"database:{alias}": partial(check_database, alias)
+        for alias in settings.DATABASES
+    }
+    checks.update(READINESS_CHECKS)
+    if not settings.CELERY_BROKER_ENABLED:
+        del checks["broker"]
+    return checks
+
+
+def _run(check: Callable[[], None], result: Dict) -> None:
+    start = time.perf_counter()
+    try:
+        check()
+        result["ok"] = True
+    except Exception as exc:
+        result.update(ok=False, error=exc.__class__.__name__)
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+
+def run_checks() -> Dict:
+    """
+    Runs the checks in threads of their own, so a dependency that hangs
+    fails its check after `settings.READINESS_CHECK_TIMEOUT` instead of
+    holding up the probe.
+    """
+    timeout = settings.READINESS_CHECK_TIMEOUT
+    deadline = time.monotonic() + timeout
+    timed_out = {"ok": False, "error": "Timeout", "latency_ms": timeout * 1000}
+
+    checks, threads = {}, {}
+    for name, check in all_checks().items():
+        running = _running.get(name)
+        if running is not None and running.is_alive():
+            checks[name] = dict(timed_out)
+            continue
+        checks[name] = {}
+        threads[name] = _running[name] = threading.Thread(
+            target=_run, args=(check, checks[name]), name=f"readiness-{name}"
+        )
+        threads[name].daemon = True
+        threads[name].start()
+
+    for name, thread in threads.items():
+        thread.join(max(deadline - time.monotonic(), 0))
+        if thread.is_alive():
+            checks[name] = dict(timed_out)
+
+    return {"ok": all(c["ok"] for c in checks.values()), "checks": checks}
+
+
+class ReadinessProbe:
+    """
+    Runs the dependency checks at most once per `settings.READINESS_CACHE_SECONDS`
+    per process; probes arriving in between get the last result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.result = None
+        self.checked_at = 0.0
+
+    def is_fresh(self) -> bool:
+        return (
+            self.result is not None
+            and time.monotonic() - self.checked_at < settings.READINESS_CACHE_SECONDS
+        )
+
+    def get(self) -> Dict:
+        if self.is_fresh():
+            return {**self.result, "cached": True}
+
+        with self.lock:
+            # another thread may have refreshed it while we waited
+            if self.is_fresh():
+                return {**self.result, "cached": True}
+            self.result = run_checks()
+            self.checked_at = time.monotonic()
+            return {**self.result, "cached": False}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.result = None
+
+
+readiness_probe = ReadinessProbe()
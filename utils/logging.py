@@ -0,0 +1,172 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import IO, Dict, List, Optional
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+view_name_var = contextvars.ContextVar("view_name", default=None)
+
+CONTEXT_FIELDS = ("request_id", "view", "latency_ms", "method", "path", "status")
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        if getattr(record, "view", None) is None:
+            record.view = view_name_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+
+        return json.dumps(data, default=str)
+
+
+class BufferedFileHandler(logging.Handler):
+    """
+    Hands records to a bounded queue drained by a background writer thread,
+    which formats and writes them to `filename` in batches, and copies them to
+    `console` when one is given. When the queue is full the record is dropped
+    and counted instead of blocking the caller.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        capacity: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        encoding: Optional[str] = "utf-8",
+        console: Optional[IO[str]] = None,
+    ):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.encoding = encoding
+        self.console = console
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=capacity)
+        self.dropped = 0
+        self.written = 0
+        self._pid = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_writer(self) -> None:
+        # the writer thread does not survive a fork, so each process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="log-writer", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._ensure_writer()
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _drain(self, first: logging.LogRecord) -> List[logging.LogRecord]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, stream, batch: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            text = "\n".join(lines) + "\n"
+            stream.write(text)
+            stream.flush()
+            self.written += len(lines)
+            if self.console is not None:
+                try:
+                    self.console.write(text)
+                    self.console.flush()
+                except (OSError, ValueError):
+                    # a closed stderr must not stop the file output
+                    pass
+
+    def _run(self) -> None:
+        with open(self.filename, "a", encoding=self.encoding) as stream:
+            while True:
+                try:
+                    record = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    if self._stopping.is_set():
+                        return
+                    continue
+                self._write(stream, self._drain(record))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    def flush(self) -> None:
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        while self.queue.qsize() and thread.is_alive():
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._thread.join(timeout=max(self.flush_interval * 4, 1))
+            self._thread = None
+            self._pid = None
+        super().close()
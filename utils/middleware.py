@@ -0,0 +1,181 @@
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from . import tracing
+from .health import readiness_probe
+from .logging import request_id_var, view_name_var
+
+logger = logging.getLogger("doorable.request")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+class RequestLogMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        request.request_id = request_id
+        request_token = request_id_var.set(request_id)
+        view_token = view_name_var.set(None)
+
+        try:
+            response = self.get_response(request)
+            response[REQUEST_ID_HEADER] = request_id
+            logger.info(
+                "request finished",
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+                },
+            )
+            return response
+        finally:
+            view_name_var.reset(view_token)
+            request_id_var.reset(request_token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name_var.set(getattr(request.resolver_match, "view_name", None))
+
+
+class TracingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = tracing.start_trace()
+        if trace is None:
+            return self.get_response(request)
+
+        token = tracing.current_trace.set(trace)
+        try:
+            with tracing.Span(
+                trace, "http.request", {"http.method": request.method}
+            ) as root:
+                response = self.get_response(request)
+                root.set("http.status_code", response.status_code)
+                root.set("http.route", trace.endpoint or request.path)
+        finally:
+            tracing.current_trace.reset(token)
+
+        tracing.export(trace)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trace = tracing.current_trace.get()
+        if trace is None or not trace.stack:
+            return None
+
+        trace.endpoint = getattr(request.resolver_match, "view_name", None)
+        # everything between the root span opening and view dispatch
+        middleware = tracing.Span(trace, "middleware", {})
+        middleware.parent_id = trace.stack[0].span_id
+        middleware.start_ns = trace.stack[0].start_ns
+        middleware.end_ns = time.time_ns()
+        trace.spans.append(middleware)
+        return None
+
+
+class PathScopedMiddleware:
+    """
+    Runs `settings.SESSION_STACK_MIDDLEWARE` only for requests outside
+    `settings.LEAN_MIDDLEWARE_PATHS`. The wrapped middleware are chained here
+    and their view, exception and template-response hooks are forwarded, so
+    for the admin they behave as if they were listed in MIDDLEWARE directly.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lean_paths = tuple(settings.LEAN_MIDDLEWARE_PATHS)
+
+        handler = get_response
+        middleware = []
+        for path in reversed(settings.SESSION_STACK_MIDDLEWARE):
+            handler = import_string(path)(handler)
+            middleware.insert(0, handler)
+        self.full_stack = handler
+
+        self.view_hooks = [
+            m.process_view for m in middleware if hasattr(m, "process_view")
+        ]
+        self.template_response_hooks = [
+            m.process_template_response
+            for m in reversed(middleware)
+            if hasattr(m, "process_template_response")
+        ]
+        self.exception_hooks = [
+            m.process_exception
+            for m in reversed(middleware)
+            if hasattr(m, "process_exception")
+        ]
+
+    def is_lean(self, request) -> bool:
+        return request.path_info.startswith(self.lean_paths)
+
+    def __call__(self, request):
+        if self.is_lean(request):
+            return self.get_response(request)
+        return self.full_stack(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_lean(request):
+            return None
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        for hook in self.template_response_hooks:
+            response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if self.is_lean(request):
+            return None
+        for hook in self.exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+class HealthCheckMiddleware:
+    """
+    Answers liveness and readiness probes before any other middleware runs, so
+    probes skip host validation, SSL redirects, logging and URL resolution.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info == settings.LIVENESS_PATH:
+            return JsonResponse({"status": "ok", "status_code": 200})
+
+        if request.path_info == settings.READINESS_PATH:
+            result = readiness_probe.get()
+            status_code = 200 if result["ok"] else 503
+            return JsonResponse(
+                {
+                    "status": "ok" if result["ok"] else "unavailable",
+                    "cached": result["cached"],
+                    "checks": result["checks"],
+                    "status_code": status_code,
+                },
+                status=status_code,
+            )
+
+        return self.get_response(request)
@@ -0,0 +1,100 @@
+from typing import Optional
+
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+ESTIMATE_QUERIES = {
+    "mysql": (
+        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    ),
+    "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+}
+
+
+def estimated_count(queryset) -> Optional[int]:
+    """
+    Row count of the queryset's table from the planner statistics, or None
+    when the queryset is filtered or the backend keeps no such statistics.
+    """
+    if queryset.query.where or queryset.query.distinct:
+        return None
+
+    connection = connections[queryset.db]
+    sql = ESTIMATE_QUERIES.get(connection.vendor)
+    if sql is None:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables.
+
+    An unfiltered list is counted from table statistics once it is bigger
+    than `estimate_threshold`; a filtered one is counted exactly, so every
+    page that exists can be reached. Pages past `seek_offset` that are
+    ordered by primary key are read from a cursor instead of an offset:
+    `after` is the primary key of the last row of the page before, and the
+    page is the rows past it, however deep. Such a page is only reached from
+    the one before it.
+    """
+
+    estimate_threshold = 100000
+    seek_offset = 1000
+
+    def __init__(self, *args, after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.after = after
+
+    @cached_property
+    def count(self) -> int:
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > self.estimate_threshold:
+            return estimate
+        return self.object_list.count()
+
+    def _pk_ordering(self) -> Optional[str]:
+        pk_name = self.object_list.model._meta.pk.name
+        ordering = tuple(
+            dict.fromkeys(
+                field.replace("pk", pk_name) if field in ("pk", "-pk") else field
+                for field in self.object_list.query.order_by
+            )
+        )
+        if ordering == (f"-{pk_name}",):
+            return "desc"
+        if ordering == (pk_name,):
+            return "asc"
+        return None
+
+    def _shallow_pages(self) -> int:
+        # the first page starts nowhere and needs no cursor
+        return max(-(-self.seek_offset // self.per_page), 1)
+
+    def page(self, number) -> Page:
+        number = self.validate_number(number)
+        direction = self._pk_ordering()
+        if number <= self._shallow_pages() or direction is None:
+            return super().page(number)
+        if self.after is None:
+            raise InvalidPage(_("That page is only reached from the one before it"))
+
+        lookup = "pk__lt" if direction == "desc" else "pk__gt"
+        object_list = self.object_list.filter(**{lookup: self.after})[: self.per_page]
+        return self._get_page(object_list, number, self)
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        if self._pk_ordering() is None:
+            return super().get_elided_page_range(
+                number, on_each_side=on_each_side, on_ends=on_ends
+            )
+        # only the pages read with an offset can be linked to by number
+        shallow = range(1, min(self.num_pages, self._shallow_pages()) + 1)
+        return shallow if number in shallow else [*shallow, self.ELLIPSIS, number]
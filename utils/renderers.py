@@ -0,0 +1,53 @@
+import re
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# a number orjson formats unlike repr(): an exponent (1e16 for 1e+16) or a
+# small float written out (0.00001 for 1e-05). Strings matching this too
+# only cost the slower path
+STDLIB_FLOAT = re.compile(rb"(?:^|[:\[,])-?(?:[0-9]+(?:\.[0-9]+)?[eE]|0\.0000)")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed and the
+    output is compact, UTF-8 and not indented. Types orjson does not handle
+    the same way (datetimes, Decimals, lazy strings, ...) are passed to DRF's
+    encoder, and output with floats orjson formats differently, or that
+    orjson rejects, is rendered by the stdlib renderer instead.
+
+    The output is byte-identical to JSONRenderer's with one exception: NaN
+    and infinities, which orjson renders as null where the strict stdlib
+    renderer raises ValueError.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b""
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if STDLIB_FLOAT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # match the stdlib renderer, which escapes these for JavaScript safety
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
@@ -0,0 +1,79 @@
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from ..health import READINESS_CHECKS, readiness_probe
+
+
+def broken_check():
+    raise ConnectionError("broker down")
+
+
+class TestHealthChecks(TestCase):
+    # the readiness probe checks every database
+    databases = "__all__"
+
+    def setUp(self):
+        readiness_probe.reset()
+        patcher = mock.patch.dict(READINESS_CHECKS, {"broker": lambda: None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_liveness_does_no_io(self):
+        with self.assertNumQueries(0):
+            res = self.client.get("/healthz", HTTP_HOST="probe.internal")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["status"], "ok")
+
+    def test_readiness_reports_each_dependency(self):
+        res = self.client.get("/readyz")
+        body = res.json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            set(body["checks"]),
+            {"database:default", "database:extra", "cache", "broker"},
+        )
+        self.assertIn("latency_ms", body["checks"]["database:default"])
+        # unauthenticated, so nothing about the process's internals
+        self.assertNotIn("database_pools", body)
+
+    @override_settings(READINESS_CACHE_SECONDS=60)
+    def test_readiness_is_cached(self):
+        self.client.get("/readyz")
+
+        with self.assertNumQueries(0):
+            res = self.client.get("/readyz")
+        self.assertTrue(res.json()["cached"])
+
+    def test_failing_dependency_makes_service_unavailable(self):
+        with mock.patch.dict(READINESS_CHECKS, {"broker": broken_check}):
+            res = self.client.get("/readyz")
+
+        self.assertEqual(res.status_code, 503)
+        self.assertFalse(res.json()["checks"]["broker"]["ok"])
+        self.assertEqual(res.json()["checks"]["broker"]["error"], "ConnectionError")
+
+    @override_settings(CELERY_BROKER_ENABLED=False)
+    def test_readiness_skips_the_broker_when_there_is_none(self):
+        with mock.patch.dict(READINESS_CHECKS, {"broker": broken_check}):
+            res = self.client.get("/readyz")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("broker", res.json()["checks"])
+
+    @override_settings(READINESS_CHECK_TIMEOUT=0.05)
+    def test_hanging_dependency_times_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch.dict(READINESS_CHECKS, {"broker": release.wait}):
+            res = self.client.get("/readyz")
+            readiness_probe.reset()
+            # still stuck, so not started again
+            again = self.client.get("/readyz")
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()["checks"]["broker"]["error"], "Timeout")
+        self.assertTrue(res.json()["checks"]["cache"]["ok"])
+        self.assertEqual(again.json()["checks"]["broker"]["error"], "Timeout")
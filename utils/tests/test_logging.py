@@ -0,0 +1,79 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from ..logging import (
+    BufferedFileHandler,
+    JsonFormatter,
+    RequestContextFilter,
+    request_id_var,
+)
+
+
+class TestBufferedFileHandler(SimpleTestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+        self.logger = logging.getLogger("utils.tests.buffered")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        os.remove(self.filename)
+
+    def attach(self, **kwargs):
+        handler = BufferedFileHandler(self.filename, **kwargs)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RequestContextFilter())
+        self.logger.addHandler(handler)
+        return handler
+
+    def read_lines(self):
+        with open(self.filename) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_records_are_written_as_json_with_request_context(self):
+        console = io.StringIO()
+        handler = self.attach(flush_interval=0.05, console=console)
+        token = request_id_var.set("abc123")
+        try:
+            self.logger.info("hello %s", "world", extra={"latency_ms": 1.5})
+        finally:
+            request_id_var.reset(token)
+        handler.close()
+
+        [line] = self.read_lines()
+        self.assertEqual(line["message"], "hello world")
+        self.assertEqual(line["request_id"], "abc123")
+        self.assertEqual(line["latency_ms"], 1.5)
+        self.assertEqual(json.loads(console.getvalue()), line)
+
+    def test_records_are_dropped_when_buffer_is_full(self):
+        writing, release = threading.Event(), threading.Event()
+
+        class SlowConsole(io.StringIO):
+            def write(self, text):
+                writing.set()
+                release.wait(5)
+                return super().write(text)
+
+        handler = self.attach(capacity=1, flush_interval=0.05, console=SlowConsole())
+        # the writer is held up on the first record, the second fills the queue
+        self.logger.info("written")
+        self.assertTrue(writing.wait(5))
+        self.logger.info("kept")
+        self.logger.info("dropped")
+        release.set()
+        handler.close()
+
+        self.assertEqual(handler.stats()["dropped"], 1)
+        messages = [line["message"] for line in self.read_lines()]
+        self.assertEqual(messages, ["written", "kept"])
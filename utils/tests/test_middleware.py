@@ -0,0 +1,25 @@
+from django.test import TestCase
+from django.urls import reverse
+
+
+class TestPathScopedMiddleware(TestCase):
+    def test_api_routes_skip_session_stack(self):
+        res = self.client.get(f"{reverse('email-verify')}?token=invalid")
+
+        self.assertNotIn("X-Frame-Options", res.headers)
+        self.assertNotIn("csrftoken", res.cookies)
+        self.assertFalse(hasattr(res.wsgi_request, "session"))
+
+    def test_admin_keeps_full_stack(self):
+        res = self.client.get(reverse("admin:login"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers["X-Frame-Options"], "DENY")
+        self.assertIn("csrftoken", res.cookies)
+        self.assertTrue(hasattr(res.wsgi_request, "session"))
+
+    def test_admin_login_enforces_csrf(self):
+        self.client.handler.enforce_csrf_checks = True
+        res = self.client.post(reverse("admin:login"), {"username": "x"})
+
+        self.assertEqual(res.status_code, 403)
@@ -0,0 +1,204 @@
+import threading
+import time
+from unittest import mock, skipIf
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections as databases
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from iam.models import User
+
+from ..db import pool as pools
+from ..db.pool import ConnectionPool, PoolTimeout
+
+try:
+    from ..db.mysql import base as pooled
+except ImproperlyConfigured:
+    # mysqlclient is not installed
+    pooled = None
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def ping(self):
+        if not self.alive:
+            raise OSError("server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+def pool(**options):
+    return ConnectionPool(
+        **{
+            "size": 2,
+            "timeout": 0.05,
+            "max_lifetime": 3600,
+            "check_after": 0,
+            "check": FakeConnection.ping,
+            **options,
+        }
+    )
+
+
+class TestConnectionPool(SimpleTestCase):
+    def test_returned_connections_are_reused(self):
+        connections = pool()
+        first = connections.checkout(FakeConnection).connection
+        connections.checkin(first)
+
+        second = connections.checkout(FakeConnection).connection
+
+        self.assertIs(first, second)
+        stats = connections.stats()
+        self.assertEqual((stats["created"], stats["reused"]), (1, 1))
+
+    def test_checkout_waits_then_times_out(self):
+        connections = pool(size=1)
+        held = connections.checkout(FakeConnection).connection
+
+        with self.assertRaises(PoolTimeout):
+            connections.checkout(FakeConnection)
+
+        threading.Timer(0.01, connections.checkin, (held,)).start()
+        self.assertIs(connections.checkout(FakeConnection).connection, held)
+        stats = connections.stats()
+        self.assertEqual((stats["waits"], stats["timeouts"]), (1, 1))
+        self.assertGreater(stats["wait_ms_max"], 0)
+
+    def test_old_and_broken_connections_are_closed(self):
+        connections = pool(max_lifetime=0.01)
+        old = connections.checkout(FakeConnection).connection
+        broken = connections.checkout(FakeConnection).connection
+        connections.checkin(broken, broken=True)
+        time.sleep(0.01)
+        connections.checkin(old)
+
+        self.assertTrue(old.closed and broken.closed)
+        self.assertEqual(connections.stats()["open"], 0)
+        self.assertEqual(connections.stats()["recycled"], 1)
+        self.assertEqual(connections.stats()["discarded"], 1)
+
+    def test_dead_idle_connections_are_replaced(self):
+        connections = pool()
+        dead = connections.checkout(FakeConnection).connection
+        connections.checkin(dead)
+        dead.alive = False
+
+        fresh = connections.checkout(FakeConnection).connection
+
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+
+    def test_warm_opens_up_to_the_pool_size(self):
+        connections = pool(size=3)
+
+        self.assertEqual(connections.warm(FakeConnection, 5), 3)
+        self.assertEqual(connections.warm(FakeConnection, 5), 0)
+        connections.checkout(FakeConnection)
+        self.assertEqual(connections.stats()["created"], 3)
+
+
+class FakeMySQLConnection(FakeConnection):
+    def __init__(self, **params):
+        super().__init__()
+        self.encoders = {}
+        # as mysqlclient opens them
+        self.autocommit_enabled = False
+        self.rollbacks = 0
+
+    def get_autocommit(self):
+        return self.autocommit_enabled
+
+    def autocommit(self, enabled):
+        self.autocommit_enabled = enabled
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@skipIf(pooled is None, "mysqlclient is not installed")
+class TestPooledDatabaseWrapper(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(pools._pools.pop, "pooled", None)
+        connect = mock.patch.object(
+            pooled.Database, "connect", side_effect=FakeMySQLConnection
+        )
+        self.connect = connect.start()
+        self.addCleanup(connect.stop)
+        init = mock.patch.object(pooled.base.DatabaseWrapper, "init_connection_state")
+        self.init_connection_state = init.start()
+        self.addCleanup(init.stop)
+
+        settings_dict = {
+            **databases["default"].settings_dict,
+            "ENGINE": "utils.db.mysql",
+            "NAME": "doorable",
+            "USER": "",
+            "PASSWORD": "",
+            "HOST": "",
+            "PORT": "",
+            "OPTIONS": {},
+            "POOL": {"SIZE": 1, "TIMEOUT": 0.05, "CHECK_AFTER": 0},
+        }
+        self.wrapper = pooled.DatabaseWrapper(settings_dict, "pooled")
+
+    def reconnect(self):
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        return self.wrapper.connection
+
+    def test_close_returns_the_connection_for_reuse(self):
+        self.wrapper.ensure_connection()
+        first = self.wrapper.connection
+
+        self.assertIs(self.reconnect(), first)
+        self.assertFalse(first.closed)
+        self.assertEqual(self.connect.call_count, 1)
+        # the session was set up once, not on every checkout
+        self.assertEqual(self.init_connection_state.call_count, 1)
+        self.assertEqual(self.wrapper.pool.stats()["reused"], 1)
+
+    def test_abandoned_transaction_is_rolled_back_and_autocommit_restored(self):
+        self.wrapper.ensure_connection()
+        connection = self.wrapper.connection
+        self.wrapper.set_autocommit(False)
+
+        self.assertIs(self.reconnect(), connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertTrue(connection.get_autocommit())
+
+    def test_connection_is_discarded_after_an_error(self):
+        self.wrapper.ensure_connection()
+        broken = self.wrapper.connection
+        self.wrapper.errors_occurred = True
+
+        fresh = self.reconnect()
+
+        self.assertIsNot(fresh, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(self.connect.call_count, 2)
+        self.assertEqual(self.init_connection_state.call_count, 2)
+        self.assertEqual(self.wrapper.pool.stats()["discarded"], 1)
+
+
+class TestDatabasePoolsView(APITestCase):
+    def setUp(self):
+        self.url = reverse("database-pools")
+        self.user = User.objects.create(email="staff@example.org", username="staff")
+
+    def test_only_staff_see_the_pools(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.user.is_staff = True
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), pools.stats())
@@ -0,0 +1,73 @@
+import io
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from ..parsers import FastJSONParser
+from ..renderers import FastJSONRenderer
+
+
+class TestFastJSONRenderer(SimpleTestCase):
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_output_matches_stdlib_renderer(self):
+        self.assertSameOutput(
+            {
+                "email": "ünïcode@example.org",
+                "tokens": {"refresh_token": "a.b.c", "access_token": "d.e.f"},
+                "status_code": 401,
+                "created_at": datetime(
+                    2024, 3, 4, 3, 15, 1, 123456, tzinfo=timezone.utc
+                ),
+                "amount": Decimal("1.50"),
+                "id": uuid.UUID(int=1),
+                "message": gettext_lazy("invalid token"),
+                "separators": "  ",
+                1: [None, True, 1.5],
+            }
+        )
+
+    def test_floats_match_stdlib_renderer(self):
+        self.assertSameOutput(
+            {"big": 1e16, "small": [1e-7, -1e-05, 0.0001], "top": 1.5e300}
+        )
+        self.assertSameOutput(1e16)
+
+    def test_non_finite_floats_render_as_null(self):
+        self.assertEqual(FastJSONRenderer().render([float("nan")]), b"[null]")
+
+    def test_indented_output_matches_stdlib_renderer(self):
+        self.assertSameOutput({"a": [1, 2]}, "application/json; indent=4")
+
+    def test_none_renders_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+
+class TestFastJSONParser(SimpleTestCase):
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body))
+
+    def test_output_matches_stdlib_parser(self):
+        body = '{"email": "ünïcode@example.org", "n": [1, 2.5, null]}'.encode()
+        self.assertEqual(
+            self.parse(FastJSONParser(), body), self.parse(JSONParser(), body)
+        )
+
+    def test_invalid_json_raises_parse_error(self):
+        with self.assertRaises(ParseError):
+            self.parse(FastJSONParser(), b"{invalid")
+
+    def test_nan_is_rejected(self):
+        with self.assertRaises(ParseError):
+            self.parse(FastJSONParser(), b'{"n": NaN}')
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from .. import tracing
+
+
+class TestTracing(SimpleTestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def record_trace(self):
+        trace = tracing.Trace()
+        trace.endpoint = "login"
+        token = tracing.current_trace.set(trace)
+        try:
+            with tracing.span("http.request"):
+                with tracing.span("auth.authenticate"):
+                    pass
+        finally:
+            tracing.current_trace.reset(token)
+        return trace
+
+    def test_span_is_noop_without_sampled_trace(self):
+        self.assertIs(tracing.span("auth.authenticate"), tracing.NOOP_SPAN)
+
+    @override_settings(TRACE_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_start_no_trace(self):
+        self.assertIsNone(tracing.start_trace())
+
+    def test_spans_are_nested(self):
+        trace = self.record_trace()
+        child, root = trace.spans
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertIsNone(root.parent_id)
+
+    def test_summary_reads_both_export_formats(self):
+        for export_format in ("local", "otlp"):
+            with override_settings(
+                TRACE_EXPORT_FILE=self.filename, TRACE_EXPORT_FORMAT=export_format
+            ):
+                trace = self.record_trace()
+                trace.spans[-1].set("http.route", "login")
+                tracing.export(trace)
+
+        out = StringIO()
+        call_command("trace_summary", file=self.filename, stdout=out)
+        self.assertIn("login (2 traces)", out.getvalue())
+        self.assertIn("auth.authenticate", out.getvalue())
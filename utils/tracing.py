@@ -0,0 +1,227 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key: str, value) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "name",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+    )
+
+    def __init__(self, trace: "Trace", name: str, attributes: Dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.attributes = attributes
+
+    def __enter__(self):
+        stack = self.trace.stack
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.trace.stack.pop()
+        self.trace.spans.append(self)
+        return False
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.endpoint = None
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+
+
+def is_sampled() -> bool:
+    rate = settings.TRACE_SAMPLE_RATE
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def start_trace() -> Optional[Trace]:
+    if not is_sampled():
+        return None
+    return Trace()
+
+
+def span(name: str, **attributes):
+    """
+    Times a phase of the current request. Outside a sampled request this
+    returns a shared no-op, so instrumented code pays one context lookup.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return Span(trace, name, attributes)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+def to_otlp(trace: Trace) -> Dict:
+    spans = []
+    for s in trace.spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            # SPAN_KIND_SERVER for the request root, SPAN_KIND_INTERNAL otherwise
+            "kind": 2 if s.parent_id is None else 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _otlp_attributes(s.attributes),
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _otlp_attributes(
+                        {"service.name": settings.TRACE_SERVICE_NAME}
+                    )
+                },
+                "scopeSpans": [{"scope": {"name": "doorable"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def to_local(trace: Trace) -> Dict:
+    return {
+        "trace_id": trace.trace_id,
+        "endpoint": trace.endpoint,
+        "spans": [s.to_dict() for s in trace.spans],
+    }
+
+
+_export_lock = threading.Lock()
+
+
+def export(trace: Trace) -> None:
+    if settings.TRACE_EXPORT_FORMAT == "otlp":
+        data = to_otlp(trace)
+    else:
+        data = to_local(trace)
+
+    line = json.dumps(data, default=str) + "\n"
+    with _export_lock:
+        with open(settings.TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _from_otlp_value(value: Dict):
+    for kind in ("stringValue", "boolValue", "doubleValue"):
+        if kind in value:
+            return value[kind]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return None
+
+
+def read_traces(filename: str):
+    """
+    Yields (endpoint, [(span name, duration ms)]) from an export file in
+    either format.
+    """
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+
+            if "resourceSpans" not in data:
+                yield data.get("endpoint"), [
+                    (s["name"], s["duration_ms"]) for s in data["spans"]
+                ]
+                continue
+
+            spans = [
+                s
+                for resource in data["resourceSpans"]
+                for scope in resource["scopeSpans"]
+                for s in scope["spans"]
+            ]
+            endpoint = None
+            for s in spans:
+                if "parentSpanId" not in s:
+                    attributes = {
+                        a["key"]: _from_otlp_value(a["value"])
+                        for a in s.get("attributes", [])
+                    }
+                    endpoint = attributes.get("http.route")
+            yield endpoint, [
+                (
+                    s["name"],
+                    (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6,
+                )
+                for s in spans
+            ]
@@ -1,4 +1,9 @@
 from django.http import JsonResponse
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .db import pool
 
 
 def error_404(request, exception):
@@ -15,3 +20,12 @@ def error_500(request):
     response = JsonResponse(data={"message": message, "status_code": 500})
     response.status_code = 500
     return response
+
+
+class DatabasePools(APIView):
+    """Connection pool counters of the process serving the request, for staff."""
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(pool.stats())